@@ -1,47 +1,31 @@
-from flask import Flask, request, abort, Blueprint, jsonify
-from bs4 import BeautifulSoup
-import requests
+from flask import Flask, Response, request, abort, Blueprint, jsonify, g
 import os
 import json
 from datetime import datetime, timedelta
 import logging
-import random
 import time
-from datetime import datetime, timedelta
-from requests.adapters import HTTPAdapter
-from urllib3.util import Retry
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-from apscheduler.triggers.interval import IntervalTrigger
-
-# Import OpenCC for Chinese conversion
-try:
-    from opencc import OpenCC
-    OPENCC_AVAILABLE = True
-except ImportError:
-    OPENCC_AVAILABLE = False
-    logging.warning("OpenCC not available. Chinese conversion will not work.")
-
-# 配置请求会话，添加自动重试和超时设置
-def create_robust_session():
-    """创建一个具有重试功能的请求会话"""
-    session = requests.Session()
-    
-    # 配置重试策略，对所有请求方法启用重试
-    retry_strategy = Retry(
-        total=3,  # 总共重试3次
-        backoff_factor=0.5,  # 退避因子
-        status_forcelist=[429, 500, 502, 503, 504],  # 触发重试的HTTP状态码
-        allowed_methods=["GET"]  # 允许GET方法重试
-    )
-    
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    
-    return session
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import hmac
+import metrics
+import timing
+from fetch_engine import FetchEngine
+from persistence import DebouncedWriter
+from shared_store import SqliteStore, LeaderLock, JOB_DONE, JOB_FAILED
+from singleflight import SingleFlight
+from history import HistoryStore, MAX_HISTORY_DAYS
+from ratings import attach_structure
+from refresh_planner import RefreshPlanner
+import variants
+from responses import ResponseCache, conditional_response, STALE_MAX_AGE, BATCH_FIELDS, DEFAULT_BATCH_FIELDS
+import ingest
+from upstream import breaker
+from circuit_breaker import CircuitOpenError
+import horizons
+from horizons import HORIZONS, PREFETCH_HORIZONS
 
-session = create_robust_session()
+# 批量刷新使用的并发抓取引擎
+fetch_engine = FetchEngine()
 
 
 # Configure logging
@@ -49,142 +33,467 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger(__name__)
 
 # Cache storage
-CACHE_DIR = os.path.dirname(os.path.abspath(__file__))
-CACHE_FILE = os.path.join(CACHE_DIR, "astro_cache.json")
+CACHE_FILE = ingest.CACHE_FILE
 cache = {}
 scheduler = None
 
-# Initialize Chinese converter
-t2s_converter = None
-if OPENCC_AVAILABLE:
-    try:
-        t2s_converter = OpenCC('t2s')  # Traditional to Simplified
-        logger.info("Traditional to Simplified Chinese converter loaded")
-    except Exception as e:
-        logger.error(f"Error initializing OpenCC: {e}")
-        OPENCC_AVAILABLE = False
+# 按星座的自适应刷新计划（由领导者维护），调度器每 SCHEDULE_TICK 秒检查一次到期的星座
+refresh_planner = RefreshPlanner()
+SCHEDULE_TICK = float(os.environ.get('ASTRO_SCHEDULE_TICK', 60))
+
+# 预构建的响应体（含压缩版本和 ETag）
+response_cache = ResponseCache()
+
+# 多 worker 共享的存储与领导者锁：只有领导者运行调度器、抓取源站和写文件
+store = SqliteStore()
+leader_lock = LeaderLock()
+
+# 明天/本周/本月的运势：领导者在后台预取，保存在单独的共享存储中，以 (星座, 时间范围, 周期) 为键；
+# 请求只读缓存，不同步抓取。预取与当天的刷新共用主机礼貌预算
+HORIZON_STORE_FILE = os.environ.get('ASTRO_HORIZON_STORE_FILE',
+                                    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'astro_horizons.sqlite3'))
+horizon_store = SqliteStore(HORIZON_STORE_FILE)
+horizon_cache = {}
+horizon_version = 0
+HORIZON_PREFETCH_TICK = float(os.environ.get('ASTRO_HORIZON_PREFETCH_TICK', 300))
+HORIZON_RECHECK_HOURS = float(os.environ.get('ASTRO_HORIZON_RECHECK_HOURS', 6))
+_horizon_checked = {}  # 缓存键 -> 最近一次成功检查源站的时刻（monotonic）
+
+# 按 (星座, 日期) 的历史存档，由领导者在持久化时写入
+history_store = HistoryStore()
+store_version = 0
+_store_synced_at = 0.0
+_store_sync_lock = threading.Lock()
+STORE_SYNC_INTERVAL = float(os.environ.get('ASTRO_STORE_SYNC_INTERVAL', 1.0))
+LEADER_RETRY_INTERVAL = float(os.environ.get('ASTRO_LEADER_RETRY_INTERVAL', 30))
+
+# 请求路径上按星座合并并发抓取，同一星座同时只有一个请求访问源站
+fetch_flight = SingleFlight()
+SINGLEFLIGHT_WAIT = float(os.environ.get('ASTRO_SINGLEFLIGHT_WAIT', 30))
+
+# stale-while-revalidate：过期数据立即返回并在后台刷新；超过最大过期时间的数据才同步抓取
+STALE_WHILE_REVALIDATE = os.environ.get('ASTRO_STALE_WHILE_REVALIDATE', '1').lower() in ['1', 'true', 'yes', 'y']
+MAX_STALENESS_HOURS = float(os.environ.get('ASTRO_MAX_STALENESS_HOURS', 48))
+revalidate_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='astro-revalidate')
+# 已提交后台刷新、尚未完成的星座，过期请求风暴中每个星座只排队一次
+_revalidate_pending = set()
+_revalidate_lock = threading.Lock()
+
+# 刷新任务（POST /api/update）由领导者在单独的线程中逐个执行，不占用请求线程；
+# 其他 worker 登记的任务由领导者每 JOB_POLL_INTERVAL 秒检查一次队列后取走
+job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='astro-jobs')
+JOB_POLL_INTERVAL = float(os.environ.get('ASTRO_JOB_POLL_INTERVAL', 1.0))
+_job_pass_queued = False
+_job_kick_lock = threading.Lock()
+
+# 启动后台预热进行中
+warming = threading.Event()
+
+# 共享存储有新版本时唤醒 /api/astro/changes 的长轮询；单次等待最长 CHANGES_MAX_WAIT 秒
+store_changed = threading.Condition()
+CHANGES_MAX_WAIT = float(os.environ.get('ASTRO_CHANGES_MAX_WAIT', 60))
+
+# 请求阶段计时：Server-Timing 响应头，超过 SLOW_REQUEST_MS 毫秒的请求记录各阶段耗时
+SERVER_TIMING = os.environ.get('ASTRO_SERVER_TIMING', '1').lower() in ['1', 'true', 'yes', 'y']
+SLOW_REQUEST_MS = float(os.environ.get('ASTRO_SLOW_REQUEST_MS', 1000))
+slow_logger = logging.getLogger('astro_api.slow')
 
-def convert_to_simplified(text):
-    """Convert traditional Chinese text to simplified Chinese"""
-    if OPENCC_AVAILABLE and t2s_converter:
-        return t2s_converter.convert(text)
-    return text  # Return original if conversion not available
+# 管理接口（/api/admin/...、POST /api/update）的令牌，未设置时管理接口关闭
+ADMIN_TOKEN = os.environ.get('ASTRO_ADMIN_TOKEN', '')
+PROFILE_MAX_REQUESTS = int(os.environ.get('ASTRO_PROFILE_MAX_REQUESTS', 1000))
+profiler = timing.Profiler()
+
+# 请求路径上重复出现的告警，每个键在间隔内只记录一次
+LOG_SAMPLE_INTERVAL = float(os.environ.get('ASTRO_LOG_SAMPLE_INTERVAL', 60))
+_log_sampled_at = {}
+
+def log_sampled(key, level, message):
+    """按键限频的日志：同一个键在 LOG_SAMPLE_INTERVAL 秒内只记录一次，其余降为 debug"""
+    now = time.monotonic()
+    if now - _log_sampled_at.get(key, float('-inf')) >= LOG_SAMPLE_INTERVAL:
+        _log_sampled_at[key] = now
+        logger.log(level, message)
+    else:
+        logger.debug(message)
+
+def is_leader():
+    """当前进程是否为领导者"""
+    return leader_lock.held
 
 def load_cache():
-    """Load cache from file if exists"""
-    global cache
+    """Load cache from the shared store, falling back to the JSON file"""
+    global cache, store_version
+    load_horizons()
     try:
+        store_version, entries = store.load_all()
+        if entries:
+            cache = entries
+            logger.info("Cache loaded from shared store")
+            attach_missing_derived()
+            return
         if os.path.exists(CACHE_FILE):
             with open(CACHE_FILE, 'r', encoding='utf-8') as f:
                 cache = json.load(f)
             logger.info("Cache loaded successfully")
+            attach_missing_derived()
+            # 首次使用共享存储时，由领导者把文件中的数据导入
+            if is_leader() and cache:
+                store_version = store.put_many(cache)
     except Exception as e:
         logger.error(f"Error loading cache: {e}")
         cache = {}
 
-def save_cache():
-    """Save cache to file"""
+def load_horizons():
+    """从共享存储加载当前周期的明天/本周/本月运势"""
+    global horizon_version
     try:
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(cache, f, ensure_ascii=False, indent=2)
-        logger.info("Cache saved successfully")
+        horizon_version, entries = horizon_store.load_all()
     except Exception as e:
-        logger.error(f"Error saving cache: {e}")
+        logger.error(f"加载多时间范围缓存失败: {e}")
+        return
+    horizon_cache.clear()
+    horizon_cache.update({key: entry for key, entry in entries.items() if horizons.is_current(key)})
+
+def attach_missing_derived():
+    """旧缓存条目缺少入库时生成的转换变体和结构化评分，加载时补上"""
+    missing = [key for key, entry in cache.items() if 'variants' not in entry or 'structured' not in entry]
+    for key in missing:
+        variants.attach_variants(attach_structure(cache[key]))
+    if missing:
+        save_cache(*missing)
+
+def sync_from_store(force=False):
+    """
+    从共享存储增量同步其他进程写入的条目（按间隔节流）
+
+    跟随者在每个请求前调用；领导者在定时任务和 /api/reload 中调用，
+    以接收 update_astro_data.py --local 等其他进程写入的数据。领导者尚未提交的修改不会被覆盖（见 is_newer）。
+    """
+    global store_version, _store_synced_at
+    now = time.monotonic()
+    if not force and now - _store_synced_at < STORE_SYNC_INTERVAL:
+        return
+    with _store_sync_lock:
+        _store_synced_at = now
+        try:
+            store_version, changed = store.changed_since(store_version)
+        except Exception as e:
+            logger.error(f"从共享存储同步失败: {e}")
+            return
+        changed = {key: entry for key, entry in changed.items() if not is_newer(key, cache.get(key), entry)}
+        if changed:
+            cache.update(changed)
+            for key in changed:
+                response_cache.prebuild(key, cache[key])
+            logger.debug(f"从共享存储同步了{len(changed)}个星座")
+            notify_store_changed()
+        sync_horizons()
+        # 跟随者用领导者学到的发布窗口计算 max-age
+        if not is_leader():
+            refresh_planner.reload_if_changed()
+
+def sync_horizons():
+    """从共享存储同步领导者预取的多时间范围条目，并丢弃已过期周期的条目"""
+    global horizon_version
+    try:
+        horizon_version, changed = horizon_store.changed_since(horizon_version)
+    except Exception as e:
+        logger.error(f"同步多时间范围缓存失败: {e}")
+        return
+    horizon_cache.update(changed)
+    prune_horizons()
+
+def prune_horizons():
+    """丢弃已过周期的条目及其预构建响应，返回丢弃的缓存键"""
+    expired = [key for key in list(horizon_cache) if not horizons.is_current(key)]
+    for key in expired:
+        horizon_cache.pop(key, None)
+        _horizon_checked.pop(key, None)
+        response_cache.discard(key)
+    return expired
+
+def notify_store_changed():
+    """唤醒等待数据变化的长轮询请求"""
+    with store_changed:
+        store_changed.notify_all()
+
+def is_newer(key, current, incoming):
+    """
+    同步时是否保留内存中的条目，不用共享存储中的版本替换
+
+    changed_since 只返回版本号大于本进程已同步版本的条目，按存储的版本号它们总是更新的；
+    不比较不同进程各自的时钟写下的 timestamp。只有两种情况保留内存中的条目：
+    - 存储中的是默认数据，内存中是真实数据
+    - 领导者对该条目有尚未提交的修改（还在防抖写入器中），提交时会写回存储
+    """
+    if not current:
+        return False
+    if incoming.get('is_default') and not current.get('is_default'):
+        return True
+    if current.get('is_default') or not is_leader():
+        return False
+    pending = cache_writer.pending
+    return '*' in pending or str(key) in pending
+
+def snapshot_cache():
+    """复制当前缓存，供后台写入线程序列化"""
+    return {key: dict(entry) for key, entry in list(cache.items())}
+
+def persist_cache(dirty):
+    """把脏条目写入共享存储和历史存档，并原子替换缓存文件；返回文件字节数"""
+    started = time.perf_counter()
+    try:
+        snapshot = snapshot_cache()
+        keys = snapshot.keys() if '*' in dirty else [key for key in dirty if key in snapshot]
+        changed = {key: snapshot[key] for key in keys}
+        # 与 update_astro_data.py 共用同一个入库核心，写入在跨进程锁内完成
+        _, size = ingest.commit(changed, store, history_store, CACHE_FILE)
+    except Exception:
+        metrics.save_failures.inc()
+        raise
+    notify_store_changed()
+    metrics.save_duration.observe(time.perf_counter() - started)
+    metrics.save_bytes.set(size)
+    return size
+
+# 后台防抖写入器
+cache_writer = DebouncedWriter(persist_cache)
+
+def save_cache(*nums):
+    """标记缓存需要保存，由后台写入线程合并写盘，不阻塞当前请求"""
+    with timing.stage('save'):
+        # 条目已变化，先预构建新的响应体
+        for key in (nums or list(cache.keys())):
+            if str(key) in cache:
+                response_cache.prebuild(key, cache[str(key)])
+        
+        # 跟随者不写共享存储和缓存文件，避免多个进程互相覆盖
+        if is_leader():
+            cache_writer.mark_dirty(*nums)
+
+def seconds_until_next_refresh(signs=None, now=None):
+    """
+    Cache-Control 的 max-age：到这些星座下一次预期的源站更新为止（按刷新计划学到的发布窗口，
+    不超过当地午夜）；不指定星座时按刷新计划的固定整点
+    """
+    if signs is None:
+        return refresh_planner.seconds_until_refresh(now)
+    return min(refresh_planner.seconds_until_change(num, now) for num in signs)
+
+def prepared_response(num, data, fmt, script, stale, extra_headers=None, key=None, max_age=None):
+    """从预构建的响应体生成 Flask 响应，处理 If-None-Match 和压缩；key 默认为星座编号"""
+    with timing.stage('render'):
+        prepared = response_cache.get(num if key is None else key, data, fmt, script, stale)
+        if max_age is None:
+            max_age = STALE_MAX_AGE if stale else seconds_until_next_refresh([num])
+        status, body, headers = conditional_response(
+            prepared,
+            request.headers.get('If-None-Match'),
+            request.headers.get('Accept-Encoding'),
+            max_age,
+            extra_headers
+        )
+    return Response(body, status=status, headers=headers)
+
+def horizon_response(num, horizon, fmt, script):
+    """
+    从缓存返回明天/本周/本月的运势
+
+    只读领导者预取的当前周期条目，不同步抓取源站；还没有预取到时返回 503。
+    max-age 不超过周期结束和下一次重新检查的时刻。
+    """
+    period_id = horizons.period(horizon)
+    key = horizons.cache_key(num, horizon, period_id)
+    entry = horizon_cache.get(key)
+    if entry is None and not is_leader():
+        sync_from_store(force=True)
+        entry = horizon_cache.get(key)
+    if entry is None:
+        metrics.cache_requests.inc(sign=num, result='miss')
+        response = jsonify({"error": "Astrology data not available yet", "horizon": horizon, "period": period_id})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(int(HORIZON_PREFETCH_TICK))
+        return response
+    metrics.cache_requests.inc(sign=num, result='hit')
+
+    now = datetime.now()
+    max_age = min((horizons.expires_at(horizon, now) - now).total_seconds(), HORIZON_RECHECK_HOURS * 3600)
+    headers = {"X-Astro-Horizon": horizon, "X-Astro-Period": period_id}
+    if fmt == 'html':
+        headers["X-Astro-Date"] = entry["date"]
+    return prepared_response(num, entry, fmt, script, False, headers, key=key, max_age=int(max_age))
+
+def parse_horizon(value):
+    """解析 horizon= 参数，默认当天；无效时抛出 ValueError"""
+    horizon = value or 'daily'
+    if horizon not in HORIZONS:
+        raise ValueError(f"Invalid horizon: {horizon}")
+    return horizon
 
 # 智能的缓存失效检测
 def is_cache_valid(num):
-    """检查缓存是否仍然有效（同一天）并添加智能退化机制"""
+    """检查缓存是否仍然有效（同一天）"""
+    with timing.stage('cache'):
+        return is_entry_valid(cache.get(str(num)))
+
+def is_entry_valid(entry):
+    """检查单个缓存条目是否仍然有效，供缓存快照使用"""
     today = datetime.now().strftime("%Y-%m-%d")
     
     # 检查缓存是否存在且包含日期
-    if str(num) not in cache or 'date' not in cache[str(num)]:
+    if not entry or 'date' not in entry:
         return False
     
-    # 如果是今天的数据，缓存有效
-    if cache[str(num)]['date'] == today:
-        return True
-        
-    # 智能退化：如果是昨天的数据且当前时间是凌晨（0-6点），也认为缓存有效
-    # 这是为了避免在凌晨时段频繁请求源站
-    cache_date = datetime.strptime(cache[str(num)]['date'], "%Y-%m-%d")
-    if (datetime.now() - cache_date).days <= 1:
-        current_hour = datetime.now().hour
-        if 0 <= current_hour < 2:
-            logger.info(f"凌晨时段(当前{current_hour}点)，继续使用昨天的星座{num}数据")
-            return True
+    # 只有今天的数据才有效；过期数据由请求路径的后台刷新和刷新计划处理
+    return entry['date'] == today
+
+def _fetch_and_save(num):
+    data = fetch_astro_data(num)
+    # 缓存在fetch_astro_data内部更新
+    save_cache(num)
+    return data
+
+def fetch_for_request(num):
+    """请求路径上的缓存未命中：领导者抓取源站，跟随者从共享存储重新同步"""
+    if is_leader():
+        # 同一星座已有抓取在进行时，有旧数据就直接返回旧数据，否则等待那次抓取的结果
+        return fetch_flight.do(
+            num,
+            lambda: _fetch_and_save(num),
+            fallback=lambda: cache.get(str(num)),
+            timeout=SINGLEFLIGHT_WAIT
+        )
     
-    return False
+    sync_from_store(force=True)
+    if is_cache_valid(num):
+        return cache[str(num)]
+    raise LookupError(f"共享存储中暂无星座{num}的最新数据")
+
+def entry_age_hours(entry):
+    """缓存条目距抓取时的小时数，无法判断时视为无限大"""
+    try:
+        return (datetime.now() - datetime.fromisoformat(entry['timestamp'])).total_seconds() / 3600
+    except (KeyError, TypeError, ValueError):
+        return float('inf')
+
+def _revalidate_and_save(num):
+    # 条件请求：内容未变化时只刷新校验信息和日期，条目没有改动时不写盘
+    if update_sign(num):
+        save_cache(num)
+    return cache.get(str(num))
+
+def revalidate_in_background(num):
+    """后台刷新过期星座；同一星座已在排队或刷新时不重复提交"""
+    if not is_leader() or breaker.is_open:
+        return
+    with _revalidate_lock:
+        if num in _revalidate_pending or fetch_flight.in_flight(num):
+            return
+        _revalidate_pending.add(num)
+    
+    def revalidate():
+        try:
+            fetch_flight.do(num, lambda: _revalidate_and_save(num), fallback=lambda: cache.get(str(num)))
+        except CircuitOpenError:
+            pass
+        except Exception as e:
+            logger.error(f"后台刷新星座{num}失败: {e}")
+        finally:
+            with _revalidate_lock:
+                _revalidate_pending.discard(num)
+    
+    revalidate_executor.submit(revalidate)
+
+def get_sign_data(num):
+    """
+    请求路径上获取星座数据，返回 (data, stale)
+
+    缓存有效时直接返回；过期但未超过最大过期时间时立即返回旧数据并在后台刷新；
+    否则同步抓取，失败时退回旧数据。完全没有数据时返回 (None, False)。
+    """
+    if is_cache_valid(num):
+        metrics.cache_requests.inc(sign=num, result='hit')
+        return cache[str(num)], False
+    
+    entry = cache.get(str(num))
+    if STALE_WHILE_REVALIDATE and entry and not entry.get('is_default') \
+            and entry_age_hours(entry) <= MAX_STALENESS_HOURS:
+        logger.debug(f"星座{num}缓存已过期，先返回旧数据并在后台刷新")
+        metrics.cache_requests.inc(sign=num, result='stale')
+        revalidate_in_background(num)
+        return entry, True
+    
+    metrics.cache_requests.inc(sign=num, result='miss')
+    logger.debug(f"获取星座{num}的最新数据")
+    try:
+        data = fetch_for_request(num)
+        return data, data.get('date') != datetime.now().strftime("%Y-%m-%d")
+    except Exception as e:
+        # 熔断时快速失败，已在 fetch_astro_data 中限频记录；源站故障时每个请求都会失败，同样限频
+        if not isinstance(e, CircuitOpenError):
+            log_sampled(f'request-fetch-failed-{num}', logging.ERROR, f"获取星座{num}数据失败: {e}")
+        # 如果获取失败且缓存中存在该星座数据(即使不是今天的)，则使用缓存数据
+        entry = cache.get(str(num))
+        if entry:
+            log_sampled(f'serve-stale-{num}', logging.WARNING, f"由于获取失败，使用过期缓存数据，星座{num}")
+            return entry, True
+        return None, False
 
 # 修改 fetch_astro_data 函数
 def fetch_astro_data(num, force_update=False):
-    """获取星座数据，增加了智能重试和随机延迟"""
+    """获取星座数据，请求受主机礼貌预算约束"""
     # 如果数据在缓存中且有效，除非强制更新，否则返回缓存数据
     if not force_update and is_cache_valid(num):
         logger.debug(f"使用有效的缓存数据，星座编号: {num}")
         return cache[str(num)]
         
     try:
-        # 添加随机延迟，避免频繁请求被限制
-        time.sleep(random.uniform(0.5, 2.0))
-        
-        # 使用会话发起请求，并设置更合理的超时值
-        r = session.get(
-            f'http://astro.click108.com.tw/daily_{num}.php?iAstro={num}', 
-            timeout=(5, 25)  # 连接超时5秒，读取超时25秒
-        )
-        r.raise_for_status()
-        
-        # 解析HTML
-        soup = BeautifulSoup(r.text, 'html.parser')
-        astro = soup.select("div.TODAY_CONTENT > h3")
-        
-        # 检查页面是否包含预期的元素
-        if not astro:
-            logger.warning(f"星座{num}返回的页面结构异常，可能是网站改版")
-            raise ValueError("页面结构异常")
-            
-        astro = astro[0]
-        items = soup.select("div.TODAY_CONTENT > p")
-        
-        # 格式化数据 - 存储原始HTML响应和结构化数据
-        result = {
-            "title": astro.text,
-            "items": [item.text for item in items],
-            "html": astro.text + "<br>" + "<br>".join([item.text + "<br>" for item in items]),
-            "date": datetime.now().strftime("%Y-%m-%d"),
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        # 更新缓存
-        cache[str(num)] = result
-        return result
+        # 使用共享的连接池会话，由主机预算控制并发和间隔；抓取结果直接更新缓存
+        return observe_refresh(num, lambda: ingest.fetch_sign(num, cache))
+    except CircuitOpenError as e:
+        log_sampled('circuit-open', logging.WARNING, f"源站熔断，跳过抓取: {e}")
+        raise
     except Exception as e:
-        logger.error(f"获取星座数据失败: {e}")
+        log_sampled(f'fetch-failed-{num}', logging.ERROR, f"获取星座{num}数据失败: {e}")
         raise
 
-def fetch_all_astro_data():
-    """Fetch data for all 12 astrology signs"""
+def update_sign(num):
+    """检查并更新单个星座，只请求一次源站；缓存有改动时返回True"""
+    return observe_refresh(num, lambda: ingest.refresh_sign(num, cache))
+
+def observe_refresh(num, fetch):
+    """执行一次源站抓取，把结果（内容变化/未变化/失败）记入刷新计划"""
+    before = cache.get(str(num))
+    try:
+        result = fetch()
+    except CircuitOpenError:
+        # 熔断时没有访问源站，不计入该星座的失败退避
+        raise
+    except Exception:
+        refresh_planner.record(num, 'failed')
+        raise
+    after = cache.get(str(num)) or {}
+    changed = before is None or after.get('content_hash') != before.get('content_hash')
+    # 冷启动或默认数据被替换时不是源站的发布时刻，不参与学习
+    observed = before is not None and not before.get('is_default')
+    refresh_planner.record(num, 'changed' if changed else 'unchanged', observed=observed)
+    return result
+
+def fetch_all_astro_data(signs=range(12)):
+    """Fetch data for all 12 astrology signs (or the given subset)"""
     logger.info("Scheduled job: Fetching data for all astrology signs")
-    updated = False
-    failed_signs = []
     
-    for num in range(12):  # 0-11 for the 12 signs
-        try:
-            # Check if current data is different from cached data
-            if needs_update(num):
-                logger.info(f"Updating data for astrology sign {num}")
-                fetch_astro_data(num, force_update=True)
-                updated = True
-            else:
-                logger.info(f"No updates needed for astrology sign {num}")
-        except Exception as e:
-            logger.error(f"Error updating astrology sign {num}: {e}")
-            failed_signs.append(num)
+    # 0-11 for the 12 signs, fetched concurrently within the host budget
+    report = fetch_engine.run(signs, update_sign)
+    failed_signs = report.failed_keys
+    for num in failed_signs:
+        logger.error(f"Error updating astrology sign {num}: {report.failures[num]}")
     
     # Save cache if any updates were made
-    if updated:
+    updated_signs = [num for num, updated in report.results.items() if updated]
+    if updated_signs:
         logger.info("Updates found, saving cache")
-        save_cache()
+        save_cache(*updated_signs)
     else:
         logger.info("No updates found for any astrology sign")
         
@@ -197,163 +506,225 @@ def retry_failed_signs(signs):
         return
     
     logger.info(f"Retrying update for signs: {signs}")
-    updated = False
+    updated = []
     
     for num in signs:
         try:
             logger.info(f"Retrying update for astrology sign {num}")
             fetch_astro_data(num, force_update=True)
-            updated = True
+            updated.append(num)
         except Exception as e:
             logger.error(f"Error during retry for astrology sign {num}: {e}")
     
     if updated:
         logger.info("Updates found during retry, saving cache")
-        save_cache()
-
-def needs_update(num):
-    """Check if the astrology data needs to be updated"""
-    try:
-        # If not in cache or not valid for today, definitely needs update
-        if str(num) not in cache or not is_cache_valid(num):
-            return True
-            
-        # Fetch current data without saving to cache
-        # Add timeout to prevent hanging requests
-        r = requests.get(
-            f'http://astro.click108.com.tw/daily_{num}.php?iAstro={num}', 
-            timeout=30
-        )
-        r.raise_for_status()
-        
-        # Parse HTML
-        soup = BeautifulSoup(r.text, 'html.parser')
-        items = soup.select("div.TODAY_CONTENT > p")
-        current_items = [item.text for item in items]
-        
-        # Compare with cached items
-        if str(num) in cache and 'items' in cache[str(num)]:
-            cached_items = cache[str(num)]['items']
-            # Check if content has changed
-            if cached_items != current_items:
-                logger.info(f"Content changed for astrology {num}")
-                return True
-                
-        return False
-    except Exception as e:
-        logger.error(f"Error checking for updates for astrology {num}: {e}")
-        # In case of error, assume update is needed
-        return True
+        save_cache(*updated)
 
 # 定时器设置，优化定时更新策略
 def setup_scheduler():
     """设置定时更新任务，考虑更多场景的调度策略"""
     global scheduler
+    # 只有领导者需要调度器，跟随者进程不加载 apscheduler
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.interval import IntervalTrigger
+    from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED
     
     if scheduler:
         scheduler.shutdown()
         
     scheduler = BackgroundScheduler()
     
-    # 每天四个时间点更新，避开凌晨高负载期
+    # 按各星座的刷新计划检查源站：发布窗口内密集、其余时间稀疏，失败的星座单独退避
+    refresh_planner.load()
+    scheduler.add_job(
+        run_due_refreshes,
+        IntervalTrigger(seconds=SCHEDULE_TICK),
+        id='adaptive_refresh'
+    )
+    
+    # 后台预取明天/本周/本月的运势
+    if PREFETCH_HORIZONS:
+        scheduler.add_job(
+            run_horizon_prefetch,
+            IntervalTrigger(seconds=HORIZON_PREFETCH_TICK),
+            id='horizon_prefetch'
+        )
+    
+    # 同步 update_astro_data.py --local、reingest.py 等其他进程直接写入的条目
     scheduler.add_job(
-        check_and_schedule_updates, 
-        CronTrigger(hour='2,6,12,16', minute='0')
+        sync_from_store,
+        IntervalTrigger(seconds=10),
+        id='store_sync'
     )
     
-    # 应用启动后，延迟2分钟再执行第一次更新(避免启动高峰)
+    # 跟随者 worker 通过 POST /api/update、update_astro_data.py 登记的刷新任务：短间隔检查队列，有任务时立即执行
     scheduler.add_job(
-        check_and_schedule_updates, 
-        'date', 
-        run_date=datetime.now() + timedelta(minutes=2)
+        poll_refresh_jobs,
+        IntervalTrigger(seconds=JOB_POLL_INTERVAL),
+        id='job_poll'
     )
     
+    scheduler.add_listener(record_job_outcome, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
     scheduler.start()
-    logger.info("调度器已启动，设置了定时更新任务")
+    logger.info("调度器已启动，按刷新计划检查各星座")
 
-# 更智能的重试机制
-def check_and_schedule_updates():
-    """检查更新并安排重试，添加智能退避策略"""
-    logger.info("运行更新检查")
-    
-    # 尝试更新所有星座
-    failed_signs = fetch_all_astro_data()
-    
-    # 如果有失败的星座，安排重试
-    if failed_signs:
-        logger.info(f"为失败的星座安排重试: {failed_signs}")
-        
-        # 提前结束条件：最大重试次数，或者随着时间推移增加延长重试间隔
-        retry_times = 0
-        max_retries = 5  # 最大重试5次，避免无限循环
-        
-        def retry_with_count():
-            nonlocal retry_times, failed_signs
-            retry_times += 1
-            
-            # 如果大部分星座都失败了，可能是源站问题，增加指数退避
-            if len(failed_signs) > 6:
-                # 根据失败次数动态调整重试间隔
-                backoff_minutes = 5 * (2 ** (min(retry_times - 1, 3)))
-                logger.info(f"检测到大量星座获取失败，第{retry_times}次重试将在{backoff_minutes}分钟后执行")
-                
-                # 移除当前作业，创建新的延迟更长的作业
-                if job_id in scheduler.get_jobs():
-                    scheduler.remove_job(job_id)
-                
-                if retry_times < max_retries:
-                    scheduler.add_job(
-                        retry_with_count,
-                        'date',
-                        run_date=datetime.now() + timedelta(minutes=backoff_minutes),
-                        id=f"{job_id}_backoff_{retry_times}"
-                    )
-                return
-            
-            logger.info(f"重试尝试 {retry_times}/{max_retries}")
-            
-            # 尝试更新失败的星座，使用修改过的函数，一次只重试一个星座
-            if failed_signs:
-                # 随机选择一个失败的星座重试，避免同时重试所有
-                sign_to_retry = random.choice(failed_signs)
-                success = retry_single_sign(sign_to_retry)
-                if success:
-                    failed_signs.remove(sign_to_retry)
-                    logger.info(f"星座{sign_to_retry}重试成功，剩余{len(failed_signs)}个失败的星座")
-                
-            # 如果所有星座更新成功或达到最大重试次数，删除作业
-            if not failed_signs or retry_times >= max_retries:
-                logger.info(f"在{retry_times}次尝试后删除重试作业")
-                # 记录最终失败的星座，以便后续处理
-                if failed_signs:
-                    logger.warning(f"以下星座重试后仍然失败: {failed_signs}")
-                if job_id in scheduler.get_jobs():
-                    scheduler.remove_job(job_id)
-        
-        # 创建初始重试作业，使用递增间隔
-        job_id = f'retry_job_{int(time.time())}'
-        scheduler.add_job(
-            retry_with_count,
-            IntervalTrigger(minutes=2),  # 开始是每2分钟重试一次
-            id=job_id
-        )
+def record_job_outcome(event):
+    """调度任务执行结果计入指标"""
+    from apscheduler.events import EVENT_JOB_MISSED
+    if event.code == EVENT_JOB_MISSED:
+        outcome = 'missed'
+    elif event.exception:
+        outcome = 'error'
+    else:
+        outcome = 'success'
+    metrics.scheduler_jobs.inc(job=metrics.job_name(event.job_id), outcome=outcome)
+
+def run_due_refreshes():
+    """检查刷新计划中到期的星座；失败的星座由刷新计划按指数退避安排下一次检查"""
+    if breaker.is_open:
+        log_sampled('circuit-open-refresh', logging.WARNING, "源站熔断中，暂停按计划刷新")
+        return
+    signs = refresh_planner.due()
+    if signs:
+        logger.info(f"按刷新计划检查星座: {signs}")
+        fetch_all_astro_data(signs)
+
+def horizon_keys_due(now=None):
+    """需要检查源站的多时间范围缓存键：当前周期缺失，或距上次检查超过 HORIZON_RECHECK_HOURS"""
+    now = now or time.monotonic()
+    due = []
+    for horizon in PREFETCH_HORIZONS:
+        period_id = horizons.period(horizon)
+        for num in range(12):
+            key = horizons.cache_key(num, horizon, period_id)
+            if key not in horizon_cache:
+                due.append(key)
+            # 启动时已有的条目从加载时开始计时，重启不会触发一轮全部检查
+            elif now - _horizon_checked.setdefault(key, now) >= HORIZON_RECHECK_HOURS * 3600:
+                due.append(key)
+    return due
 
-# 添加智能单星座重试策略
-def retry_single_sign(num):
-    """重试更新单个星座，成功返回True"""
+def refresh_horizon_key(key):
+    """检查一个多时间范围缓存键，条目有改动时返回True"""
+    num, horizon, period_id = horizons.parse_key(key)
+    changed = ingest.refresh_horizon(num, horizon, period_id, horizon_cache)
+    _horizon_checked[key] = time.monotonic()
+    return changed
+
+def prefetch_horizons():
+    """预取到期的明天/本周/本月运势，写入共享存储；返回失败的缓存键（下一轮重试）"""
+    global horizon_version
+    expired = prune_horizons()
+    if expired:
+        horizon_store.delete_many(expired)
+    if breaker.is_open:
+        log_sampled('circuit-open-horizons', logging.WARNING, "源站熔断中，暂停预取多时间范围运势")
+        return []
+    keys = horizon_keys_due()
+    if not keys:
+        return []
+    logger.info(f"预取多时间范围运势: {len(keys)}项")
+    report = fetch_engine.run(keys, refresh_horizon_key)
+    changed = {key: dict(horizon_cache[key]) for key, updated in report.results.items() if updated}
+    if changed:
+        horizon_version = horizon_store.put_many(changed)
+    return report.failed_keys
+
+def run_horizon_prefetch():
+    """调度任务：预取多时间范围运势"""
     try:
-        logger.info(f"重试更新星座{num}")
-        
-        # 随机延迟1-3秒，减轻对源站的压力
-        time.sleep(random.uniform(1, 3))
-        
-        fetch_astro_data(num, force_update=True)
-        save_cache()  # 每次成功更新后保存缓存
-        return True
+        failed = prefetch_horizons()
+        if failed:
+            logger.warning(f"多时间范围运势预取失败，下一轮重试: {failed}")
     except Exception as e:
-        logger.error(f"星座{num}重试失败: {e}")
-        return False
+        logger.error(f"预取多时间范围运势失败: {e}")
+
+def kick_refresh_jobs():
+    """领导者在任务线程中执行排队的刷新任务；已有一轮在等待执行时不重复提交"""
+    global _job_pass_queued
+    if not is_leader():
+        return
+    with _job_kick_lock:
+        if _job_pass_queued:
+            return
+        _job_pass_queued = True
+    job_executor.submit(run_queued_jobs)
+
+def poll_refresh_jobs():
+    """调度任务：队列中有其他 worker 登记的任务时唤醒任务线程"""
+    try:
+        if not breaker.is_open and store.has_queued_jobs():
+            kick_refresh_jobs()
+    except Exception as e:
+        logger.error(f"检查刷新任务队列失败: {e}")
+
+def run_queued_jobs():
+    """依次执行排队的刷新任务；熔断期间任务留在队列中，恢复后再执行"""
+    global _job_pass_queued
+    # 从这里开始新的唤醒会再排一轮，不会漏掉执行期间登记的任务
+    with _job_kick_lock:
+        _job_pass_queued = False
+    while not breaker.is_open:
+        try:
+            job = store.claim_job()
+        except Exception as e:
+            logger.error(f"读取刷新任务失败: {e}")
+            return
+        if job is None:
+            return
+        logger.info(f"执行刷新任务 {job['id']}: {job['signs']}{'（强制）' if job['force'] else ''}")
+        try:
+            run_refresh_job(job)
+        except Exception as e:
+            logger.error(f"刷新任务 {job['id']} 失败: {e}")
+            store.update_job(job['id'], {"error": str(e), "finished_at": time.time()}, JOB_FAILED)
+
+def run_refresh_job(job):
+    """执行一个刷新任务，按星座记录状态、耗时和失败原因，每完成一个星座保存一次进度"""
+    progress = {
+        "started_at": time.time(),
+        "per_sign": {str(num): {"status": "pending"} for num in job['signs']},
+    }
+    lock = threading.Lock()
+    
+    def save(state=None):
+        with lock:
+            store.update_job(job['id'], progress, state)
+    
+    def refresh(num):
+        record = progress["per_sign"][str(num)]
+        started = time.perf_counter()
+        try:
+            if job['force']:
+                # 强制刷新不带条件请求头，无条件重新抓取和解析
+                fetch_astro_data(num, force_update=True)
+                changed = True
+            else:
+                changed = update_sign(num)
+        except Exception as e:
+            with lock:
+                record.update(status="failed", error=str(e), seconds=round(time.perf_counter() - started, 3))
+            save()
+            raise
+        with lock:
+            record.update(status="changed" if changed else "unchanged", seconds=round(time.perf_counter() - started, 3))
+        save()
+        return changed
     
+    save()
+    report = fetch_engine.run(job['signs'], refresh)
+    updated = sorted(num for num, changed in report.results.items() if changed)
+    if updated:
+        save_cache(*updated)
+    progress.update(
+        finished_at=time.time(),
+        elapsed=round(report.elapsed, 3),
+        updated_signs=updated,
+        failed_signs=report.failed_keys
+    )
+    # 只有全部星座都失败时任务才算失败，部分失败列在 failed_signs 中
+    save(JOB_FAILED if report.failed_keys and not report.results else JOB_DONE)
+
 # 添加生成默认运势数据的功能，当无法获取时使用
 def generate_default_fortune(zodiac_num):
     """为指定星座生成默认的运势数据"""
@@ -367,7 +738,7 @@ def generate_default_fortune(zodiac_num):
     
     today = datetime.now().strftime("%Y-%m-%d")
     
-    return {
+    default_data = {
         "title": f"今日{zodiac_name}運勢",
         "items": [
             "整體運勢★★★☆☆：",
@@ -384,6 +755,7 @@ def generate_default_fortune(zodiac_num):
         "timestamp": datetime.now().isoformat(),
         "is_default": True  # 标记为默认生成的数据
     }
+    return variants.attach_variants(attach_structure(default_data))
 
 # Create Flask app
 app = Flask(__name__)
@@ -400,43 +772,39 @@ def astro_api():
     if (num > 11) or (num < 0):
         abort(400, "无效的星座编号(必须是0-11)")
     
-    # 检查是否需要转换为简体中文
-    convert_to_simple = request.args.get('convert', '').lower() in ['1', 'true', 'yes', 'y']
+    try:
+        horizon = parse_horizon(request.args.get('horizon'))
+    except ValueError:
+        abort(400, "无效的horizon参数(必须是daily、tomorrow、weekly或monthly)")
     
-    # 检查缓存
-    if is_cache_valid(num):
-        logger.info(f"从缓存提供星座{num}的数据")
-        resp_data = cache[str(num)]["html"]
-    else:
-        logger.info(f"获取星座{num}的最新数据")
-        try:
-            data = fetch_astro_data(num)
-            # 缓存在fetch_astro_data内部更新
-            save_cache()
-            resp_data = data["html"]
-        except Exception as e:
-            logger.error(f"获取星座{num}数据失败: {e}")
-            
-            # 如果获取失败且缓存中存在该星座数据(即使不是今天的)，则使用缓存数据
-            if str(num) in cache:
-                logger.warning(f"由于获取失败，使用过期缓存数据，星座{num}")
-                resp_data = cache[str(num)]["html"]
-            else:
-                # 如果连缓存都没有，生成默认数据
-                logger.warning(f"没有可用缓存，使用生成的默认数据，星座{num}")
-                default_data = generate_default_fortune(num)
-                cache[str(num)] = default_data
-                save_cache()
-                resp_data = default_data["html"]
-    
-    # 如果需要，转换为简体中文
-    if convert_to_simple:
-        if OPENCC_AVAILABLE:
-            resp_data = convert_to_simplified(resp_data)
-        else:
-            logger.warning("请求繁转简转换，但OpenCC不可用")
+    # 按 convert 参数或 Accept-Language 选择繁简变体
+    script = variants.select_variant(request.args.get('convert'), request.headers.get('Accept-Language'))
+    
+    if horizon != 'daily':
+        if script and not variants.opencc_available():
+            script = None
+        return horizon_response(num, horizon, 'html', script)
+    
+    data, stale = get_sign_data(num)
+    if data is None:
+        # 如果连缓存都没有，生成默认数据；只有领导者把它写入缓存，
+        # 跟随者缓存的默认数据会挡住之后从共享存储同步来的真实数据
+        log_sampled(f'default-data-{num}', logging.WARNING, f"没有可用缓存，使用生成的默认数据，星座{num}")
+        data = generate_default_fortune(num)
+        if is_leader():
+            cache[str(num)] = data
+            save_cache(num)
+    
+    # 如果需要，使用入库时预先转换的变体
+    if script and not variants.opencc_available():
+        log_sampled('opencc-unavailable', logging.WARNING, "请求繁简转换，但OpenCC不可用")
+        script = None
     
-    return resp_data
+    # 过期数据通过响应头标记
+    headers = {"X-Astro-Date": data["date"]}
+    if stale:
+        headers["X-Astro-Stale"] = "1"
+    return prepared_response(num, data, 'html', script, stale, headers)
 
 # 新增API路由
 api_bp = Blueprint('api', __name__, url_prefix='/api')
@@ -448,97 +816,467 @@ def astro_json_api(num):
         if not (0 <= num <= 11):
             return jsonify({"error": "Invalid astrology number (must be 0-11)"}), 400
         
-        # 检查是否需要转换为简体中文
-        convert_to_simple = request.args.get('convert', '').lower() in ['1', 'true', 'yes', 'y']
+        fmt = request.args.get('format', 'json')
+        if fmt not in ('json', 'structured'):
+            return jsonify({"error": "Invalid format (must be json or structured)"}), 400
         
-        # Check cache first
-        if is_cache_valid(num):
-            logger.info(f"Serving cached data for astrology {num}")
-            data = cache[str(num)]
-        else:
-            logger.info(f"Fetching fresh data for astrology {num}")
-            try:
-                data = fetch_astro_data(num)
-                # Cache is updated within fetch_astro_data
-                save_cache()
-            except Exception as e:
-                # 如果获取失败且缓存中存在该星座数据，则使用缓存数据
-                if str(num) in cache:
-                    logger.warning(f"Using outdated cache for astrology {num} due to fetch error: {e}")
-                    data = cache[str(num)]
-                else:
-                    return jsonify({"error": "Failed to fetch astrology data"}), 500
+        try:
+            horizon = parse_horizon(request.args.get('horizon'))
+        except ValueError:
+            return jsonify({"error": "Invalid horizon (must be daily, tomorrow, weekly or monthly)"}), 400
         
-        # 如果需要，转换为简体中文
-        if convert_to_simple and OPENCC_AVAILABLE:
-            response_data = {
-                "title": convert_to_simplified(data["title"]),
-                "items": [convert_to_simplified(item) for item in data["items"]],
-                "date": data["date"],
-                "simplified": True
-            }
-        else:
-            response_data = {
-                "title": data["title"],
-                "items": data["items"],
-                "date": data["date"],
-                "simplified": False
-            }
+        # 按 convert 参数或 Accept-Language 选择繁简变体
+        script = variants.select_variant(request.args.get('convert'), request.headers.get('Accept-Language'))
+        
+        # 明天/本周/本月只读预取的缓存
+        if horizon != 'daily':
+            if script and not variants.opencc_available():
+                script = None
+            return horizon_response(num, horizon, fmt, script)
         
-        # Return data in JSON format
-        return jsonify(response_data)
+        # Serve from cache, stale-while-revalidate when outdated
+        data, stale = get_sign_data(num)
+        if data is None:
+            return jsonify({"error": "Failed to fetch astrology data"}), 500
+        
+        # 如果需要，使用入库时预先转换的变体
+        if script and not variants.opencc_available():
+            script = None
+        
+        # Return prebuilt JSON body; format=structured 返回按分类整理好的评分和说明
+        return prepared_response(num, data, fmt, script, stale)
             
     except Exception as e:
         logger.error(f"Error in API: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+def parse_date_param(value, default):
+    """解析 YYYY-MM-DD 日期参数，无效时抛出 ValueError"""
+    if not value:
+        return default
+    return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+
+@api_bp.route("/astro/<int:num>/history", methods=['GET'])
+def astro_history_api(num):
+    """按日期范围查询历史运势：?from=YYYY-MM-DD&to=YYYY-MM-DD，默认最近30天"""
+    if not (0 <= num <= 11):
+        return jsonify({"error": "Invalid astrology number (must be 0-11)"}), 400
+    
+    today = datetime.now()
+    try:
+        date_to = parse_date_param(request.args.get('to'), today.strftime("%Y-%m-%d"))
+        date_from = parse_date_param(request.args.get('from'), (today - timedelta(days=30)).strftime("%Y-%m-%d"))
+    except ValueError:
+        return jsonify({"error": "Invalid date (expected YYYY-MM-DD)"}), 400
+    if date_from > date_to:
+        return jsonify({"error": "'from' must not be after 'to'"}), 400
+    
+    script = variants.select_variant(request.args.get('convert'), request.headers.get('Accept-Language'))
+    if script and not variants.opencc_available():
+        script = None
+    
+    try:
+        entries = history_store.query(num, date_from, date_to, MAX_HISTORY_DAYS)
+    except Exception as e:
+        logger.error(f"Error querying history for astrology {num}: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+    
+    days = []
+    for entry in entries:
+        variant = variants.get_variant(entry, script)
+        days.append({"date": entry["date"], "title": variant["title"], "items": variant["items"]})
+    return jsonify({
+        "sign": num,
+        "from": date_from,
+        "to": date_to,
+        "script": script,
+        "days": days
+    })
+
+def parse_signs(value):
+    """解析 signs= 参数（逗号分隔的星座编号），为空时返回全部星座"""
+    if not value:
+        return list(range(12))
+    signs = []
+    for part in value.split(','):
+        num = int(part)
+        if not (0 <= num <= 11):
+            raise ValueError(f"Invalid astrology number: {num}")
+        if num not in signs:
+            signs.append(num)
+    return signs
+
+def snapshot_signs(signs):
+    """
+    从同一个缓存快照取多个星座，返回 (条目, 过期的星座, 缺失的星座)
+
+    不在请求中同步抓取；过期或缺失的星座在后台刷新。
+    """
+    snapshot = dict(cache)
+    entries, stale, missing = {}, set(), []
+    for num in signs:
+        entry = snapshot.get(str(num))
+        if entry is None:
+            metrics.cache_requests.inc(sign=num, result='miss')
+            missing.append(num)
+            revalidate_in_background(num)
+            continue
+        if not is_entry_valid(entry):
+            metrics.cache_requests.inc(sign=num, result='stale')
+            stale.add(num)
+            revalidate_in_background(num)
+        else:
+            metrics.cache_requests.inc(sign=num, result='hit')
+        entries[num] = entry
+    return entries, stale, missing
+
+@api_bp.route("/astro", methods=['GET'])
+def astro_batch_api():
+    """一次返回多个（默认全部）星座，支持 signs=、fields= 和 convert 参数"""
+    try:
+        signs = parse_signs(request.args.get('signs'))
+    except ValueError:
+        return jsonify({"error": "Invalid signs (must be comma-separated numbers 0-11)"}), 400
+    
+    fields = tuple(f.strip() for f in request.args.get('fields', '').split(',') if f.strip()) or DEFAULT_BATCH_FIELDS
+    unknown = [f for f in fields if f not in BATCH_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+    
+    script = variants.select_variant(request.args.get('convert'), request.headers.get('Accept-Language'))
+    if script and not variants.opencc_available():
+        script = None
+    
+    entries, stale, missing = snapshot_signs(signs)
+    
+    # 请求全部星座的默认字段时，使用预构建的响应体
+    canned = len(signs) == 12 and set(fields) == set(DEFAULT_BATCH_FIELDS)
+    prepared = response_cache.get_batch(entries, fields, script, stale, missing, cache=canned)
+    status, body, headers = conditional_response(
+        prepared,
+        request.headers.get('If-None-Match'),
+        request.headers.get('Accept-Encoding'),
+        STALE_MAX_AGE if stale or missing else seconds_until_next_refresh(signs)
+    )
+    return Response(body, status=status, headers=headers)
+
+@api_bp.route("/astro/ratings", methods=['GET'])
+def astro_ratings_api():
+    """十二星座 × 各分类评分的紧凑矩阵"""
+    entries, stale, missing = snapshot_signs(range(12))
+    prepared = response_cache.get_ratings(entries, stale, missing)
+    status, body, headers = conditional_response(
+        prepared,
+        request.headers.get('If-None-Match'),
+        request.headers.get('Accept-Encoding'),
+        STALE_MAX_AGE if stale or missing else seconds_until_next_refresh(range(12))
+    )
+    return Response(body, status=status, headers=headers)
+
+@api_bp.route("/astro/changes", methods=['GET'])
+def astro_changes_api():
+    """
+    数据变化通知（长轮询）
+
+    共享存储版本号与 since 不同时立即返回当前版本号和变化的星座；否则最多等待
+    timeout 秒（默认30，不超过 ASTRO_CHANGES_MAX_WAIT），超时返回空的 changed。
+    不带 since 时直接返回当前版本号，供客户端初始化。
+    """
+    since = request.args.get('since', type=int)
+    try:
+        timeout = min(max(float(request.args.get('timeout', 30)), 0.0), CHANGES_MAX_WAIT)
+    except ValueError:
+        return jsonify({"error": "Invalid timeout"}), 400
+
+    deadline = time.monotonic() + timeout
+    while True:
+        version = store.version()
+        if since is None or version != since:
+            # 存储被重建（版本号变小）时，所有星座都视为变化
+            _, keys = store.changed_keys_since(since if since is not None and since < version else 0)
+            changed = sorted(int(key) for key in keys) if since is not None else []
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            changed = []
+            break
+        # 其他进程写入时本进程不会收到通知，按同步间隔检查一次版本号
+        with store_changed:
+            store_changed.wait(min(remaining, max(STORE_SYNC_INTERVAL, 0.1)))
+
+    response = jsonify({"version": version, "changed": changed})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def parse_flag(value):
+    """解析布尔参数（JSON 中的 true 或查询参数中的 1/true/yes/y）"""
+    if isinstance(value, bool):
+        return value
+    return str(value or '').lower() in ['1', 'true', 'yes', 'y']
+
+def job_view(job):
+    """刷新任务的对外表示，附带完成进度"""
+    per_sign = job.get("per_sign", {})
+    done = sum(1 for record in per_sign.values() if record["status"] not in ("pending", "running"))
+    return dict(job, progress={"done": done, "total": len(job["signs"])})
+
+def admin_authorized():
+    """管理接口需要 Authorization: Bearer <ASTRO_ADMIN_TOKEN> 或 X-Admin-Token 请求头"""
+    if not ADMIN_TOKEN:
+        return False
+    supplied = request.headers.get('X-Admin-Token', '')
+    auth = request.headers.get('Authorization', '')
+    if auth.startswith('Bearer '):
+        supplied = auth[len('Bearer '):]
+    return hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode())
+
 # Add route to manually trigger update
-@api_bp.route("/update", methods=['GET'])
+@api_bp.route("/update", methods=['POST'])
 def manual_update():
-    """Endpoint to manually trigger astrology data update"""
+    """
+    登记一个刷新任务并立即返回任务 ID（202），不在请求中抓取源站
+
+    需要管理员令牌（见 admin_authorized）。可选参数（JSON 请求体或表单/查询参数）：
+    signs（星座编号列表或逗号分隔的字符串，默认全部）、force（不带条件请求头重新抓取）。
+    并发的触发合并到正在运行或排队的任务。
+    """
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    
+    params = request.get_json(silent=True) or {}
+    signs = params.get('signs', request.values.get('signs'))
+    if isinstance(signs, list):
+        signs = ','.join(str(num) for num in signs)
+    try:
+        signs = parse_signs(signs)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid signs (must be numbers 0-11)"}), 400
+    force = parse_flag(params.get('force', request.values.get('force')))
+    
     try:
-        failed_signs = fetch_all_astro_data()
-        return jsonify({
-            "status": "success", 
-            "message": "Data update triggered successfully",
-            "failed_signs": failed_signs
-        })
+        job, created = store.enqueue_job(signs, force)
     except Exception as e:
-        logger.error(f"Error triggering data update: {e}")
+        logger.error(f"Error enqueuing data update: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
+    
+    # 领导者立即执行；跟随者登记的任务由领导者在 JOB_POLL_INTERVAL 秒内取走
+    kick_refresh_jobs()
+    response = jsonify(dict(job_view(job), created=created))
+    response.status_code = 202
+    response.headers['Location'] = f"/api/update/{job['id']}"
+    return response
+
+@api_bp.route("/update/<job_id>", methods=['GET'])
+def update_status(job_id):
+    """刷新任务的状态、各星座的进度、耗时和失败原因"""
+    job = store.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    response = jsonify(job_view(job))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@api_bp.route("/admin/profile", methods=['GET', 'POST'])
+def admin_profile():
+    """
+    按需性能剖析（仅管理员）
+
+    POST ?requests=N 对本进程接下来的 N 个请求做 cProfile 采样（清空上一轮统计）；
+    GET 返回采样进度和汇总的统计（?sort=cumulative|tottime|calls，?limit=30）。
+    """
+    if not admin_authorized():
+        return jsonify({"error": "Forbidden"}), 403
+    
+    if request.method == 'POST':
+        try:
+            requests_to_profile = int(request.values.get('requests', 20))
+        except ValueError:
+            return jsonify({"error": "Invalid requests"}), 400
+        if not (1 <= requests_to_profile <= PROFILE_MAX_REQUESTS):
+            return jsonify({"error": f"requests must be 1-{PROFILE_MAX_REQUESTS}"}), 400
+        profiler.arm(requests_to_profile)
+        logger.info(f"开始剖析接下来的{requests_to_profile}个请求")
+        return jsonify(dict(profiler.status(), pid=os.getpid())), 202
+    
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'calls'):
+        return jsonify({"error": "Invalid sort (must be cumulative, tottime or calls)"}), 400
+    limit = request.args.get('limit', 30, type=int)
+    response = jsonify(dict(profiler.status(), pid=os.getpid(), sort=sort, stats=profiler.report(sort, limit)))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@api_bp.route("/reload", methods=['POST'])
+def reload_cache():
+    """从共享存储重新加载其他进程（如 update_astro_data.py）写入的数据，无需重启"""
+    sync_from_store(force=True)
+    return jsonify({
+        "status": "success",
+        "version": store_version,
+        "signs": len(cache)
+    })
+
+@api_bp.route("/stats", methods=['GET'])
+def stats():
+    """运行统计：请求合并情况、刷新计划等"""
+    return jsonify({
+        "leader": is_leader(),
+        "singleflight": fetch_flight.stats(),
+        "schedule": refresh_planner.snapshot() if is_leader() else None,
+        "horizons": {horizon: sum(1 for key in list(horizon_cache) if key.split('/')[1] == horizon)
+                     for horizon in PREFETCH_HORIZONS}
+    })
 
 # Register blueprint
 app.register_blueprint(api_bp)
 
-def create_app():
-    """Application factory function for WSGI servers"""
-    # Load cache when app starts
-    load_cache()
+def cache_freshness():
+    """各星座缓存的新鲜程度：有效、过期（可先返回旧数据）和缺失"""
+    snapshot = dict(cache)
+    fresh, stale, missing = [], [], []
+    oldest = None
+    for num in range(12):
+        entry = snapshot.get(str(num))
+        if entry is None:
+            missing.append(num)
+            continue
+        (fresh if is_entry_valid(entry) else stale).append(num)
+        age = entry_age_hours(entry)
+        oldest = age if oldest is None else max(oldest, age)
+    return {
+        "fresh": fresh,
+        "stale": stale,
+        "missing": missing,
+        "oldest_age_hours": None if oldest is None or oldest == float('inf') else round(oldest, 2)
+    }
+
+@app.route("/healthz", methods=['GET'])
+def healthz():
+    """存活检查：进程能处理请求即可"""
+    return jsonify({"status": "ok"})
+
+@app.route("/readyz", methods=['GET'])
+def readyz():
+    """就绪检查：每个星座都有可提供的数据（过期数据也可以先返回）时就绪"""
+    freshness = cache_freshness()
+    ready = not freshness["missing"]
+    body = dict(freshness, status="ready" if ready else "not ready", leader=is_leader(), warming=warming.is_set(),
+                upstream=breaker.stats())
+    return jsonify(body), 200 if ready else 503
+
+@app.before_request
+def sync_shared_cache():
+    """开始阶段计时（和按需剖析）；跟随者在处理请求前同步领导者写入的最新数据"""
+    g.request_started = time.perf_counter()
+    g.timer = timing.start_request()
+    # 管理接口本身不计入剖析
+    if request.endpoint != 'api.admin_profile':
+        g.profile = profiler.begin()
+    if not is_leader():
+        with timing.stage('sync'):
+            sync_from_store()
+
+@app.after_request
+def record_request_metrics(response):
+    """记录各接口的耗时和状态码"""
+    started = getattr(g, 'request_started', None)
+    endpoint = request.endpoint or 'unmatched'
+    if started is not None:
+        metrics.http_request_duration.observe(time.perf_counter() - started, endpoint=endpoint)
+    metrics.http_responses.inc(endpoint=endpoint, status=response.status_code)
     
-    # Fetch all astrology data immediately
-    logger.info("Application startup: Fetching all astrology data")
+    timer = g.get('timer')
+    if timer is not None:
+        if SERVER_TIMING:
+            response.headers['Server-Timing'] = timer.server_timing()
+        total_ms = timer.total * 1000
+        if total_ms >= SLOW_REQUEST_MS:
+            slow_logger.warning(f"慢请求 {request.method} {request.full_path.rstrip('?')} {response.status_code} "
+                           f"{total_ms:.1f}ms {timer.summary()}")
+    return response
+
+@app.teardown_request
+def finish_request_timing(exc=None):
+    """结束阶段计时和剖析（请求出错时也会执行）"""
+    timing.finish_request()
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.end(profile)
+
+@metrics.registry.add_callback
+def collect_runtime_metrics():
+    """抓取 /metrics 时同步缓存、领导者、请求合并和转换 LRU 的状态"""
+    metrics.cache_entries.set(len(cache))
+    metrics.leader.set(1 if is_leader() else 0)
+    flight = fetch_flight.stats()
+    metrics.singleflight_calls.set_total(flight['executed'], result='executed')
+    metrics.singleflight_calls.set_total(flight['coalesced'], result='coalesced')
+    memo = variants.convert.cache_info()
+    metrics.convert_memo.set_total(memo.hits, result='hit')
+    metrics.convert_memo.set_total(memo.misses, result='miss')
+    if is_leader():
+        now = time.time()
+        for num in range(12):
+            metrics.refresh_next_check.set(max(0.0, refresh_planner.next_check(num) - now), sign=num)
+
+@app.route("/metrics", methods=['GET'])
+def metrics_endpoint():
+    """Prometheus 文本格式的指标"""
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+def stale_signs():
+    """缓存中缺失或已过期的星座"""
+    return [num for num in range(12) if not is_cache_valid(num)]
+
+def warm_stale_signs():
+    """后台预热：补发缺失的响应快照，只抓取缺失或过期的星座，期间照常用已持久化的缓存提供服务"""
+    warming.set()
     try:
-        fetch_all_astro_data()  # Synchronously fetch data at startup
+        ingest.publish_snapshot(store)
+        signs = stale_signs()
+        if signs:
+            logger.info(f"后台预热过期的星座: {signs}")
+            fetch_all_astro_data(signs)
+        if PREFETCH_HORIZONS:
+            prefetch_horizons()
     except Exception as e:
-        logger.error(f"Error fetching astrology data at startup: {e}")
-    
-    # Set up the scheduler for future updates
+        logger.error(f"Error warming astrology data at startup: {e}")
+    finally:
+        warming.clear()
+
+def become_leader():
+    """成为领导者后：启动定时更新，并在后台预热过期的星座，不阻塞 worker 启动"""
     setup_scheduler()
-    return app
+    # 上一任领导者未完成的刷新任务重新排队
+    if store.requeue_running_jobs():
+        kick_refresh_jobs()
+    threading.Thread(target=warm_stale_signs, name='astro-warmup', daemon=True).start()
 
-if __name__ == "__main__":
-    # Load cache at startup
+def watch_leadership():
+    """跟随者定期尝试接管领导权（原领导者进程退出后文件锁会自动释放）"""
+    while not leader_lock.try_acquire():
+        time.sleep(LEADER_RETRY_INTERVAL)
+    logger.info("原领导者已退出，接管调度和抓取")
     load_cache()
+    become_leader()
+
+def create_app():
+    """Application factory function for WSGI servers"""
+    # 选举领导者：只有一个进程负责调度和抓取
+    leader = leader_lock.try_acquire()
     
-    # Fetch all astrology data immediately
-    logger.info("Application startup: Fetching all astrology data")
-    try:
-        fetch_all_astro_data()  # Synchronously fetch data at startup
-    except Exception as e:
-        logger.error(f"Error fetching astrology data at startup: {e}")
+    # Load cache when app starts
+    load_cache()
     
-    # Set up scheduler
-    setup_scheduler()
+    if leader:
+        become_leader()
+    else:
+        logger.info("当前进程为跟随者，只从共享存储读取数据")
+        threading.Thread(target=watch_leadership, name='astro-leader-watch', daemon=True).start()
+    return app
+
+if __name__ == "__main__":
+    create_app()
     
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark the page extraction backends on the recorded fixture pages.
+
+Compares every available backend in extract.py against the original approach
+(a full BeautifulSoup tree of the whole page) for parse time and peak memory,
+and verifies that all backends produce identical output. Memory is the peak
+RSS (VmHWM, or getrusage ru_maxrss off Linux) of a fresh subprocess that loads the backend and
+extracts every page, minus that of a subprocess that only loads the pages. It
+therefore includes C-level allocations such as lxml's libxml2 tree and the
+backend's own imports, which tracemalloc cannot see.
+
+Usage:
+    python bench/bench_extract.py [--iterations 50] [--fixtures DIR] [--json out.json]
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import resource
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extract  # noqa: E402
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+
+
+class FullSoupExtractor(extract.Extractor):
+    """The original approach: build the whole page tree, then select the block"""
+
+    name = 'full-soup (baseline)'
+
+    def extract(self, text):
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(text, 'html.parser')
+        titles = [h3.text for h3 in soup.select("div.TODAY_CONTENT > h3")]
+        items = [p.text for p in soup.select("div.TODAY_CONTENT > p")]
+        return self._result(titles, items)
+
+
+def load_pages(directory):
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(directory, 'daily_*.html'))):
+        with open(path, encoding='utf-8') as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+
+def get_extractor(name):
+    return FullSoupExtractor() if name == FullSoupExtractor.name else extract.get_extractor(name)
+
+
+def max_rss_kib():
+    """Peak RSS of this process so far in KiB"""
+    # ru_maxrss survives exec on Linux, so a child would report its parent's peak; VmHWM starts fresh
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return float(line.split()[1])
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform == 'darwin' else peak
+
+
+# --rss-child value for the baseline subprocess that loads the pages but no backend
+NO_BACKEND = 'none'
+
+
+def rss_child(name, directory):
+    """Run in a fresh interpreter: print the peak RSS (KiB) after extracting every page once"""
+    pages = load_pages(directory)
+    if name != NO_BACKEND:
+        extractor = get_extractor(name)
+        for text in pages.values():
+            extractor.extract(text)
+    print(max_rss_kib())
+
+
+def peak_rss(name, directory):
+    """Peak RSS in KiB of a fresh subprocess, so every backend starts from a clean peak"""
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--fixtures', directory,
+                             '--rss-child', name], capture_output=True, text=True, check=True)
+    return float(result.stdout.strip())
+
+
+def measure(extractor, pages, iterations, directory, baseline_rss):
+    """Return (mean ms per page, peak RSS over the no-backend baseline in KiB, outputs)"""
+    outputs = {name: extractor.extract(text) for name, text in pages.items()}
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for text in pages.values():
+            extractor.extract(text)
+    elapsed = time.perf_counter() - started
+    mean_ms = elapsed / (iterations * len(pages)) * 1000
+    return mean_ms, max(0.0, peak_rss(extractor.name, directory) - baseline_rss), outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--rss-child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.rss_child:
+        rss_child(args.rss_child, args.fixtures)
+        return 0
+
+    pages = load_pages(args.fixtures)
+    if not pages:
+        print(f"No fixture pages found in {args.fixtures}")
+        return 1
+
+    extractors = [FullSoupExtractor()] if extract.SoupExtractor.available() else []
+    extractors += [extract.get_extractor(name) for name in extract.available_backends()]
+
+    baseline_rss = peak_rss(NO_BACKEND, args.fixtures)
+    results = []
+    reference = None
+    mismatches = []
+    for extractor in extractors:
+        mean_ms, peak_kib, outputs = measure(extractor, pages, args.iterations, args.fixtures, baseline_rss)
+        if reference is None:
+            reference = outputs
+        elif outputs != reference:
+            mismatches.append(extractor.name)
+        results.append({"backend": extractor.name, "mean_ms": round(mean_ms, 3), "rss_kib": round(peak_kib, 1)})
+
+    print(f"{len(pages)} pages, {args.iterations} iterations")
+    print(f"{'backend':<24}{'ms/page':>10}{'+RSS KiB':>12}")
+    for row in results:
+        print(f"{row['backend']:<24}{row['mean_ms']:>10.3f}{row['rss_kib']:>12.1f}")
+    print(f"auto-selected backend: {extract.available_backends()[0]}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"pages": len(pages), "iterations": args.iterations, "results": results,
+                       "mismatches": mismatches}, f, indent=2)
+
+    if mismatches:
+        print(f"OUTPUT MISMATCH: {', '.join(mismatches)}")
+        return 1
+    print("all backends produced identical output")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Benchmark the service's scraping paths against the local upstream stand-in.
+
+Runs fetch_all_astro_data, retry_failed_signs, fetch_astro_data and
+prefetch_horizons from astro_api.py against bench/fixture_server.py (no network needed) under a set
+of scenarios, and reports per scenario:
+
+- wall:      refresh wall-clock time, seconds (median of --repeat runs)
+- requests:  upstream requests seen by the stand-in, including retries
+- retries:   requests beyond one per page (sign and horizon) that was fetched
+- statuses:  upstream responses by status
+- parse:     total page parse time, milliseconds
+- failed:    signs still failing after the refresh (and after retry_failed_signs)
+
+Results are compared against a baseline file (bench/baseline_scrape.json by
+default). Request counts and failures are deterministic for a given scenario
+and must match; wall time may not exceed the baseline by more than
+--tolerance (relative) plus 50 ms. Exits with 1 on a regression.
+
+All state (cache file, shared stores, history, leader lock, refresh schedule,
+response snapshot, per-sign files) lives in a temporary directory.
+
+Usage:
+    python bench/bench_scrape.py [--repeat 3] [--scenario NAME ...] [--json out.json]
+    python bench/bench_scrape.py --save-baseline
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import shutil
+import tempfile
+import statistics
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fixture_server import FixtureServer  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline_scrape.json')
+WALL_SLACK = 0.05
+
+# stand-in settings each scenario starts from
+DEFAULT_SERVER = dict(latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, timeout_rate=0.0,
+                      hang=30.0, retry_after=0)
+
+# name -> (stand-in settings, run(server, app) -> (failed signs, still failing after retry))
+SCENARIOS = {}
+
+
+def scenario(name, **server_options):
+    def register(fn):
+        SCENARIOS[name] = (server_options, fn)
+        return fn
+    return register
+
+
+def refresh_all(app):
+    """One scheduled refresh followed by the retry pass, as the scheduler runs it"""
+    failed = app.fetch_all_astro_data()
+    if failed:
+        app.retry_failed_signs(failed)
+    return failed, [num for num in failed if not app.is_cache_valid(num)]
+
+
+@scenario('cold')
+def cold(server, app):
+    """Empty cache: every sign is fetched and parsed"""
+    return refresh_all(app)
+
+
+@scenario('unchanged', warm=True)
+def unchanged(server, app):
+    """Warm cache, nothing changed upstream: conditional requests answered with 304"""
+    return refresh_all(app)
+
+
+@scenario('pages-changed', warm=True)
+def pages_changed(server, app):
+    """Warm cache, three pages changed upstream"""
+    for num in (1, 5, 9):
+        server.change_page(num)
+    return refresh_all(app)
+
+
+@scenario('latency', latency=0.2, jitter=0.05)
+def latency(server, app):
+    """Cold refresh against a slow upstream"""
+    return refresh_all(app)
+
+
+@scenario('server-errors', error_rate=0.3)
+def server_errors(server, app):
+    """Cold refresh, 30% of requests answered with 5xx"""
+    return refresh_all(app)
+
+
+@scenario('throttled', throttle_rate=0.3)
+def throttled(server, app):
+    """Cold refresh, 30% of requests answered with 429"""
+    return refresh_all(app)
+
+
+@scenario('timeouts', timeout_rate=0.15, hang=3.0)
+def timeouts(server, app):
+    """Cold refresh, 15% of requests hang past the client read timeout"""
+    return refresh_all(app)
+
+
+@scenario('outage', error_rate=1.0)
+def outage(server, app):
+    """Cold refresh while every request fails: the circuit breaker opens and the rest fail fast"""
+    return refresh_all(app)
+
+
+@scenario('horizons', warm=True)
+def horizon_prefetch(server, app):
+    """Warm daily cache, prefetch tomorrow/weekly/monthly; an immediate second pass finds nothing due"""
+    failed = app.prefetch_horizons()
+    return failed, app.prefetch_horizons()
+
+
+@scenario('single-sign')
+def single_sign(server, app):
+    """Request-path cache miss for each sign in turn (fetch_astro_data)"""
+    failed = []
+    for num in range(12):
+        try:
+            app.fetch_astro_data(num)
+        except Exception:
+            failed.append(num)
+    return failed, failed
+
+
+class ParseTimer:
+    """Wraps parse_astro_page to accumulate parse time"""
+
+    def __init__(self, parse):
+        self.parse = parse
+        self.total = 0.0
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self.parse(*args, **kwargs)
+        finally:
+            self.total += time.perf_counter() - started
+            self.calls += 1
+
+
+def reset_state(app):
+    app.cache.clear()
+    app.horizon_cache.clear()
+    app._horizon_checked.clear()
+    app.response_cache.clear()
+    app.breaker.reset()
+
+
+def run_once(name, server, app, timer):
+    options, fn = SCENARIOS[name]
+    options = dict(options)
+    warm = options.pop('warm', False)
+    server.configure(**dict(DEFAULT_SERVER, **options))
+    server.revisions.clear()
+    reset_state(app)
+    if warm:
+        app.fetch_all_astro_data()
+
+    server.reset_stats()
+    timer.total, timer.calls = 0.0, 0
+    started = time.perf_counter()
+    failed, failed_after_retry = fn(server, app)
+    wall = time.perf_counter() - started
+    app.cache_writer.flush()
+
+    stats = server.stats()
+    return {
+        "wall_s": wall,
+        "requests": stats['requests'],
+        "retries": stats['requests'] - stats['pages'],
+        "statuses": stats['statuses'],
+        "parse_ms": timer.total * 1000,
+        "parses": timer.calls,
+        "failed": sorted(failed),
+        "failed_after_retry": sorted(failed_after_retry),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regression messages"""
+    problems = []
+    if baseline.get('settings') != results['settings']:
+        print(f"note: settings differ from baseline ({baseline.get('settings')}), wall times are not comparable")
+    for name, row in results['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            continue
+        for key in ('requests', 'failed_after_retry'):
+            if row[key] != base[key]:
+                problems.append(f"{name}: {key} {base[key]} -> {row[key]}")
+        if baseline.get('settings') == results['settings']:
+            limit = base['wall_s'] * (1 + tolerance) + WALL_SLACK
+            if row['wall_s'] > limit:
+                problems.append(f"{name}: wall {base['wall_s']:.3f}s -> {row['wall_s']:.3f}s")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='run only these')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='write results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative wall time increase')
+    parser.add_argument('--min-interval', type=float, default=0.05,
+                        help='host politeness interval for the run (ASTRO_HOST_MIN_INTERVAL)')
+    parser.add_argument('--read-timeout', type=float, default=1.0, help='upstream read timeout for the run')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='astro-bench-')
+    os.environ['ASTRO_HOST_MIN_INTERVAL'] = str(args.min_interval)
+    os.environ['ASTRO_STORE_FILE'] = os.path.join(workdir, 'store.sqlite3')
+    os.environ['ASTRO_HISTORY_FILE'] = os.path.join(workdir, 'history.sqlite3')
+    os.environ['ASTRO_LEADER_LOCK_FILE'] = os.path.join(workdir, 'leader.lock')
+    os.environ['ASTRO_SCHEDULE_FILE'] = os.path.join(workdir, 'schedule.json')
+    os.environ['ASTRO_SNAPSHOT_FILE'] = os.path.join(workdir, 'snapshot.bin')
+    os.environ['ASTRO_SIGNS_DIR'] = os.path.join(workdir, 'signs')
+    os.environ['ASTRO_HORIZON_STORE_FILE'] = os.path.join(workdir, 'horizons.sqlite3')
+    os.environ['ASTRO_ARCHIVE_FILE'] = os.path.join(workdir, 'archive.sqlite3')
+
+    server = FixtureServer().start()
+    os.environ['ASTRO_UPSTREAM_HOST'] = server.host
+
+    import logging
+    import ingest
+    import upstream
+    import astro_api as app
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+    app.CACHE_FILE = os.path.join(workdir, 'astro_cache.json')
+    app.leader_lock.try_acquire()
+    upstream.UPSTREAM_TIMEOUT = (upstream.UPSTREAM_TIMEOUT[0], args.read_timeout)
+    timer = ParseTimer(upstream.parse_astro_page)
+    upstream.parse_astro_page = timer
+    ingest.parse_astro_page = timer
+
+    names = args.scenario or list(SCENARIOS)
+    results = {
+        "settings": {
+            "min_interval": args.min_interval,
+            "read_timeout": args.read_timeout,
+            "concurrency": app.fetch_engine.concurrency,
+            "host_max_concurrency": upstream.host_budget.max_concurrency,
+        },
+        "repeat": args.repeat,
+        "scenarios": {},
+    }
+    try:
+        for name in names:
+            runs = [run_once(name, server, app, timer) for _ in range(max(1, args.repeat))]
+            row = dict(runs[-1])
+            row['wall_s'] = round(statistics.median(run['wall_s'] for run in runs), 3)
+            row['parse_ms'] = round(statistics.median(run['parse_ms'] for run in runs), 2)
+            results['scenarios'][name] = row
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'scenario':<16}{'wall s':>8}{'requests':>10}{'retries':>9}{'parse ms':>10}  failed  statuses")
+    for name, row in results['scenarios'].items():
+        statuses = ' '.join(f"{status}:{count}" for status, count in row['statuses'].items())
+        print(f"{name:<16}{row['wall_s']:>8.3f}{row['requests']:>10}{row['retries']:>9}{row['parse_ms']:>10.2f}"
+              f"  {len(row['failed'])}/{len(row['failed_after_retry'])}  {statuses}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        problems = compare(results, json.load(f), args.tolerance)
+    if problems:
+        print("REGRESSIONS:")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+    print("no regressions against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
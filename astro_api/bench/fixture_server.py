@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the click108 upstream that replays the recorded fixture pages.
+
+Serves fixtures/daily_{num}.html at /daily_{num}.php with ETag/Last-Modified
+and 304 support, plus the other horizons: /daily_{num}.php?iAcDay=<date>
+(tomorrow), /weekly_{num}.php and /monthly_{num}.php. Horizons without a
+recorded fixtures/{horizon}_{num}.html are derived from the daily page with a
+relabelled heading, so each horizon has its own content hash. It can inject
+the failure modes seen in production:
+
+- latency:   fixed delay plus uniform jitter before every response
+- errors:    a fraction of requests answered with 500/502/503
+- throttle:  a fraction of requests answered with 429 (with Retry-After)
+- timeouts:  a fraction of requests that hang longer than the client timeout
+- changes:   change_page(num) alters a page so its content hash and ETag change
+
+Fault decisions are derived from (seed, sign, horizon, attempt number for that
+page), so a scenario injects the same faults on every run regardless of request order.
+
+Run standalone and point the service at it:
+    python bench/fixture_server.py --port 8108 --latency 0.2 --error-rate 0.1
+    ASTRO_UPSTREAM_HOST=127.0.0.1:8108 python astro_api.py
+
+While running standalone, GET /_control/stats returns request counters,
+GET /_control/change?sign=3 changes a page and GET /_control/reset clears
+the counters.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from email.utils import formatdate
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+
+PAGE_PATH = re.compile(r'^/(daily|weekly|monthly)_(\d+)\.php$')
+ERROR_STATUSES = (500, 502, 503)
+
+# heading labels for horizons derived from the daily fixture
+HORIZON_LABELS = {'tomorrow': '明日', 'weekly': '本週', 'monthly': '本月'}
+
+
+class FixtureServer:
+    """Threaded HTTP server replaying fixture pages with configurable faults"""
+
+    def __init__(self, fixtures=DEFAULT_FIXTURES, host='127.0.0.1', port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, throttle_rate=0.0, timeout_rate=0.0, hang=30.0, retry_after=0, seed=0):
+        self.pages = {}
+        self.horizon_pages = {}
+        for num in range(12):
+            path = os.path.join(fixtures, f'daily_{num}.html')
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    self.pages[num] = f.read()
+            for horizon in ('weekly', 'monthly'):
+                path = os.path.join(fixtures, f'{horizon}_{num}.html')
+                if os.path.exists(path):
+                    with open(path, encoding='utf-8') as f:
+                        self.horizon_pages[horizon, num] = f.read()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.timeout_rate = timeout_rate
+        self.hang = hang
+        self.retry_after = retry_after
+        self.seed = seed
+        self.revisions = Counter()
+        self._lock = threading.Lock()
+        self._attempts = Counter()
+        self.requests = 0
+        self.statuses = Counter()
+        self.per_sign = Counter()
+        self.per_horizon = Counter()
+        self.pages_requested = set()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._httpd.block_on_close = False
+        self._thread = None
+
+    @property
+    def host(self):
+        """host:port to use as ASTRO_UPSTREAM_HOST"""
+        address, port = self._httpd.server_address[:2]
+        return f'{address}:{port}'
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def configure(self, **options):
+        """Change fault settings between scenarios; resets the per-sign attempt counters"""
+        for name, value in options.items():
+            if not hasattr(self, name):
+                raise AttributeError(name)
+            setattr(self, name, value)
+        with self._lock:
+            self._attempts.clear()
+
+    def change_page(self, num):
+        """Make sign num serve different content from now on"""
+        with self._lock:
+            self.revisions[num] += 1
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = 0
+            self.statuses.clear()
+            self.per_sign.clear()
+            self.per_horizon.clear()
+            self.pages_requested.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "statuses": {str(status): count for status, count in sorted(self.statuses.items(), key=str)},
+                "per_sign": {str(num): count for num, count in sorted(self.per_sign.items())},
+                "per_horizon": dict(sorted(self.per_horizon.items())),
+                "pages": len(self.pages_requested),
+            }
+
+    def page(self, num, horizon='daily'):
+        """Page body for the current revision of sign num"""
+        text = self.horizon_pages.get((horizon, num)) or self.pages[num]
+        if horizon != 'daily' and (horizon, num) not in self.horizon_pages:
+            text = text.replace('<h3>今日', f'<h3>{HORIZON_LABELS[horizon]}', 1)
+        revision = self.revisions[num]
+        if revision:
+            text = text.replace('</h3>', f' (rev {revision})</h3>', 1)
+        return text
+
+    def _fault(self, num, horizon='daily'):
+        """Pick the injected fault for this request: None, 'timeout', 429 or a 5xx status"""
+        # daily pages keep the original (seed, sign, attempt) sequence
+        key = num if horizon == 'daily' else f'{num}/{horizon}'
+        with self._lock:
+            attempt = self._attempts[key]
+            self._attempts[key] += 1
+        rng = random.Random(f'{self.seed}:{key}:{attempt}')
+        roll = rng.random()
+        if roll < self.timeout_rate:
+            return 'timeout'
+        roll -= self.timeout_rate
+        if roll < self.throttle_rate:
+            return 429
+        roll -= self.throttle_rate
+        if roll < self.error_rate:
+            return rng.choice(ERROR_STATUSES)
+        return None
+
+    def _record(self, num, status, horizon='daily'):
+        with self._lock:
+            self.requests += 1
+            self.statuses[status] += 1
+            if num is not None:
+                self.per_sign[num] += 1
+                self.per_horizon[horizon] += 1
+                self.pages_requested.add((num, horizon))
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b'', headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path.startswith('/_control/'):
+                    return self._control(url)
+
+                match = PAGE_PATH.match(url.path)
+                num = int(match.group(2)) if match else None
+                horizon = match.group(1) if match else 'daily'
+                if horizon == 'daily' and 'iAcDay' in parse_qs(url.query):
+                    horizon = 'tomorrow'
+                if num not in server.pages:
+                    server._record(num, 404)
+                    return self._send(404, b'not found')
+
+                delay = server.latency + (random.uniform(0, server.jitter) if server.jitter else 0)
+                if delay:
+                    time.sleep(delay)
+
+                fault = server._fault(num, horizon)
+                if fault == 'timeout':
+                    server._record(num, 'timeout', horizon)
+                    time.sleep(server.hang)
+                    self.close_connection = True
+                    return
+                if fault is not None:
+                    server._record(num, fault, horizon)
+                    headers = {'Retry-After': str(server.retry_after)} if fault == 429 else None
+                    return self._send(fault, b'injected failure', headers)
+
+                body = server.page(num, horizon).encode('utf-8')
+                etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+                headers = {
+                    'ETag': etag,
+                    'Last-Modified': formatdate(1700000000 + server.revisions[num] * 3600, usegmt=True),
+                }
+                if self.headers.get('If-None-Match') == etag:
+                    server._record(num, 304, horizon)
+                    return self._send(304, headers=headers)
+                server._record(num, 200, horizon)
+                headers['Content-Type'] = 'text/html; charset=utf-8'
+                self._send(200, body, headers)
+
+            def _control(self, url):
+                query = parse_qs(url.query)
+                if url.path == '/_control/change':
+                    for num in query.get('sign', []):
+                        server.change_page(int(num))
+                elif url.path == '/_control/reset':
+                    server.reset_stats()
+                elif url.path != '/_control/stats':
+                    return self._send(404, b'not found')
+                body = json.dumps(server.stats()).encode('utf-8')
+                self._send(200, body, {'Content-Type': 'application/json'})
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8108)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra uniform random delay, seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction answered with 5xx')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction answered with 429')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='fraction that hang')
+    parser.add_argument('--hang', type=float, default=30.0, help='how long a hanging request sleeps')
+    parser.add_argument('--retry-after', type=int, default=0, help='Retry-After sent with 429')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = FixtureServer(args.fixtures, args.host, args.port, args.latency, args.jitter, args.error_rate,
+                           args.throttle_rate, args.timeout_rate, args.hang, args.retry_after, args.seed)
+    if not server.pages:
+        print(f"No fixture pages found in {args.fixtures}")
+        return 1
+    print(f"serving {len(server.pages)} fixture pages on http://{server.host}/daily_{{num}}.php")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of the WSGI app under gunicorn worker/thread configurations.
+
+For every configuration (workers x threads) the harness starts
+`gunicorn wsgi:app` against bench/fixture_server.py (no network needed), with
+all state in a temporary directory, waits until it is ready and drives it with
+a multi-process HTTP client in two phases:
+
+- steady:   mixed traffic over all signs once the cache is warm
+            (/astro_api, /api/astro/<num>, each with and without convert=)
+- rollover: the day has just rolled over; the service restarts on a store whose
+            entries are all dated yesterday and every client hits it at once,
+            so the stale-while-revalidate / single-flight / warmup paths race
+
+and reports per configuration and phase:
+
+- rps:       completed requests per second
+- p50/p95/p99: request latency, milliseconds
+- errors:    fraction of requests that failed or returned >= 500
+- rss:       peak resident memory per gunicorn worker, MiB (Linux /proc)
+- upstream:  requests the stand-in saw during the phase
+
+Results are written as JSON (--json) and a previous results file can be given
+with --compare to print the relative change per configuration and phase.
+
+Usage:
+    python bench/load_test.py [--configs 1x1,2x4,4x8] [--duration 10] [--clients 4] [--concurrency 8]
+    python bench/load_test.py --json load.json --compare previous.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import subprocess
+import threading
+import http.client
+import multiprocessing
+from collections import Counter
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fixture_server import FixtureServer  # noqa: E402
+
+# (weight, path template) of the traffic mix
+TRAFFIC_MIX = (
+    (35, '/astro_api?num={num}'),
+    (10, '/astro_api?num={num}&convert=true'),
+    (35, '/api/astro/{num}'),
+    (20, '/api/astro/{num}?convert=true'),
+)
+READY_TIMEOUT = 60.0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def parse_configs(value):
+    """'1x1,2x4' -> [(1, 1), (2, 4)]"""
+    configs = []
+    for part in value.split(','):
+        workers, _, threads = part.strip().partition('x')
+        configs.append((int(workers), int(threads or 1)))
+    return configs
+
+
+# ---------------------------------------------------------------- client side
+
+def client_worker(port, deadline, concurrency, seed, result_queue):
+    """One client process: `concurrency` threads with keep-alive connections until `deadline`"""
+    paths = [template for _, template in TRAFFIC_MIX]
+    weights = [weight for weight, _ in TRAFFIC_MIX]
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+
+    def run(thread_seed):
+        rng = random.Random(thread_seed)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local_latencies, local_statuses = [], Counter()
+        while time.time() < deadline:
+            path = rng.choices(paths, weights)[0].format(num=rng.randrange(12))
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+                if response.getheader('Connection', '').lower() == 'close':
+                    conn.close()
+            except (OSError, http.client.HTTPException):
+                status = 'error'
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            local_latencies.append(time.perf_counter() - started)
+            local_statuses[status] += 1
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+
+    threads = [threading.Thread(target=run, args=(f'{seed}:{i}',)) for i in range(concurrency)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+    result_queue.put((latencies, {str(status): count for status, count in statuses.items()}, elapsed))
+
+
+def drive(port, duration, clients, concurrency, seed):
+    """Run the client processes for about `duration` seconds, return (latencies, statuses, rps)"""
+    ctx = multiprocessing.get_context('spawn')
+    result_queue = ctx.Queue()
+    # start all clients against the same deadline so they overlap fully
+    deadline = time.time() + duration + 1.0
+    processes = [ctx.Process(target=client_worker, args=(port, deadline, concurrency, f'{seed}:{i}', result_queue))
+                 for i in range(clients)]
+    for process in processes:
+        process.start()
+    latencies, statuses, rps = [], Counter(), 0.0
+    for _ in processes:
+        part, part_statuses, elapsed = result_queue.get()
+        latencies.extend(part)
+        statuses.update(part_statuses)
+        rps += len(part) / elapsed if elapsed > 0 else 0.0
+    for process in processes:
+        process.join()
+    return latencies, statuses, rps
+
+
+# ---------------------------------------------------------------- server side
+
+def child_pids(pid):
+    """Direct children of pid (the gunicorn workers), from /proc"""
+    children = []
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return children
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # the command name may contain spaces; ppid is the 2nd field after ')'
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+def rss_mib(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class RssSampler:
+    """Samples the RSS of every gunicorn worker in the background and keeps the peaks"""
+
+    def __init__(self, master_pid, interval=0.5):
+        self.master_pid = master_pid
+        self.interval = interval
+        self.peaks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        for pid in child_pids(self.master_pid):
+            rss = rss_mib(pid)
+            if rss is not None:
+                self.peaks[pid] = max(self.peaks.get(pid, 0.0), rss)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+class Service:
+    """gunicorn running wsgi:app with its state in workdir"""
+
+    def __init__(self, workers, threads, workdir, upstream_host, app='wsgi:app'):
+        self.port = free_port()
+        env = dict(
+            os.environ,
+            ASTRO_UPSTREAM_HOST=upstream_host,
+            ASTRO_CACHE_FILE=os.path.join(workdir, 'astro_cache.json'),
+            ASTRO_STORE_FILE=os.path.join(workdir, 'store.sqlite3'),
+            ASTRO_HISTORY_FILE=os.path.join(workdir, 'history.sqlite3'),
+            ASTRO_HORIZON_STORE_FILE=os.path.join(workdir, 'horizons.sqlite3'),
+            ASTRO_ARCHIVE_FILE=os.path.join(workdir, 'archive.sqlite3'),
+            ASTRO_LEADER_LOCK_FILE=os.path.join(workdir, 'leader.lock'),
+            ASTRO_INGEST_LOCK_FILE=os.path.join(workdir, 'ingest.lock'),
+            ASTRO_SCHEDULE_FILE=os.path.join(workdir, 'schedule.json'),
+            ASTRO_SNAPSHOT_FILE=os.path.join(workdir, 'snapshot.bin'),
+            ASTRO_SIGNS_DIR=os.path.join(workdir, 'signs'),
+            # only the daily pages take part in the measured traffic
+            ASTRO_PREFETCH_HORIZONS='',
+        )
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(threads),
+             '--bind', f'127.0.0.1:{self.port}', '--chdir', APP_DIR, '--log-level', 'warning', app],
+            env=env, stdout=subprocess.DEVNULL, stderr=open(os.path.join(workdir, 'gunicorn.log'), 'ab'),
+        )
+
+    def wait_ready(self, timeout=READY_TIMEOUT):
+        """Wait until /readyz answers 200"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with {self.process.returncode}")
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=2)
+                conn.request('GET', '/readyz')
+                if conn.getresponse().status == 200:
+                    return
+            except (OSError, http.client.HTTPException):
+                pass
+            time.sleep(0.2)
+        raise RuntimeError("service did not become ready")
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+
+def wait_upstream_idle(server, quiet=1.0, timeout=READY_TIMEOUT):
+    """Wait until the stand-in has seen no request for `quiet` seconds (startup warmup finished)"""
+    deadline = time.time() + timeout
+    last, since = server.stats()['requests'], time.time()
+    while time.time() < deadline:
+        time.sleep(0.1)
+        current = server.stats()['requests']
+        if current != last:
+            last, since = current, time.time()
+        elif time.time() - since >= quiet:
+            return
+
+
+def age_store(workdir):
+    """Date every stored entry yesterday, as if the service restarted right after midnight"""
+    from shared_store import SqliteStore
+    store = SqliteStore(os.path.join(workdir, 'store.sqlite3'))
+    _, entries = store.load_all()
+    yesterday = datetime.now() - timedelta(days=1)
+    for entry in entries.values():
+        entry['date'] = yesterday.strftime('%Y-%m-%d')
+        entry['timestamp'] = yesterday.isoformat()
+    store.put_many(entries)
+    for name in ('astro_cache.json', 'snapshot.bin'):
+        try:
+            os.remove(os.path.join(workdir, name))
+        except OSError:
+            pass
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def summarize(latencies, statuses, rps, sampler, upstream_requests):
+    latencies = sorted(latencies)
+    total = sum(statuses.values())
+    errors = sum(count for status, count in statuses.items() if status == 'error' or int(status) >= 500)
+    rss = sorted(sampler.peaks.values())
+    return {
+        "requests": total,
+        "rps": round(rps, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        "error_rate": round(errors / total, 4) if total else None,
+        "statuses": dict(sorted(statuses.items())),
+        "rss_mib_per_worker": [round(value, 1) for value in rss],
+        "rss_mib_max": round(rss[-1], 1) if rss else None,
+        "upstream_requests": upstream_requests,
+    }
+
+
+def run_phase(service, server, args, seed, duration):
+    """Drive one phase; upstream requests are counted since the last reset of the stand-in"""
+    with RssSampler(service.process.pid) as sampler:
+        latencies, statuses, rps = drive(service.port, duration, args.clients, args.concurrency, seed)
+    return summarize(latencies, statuses, rps, sampler, server.stats()['requests'])
+
+
+def run_config(workers, threads, server, args):
+    """Both phases for one gunicorn configuration"""
+    workdir = tempfile.mkdtemp(prefix='astro-load-')
+    results = {}
+    try:
+        service = Service(workers, threads, workdir, server.host, args.app)
+        try:
+            service.wait_ready()
+            wait_upstream_idle(server)
+            server.reset_stats()
+            results['steady'] = run_phase(service, server, args, f'{args.seed}:steady', args.duration)
+        finally:
+            service.stop()
+
+        if args.rollover:
+            age_store(workdir)
+            # count the restart's warmup too: it races the storm for the same signs
+            server.reset_stats()
+            service = Service(workers, threads, workdir, server.host, args.app)
+            try:
+                # stale entries already count as ready, so the storm starts while the leader warms up
+                service.wait_ready()
+                results['rollover'] = run_phase(service, server, args, f'{args.seed}:rollover',
+                                                args.rollover_duration)
+            finally:
+                service.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def compare(results, previous):
+    """Print the relative change of rps and p99 against a previous results file"""
+    old_runs = {(run['workers'], run['threads'], run['phase']): run for run in previous.get('runs', [])}
+    print("\nchange vs previous run:")
+    for run in results['runs']:
+        old = old_runs.get((run['workers'], run['threads'], run['phase']))
+        if old is None:
+            continue
+        changes = []
+        for key in ('rps', 'p99_ms', 'rss_mib_max', 'upstream_requests'):
+            if old.get(key) and run.get(key) is not None:
+                changes.append(f"{key} {(run[key] - old[key]) / old[key] * 100:+.1f}%")
+        print(f"  {run['workers']}x{run['threads']} {run['phase']:<9} " + ', '.join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--configs', default='1x1,2x4,4x8', help='gunicorn WORKERSxTHREADS, comma separated')
+    parser.add_argument('--app', default='wsgi:app', help='WSGI application (e.g. wsgi_light:app)')
+    parser.add_argument('--duration', type=float, default=10.0, help='steady phase length, seconds')
+    parser.add_argument('--rollover-duration', type=float, default=10.0, help='rollover phase length, seconds')
+    parser.add_argument('--no-rollover', dest='rollover', action='store_false', help='skip the rollover phase')
+    parser.add_argument('--clients', type=int, default=4, help='client processes')
+    parser.add_argument('--concurrency', type=int, default=8, help='connections per client process')
+    parser.add_argument('--upstream-latency', type=float, default=0.1, help='stand-in response delay, seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='previous results file to compare against')
+    args = parser.parse_args()
+
+    server = FixtureServer(latency=args.upstream_latency).start()
+    results = {
+        "settings": {
+            "app": args.app,
+            "duration": args.duration,
+            "rollover_duration": args.rollover_duration if args.rollover else None,
+            "clients": args.clients,
+            "concurrency": args.concurrency,
+            "upstream_latency": args.upstream_latency,
+            "cpus": os.cpu_count(),
+        },
+        "started_at": datetime.now().isoformat(timespec='seconds'),
+        "runs": [],
+    }
+    try:
+        for workers, threads in parse_configs(args.configs):
+            print(f"running {workers} workers x {threads} threads ...", flush=True)
+            for phase, row in run_config(workers, threads, server, args).items():
+                results['runs'].append(dict(row, workers=workers, threads=threads, phase=phase))
+    finally:
+        server.stop()
+
+    print(f"\n{'config':<8}{'phase':<10}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'errors':>8}{'rss MiB':>9}{'upstream':>10}")
+    for run in results['runs']:
+        print(f"{run['workers']}x{run['threads']:<6}{run['phase']:<10}{run['rps']:>9.1f}"
+              f"{run['p50_ms'] or 0:>9.2f}{run['p95_ms'] or 0:>9.2f}{run['p99_ms'] or 0:>9.2f}"
+              f"{(run['error_rate'] or 0) * 100:>7.2f}%{run['rss_mib_max'] or 0:>9.1f}{run['upstream_requests']:>10}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
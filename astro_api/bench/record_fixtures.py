@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Record the live click108 daily pages into fixtures/ for offline benchmarks.
+
+The pages shipped in fixtures/ mirror the upstream layout; run this script
+from a machine with network access to replace them with real recordings.
+
+Usage:
+    python bench/record_fixtures.py [--out fixtures]
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from upstream import create_robust_session, fetch_page, parse_astro_page  # noqa: E402
+
+DEFAULT_OUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--out', default=DEFAULT_OUT)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    session = create_robust_session()
+    failed = []
+    for num in range(12):
+        try:
+            r = fetch_page(session, num)
+            parse_astro_page(r.text, num)  # make sure the page is usable before saving it
+            with open(os.path.join(args.out, f'daily_{num}.html'), 'w', encoding='utf-8') as f:
+                f.write(r.text)
+            print(f"recorded daily_{num}.html ({len(r.text)} chars)")
+        except Exception as e:
+            print(f"failed to record sign {num}: {e}")
+            failed.append(num)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+源站熔断器
+
+包在每次源站请求外面，按滚动时间窗口统计错误率和延迟：
+- closed：正常放行；窗口内请求数足够且失败（异常、5xx/429 或超过慢调用阈值）比例过高时打开
+- open：直接抛出 CircuitOpenError，不占用线程等待源站；冷却时间过后进入 half-open
+- half-open：只放行少量试探请求，成功则关闭，失败则重新打开并加倍冷却时间
+"""
+
+import os
+import time
+import threading
+from collections import deque
+
+import metrics
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+STATES = (CLOSED, HALF_OPEN, OPEN)
+
+# 可通过环境变量调整
+BREAKER_WINDOW = float(os.environ.get('ASTRO_BREAKER_WINDOW', 60))
+BREAKER_MIN_CALLS = int(os.environ.get('ASTRO_BREAKER_MIN_CALLS', 5))
+BREAKER_ERROR_RATE = float(os.environ.get('ASTRO_BREAKER_ERROR_RATE', 0.5))
+BREAKER_SLOW_CALL = float(os.environ.get('ASTRO_BREAKER_SLOW_CALL', 10))
+BREAKER_OPEN_SECONDS = float(os.environ.get('ASTRO_BREAKER_OPEN_SECONDS', 30))
+BREAKER_MAX_OPEN_SECONDS = float(os.environ.get('ASTRO_BREAKER_MAX_OPEN_SECONDS', 300))
+BREAKER_HALF_OPEN_CALLS = int(os.environ.get('ASTRO_BREAKER_HALF_OPEN_CALLS', 1))
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时拒绝的请求"""
+
+
+class CircuitBreaker:
+    """带滚动窗口统计的三态熔断器"""
+
+    def __init__(self, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS, error_rate=BREAKER_ERROR_RATE,
+                 slow_call=BREAKER_SLOW_CALL, open_seconds=BREAKER_OPEN_SECONDS,
+                 max_open_seconds=BREAKER_MAX_OPEN_SECONDS, half_open_calls=BREAKER_HALF_OPEN_CALLS):
+        self.window = window
+        self.min_calls = max(1, min_calls)
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.half_open_calls = max(1, half_open_calls)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """回到关闭状态并清空统计"""
+        with self._lock:
+            self._calls = deque()  # (结束时间, 是否失败, 耗时)
+            self._state = CLOSED
+            self._opened_at = None
+            self._cooldown = self.open_seconds
+            self._trials = 0
+        metrics.upstream_circuit_state.set(1, state=CLOSED)
+        for state in (OPEN, HALF_OPEN):
+            metrics.upstream_circuit_state.set(0, state=state)
+
+    def _transition(self, state, now):
+        self._state = state
+        if state == OPEN:
+            self._opened_at = now
+        if state != HALF_OPEN:
+            self._trials = 0
+        for name in STATES:
+            metrics.upstream_circuit_state.set(1 if name == state else 0, state=name)
+        metrics.upstream_circuit_transitions.inc(to=state)
+
+    def _prune(self, now):
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self._cooldown:
+                return HALF_OPEN
+            return self._state
+
+    @property
+    def is_open(self):
+        """打开且仍在冷却中：批量刷新应暂停"""
+        return self.state == OPEN
+
+    def allow(self):
+        """放行一个请求，熔断时抛出 CircuitOpenError"""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == OPEN:
+                retry_in = self._cooldown - (now - self._opened_at)
+                if retry_in > 0:
+                    metrics.upstream_circuit_rejected.inc()
+                    raise CircuitOpenError(f"源站熔断中，{retry_in:.0f}秒后重试")
+                self._transition(HALF_OPEN, now)
+            if self._state == HALF_OPEN:
+                if self._trials >= self.half_open_calls:
+                    metrics.upstream_circuit_rejected.inc()
+                    raise CircuitOpenError("源站熔断试探中")
+                self._trials += 1
+
+    def record(self, failed, duration):
+        """记录一次放行请求的结果；超过慢调用阈值的请求按失败计"""
+        failed = failed or duration >= self.slow_call
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                if failed:
+                    self._cooldown = min(self._cooldown * 2, self.max_open_seconds)
+                    self._transition(OPEN, now)
+                else:
+                    self._cooldown = self.open_seconds
+                    self._calls.clear()
+                    self._transition(CLOSED, now)
+                return
+
+            self._calls.append((now, failed, duration))
+            self._prune(now)
+            if self._state == CLOSED and len(self._calls) >= self.min_calls:
+                failures = sum(1 for _, bad, _ in self._calls if bad)
+                if failures / len(self._calls) >= self.error_rate:
+                    self._transition(OPEN, now)
+
+    def stats(self):
+        """当前状态与窗口内统计，供 /readyz 展示"""
+        state = self.state
+        with self._lock:
+            self._prune(time.monotonic())
+            calls = list(self._calls)
+            retry_in = None
+            if self._state == OPEN:
+                retry_in = max(0.0, self._cooldown - (time.monotonic() - self._opened_at))
+        durations = sorted(duration for _, _, duration in calls)
+        failures = sum(1 for _, bad, _ in calls if bad)
+        return {
+            "state": state,
+            "window_calls": len(calls),
+            "error_rate": round(failures / len(calls), 3) if calls else 0.0,
+            "p95_latency": round(durations[int(0.95 * (len(durations) - 1))], 3) if durations else None,
+            "retry_in": None if retry_in is None else round(retry_in, 1),
+        }
@@ -0,0 +1,56 @@
+"""
+单元测试环境
+
+被测模块在导入时就按环境变量确定共享存储、历史、快照等文件的位置，
+所以在收集测试之前把它们全部指向临时目录，测试不会碰到真实的缓存和源站。
+"""
+
+import os
+import sys
+import time
+import atexit
+import shutil
+import tempfile
+
+import pytest
+
+TEST_DIR = tempfile.mkdtemp(prefix='astro-tests-')
+atexit.register(shutil.rmtree, TEST_DIR, True)
+
+for name, filename in {
+    'ASTRO_STORE_FILE': 'store.sqlite3',
+    'ASTRO_HISTORY_FILE': 'history.sqlite3',
+    'ASTRO_HORIZON_STORE_FILE': 'horizons.sqlite3',
+    'ASTRO_ARCHIVE_FILE': 'archive.sqlite3',
+    'ASTRO_CACHE_FILE': 'cache.json',
+    'ASTRO_SCHEDULE_FILE': 'schedule.json',
+    'ASTRO_SNAPSHOT_FILE': 'snapshot.bin',
+    'ASTRO_SIGNS_DIR': 'signs',
+    'ASTRO_LEADER_LOCK_FILE': 'leader.lock',
+    'ASTRO_INGEST_LOCK_FILE': 'ingest.lock',
+}.items():
+    os.environ[name] = os.path.join(TEST_DIR, filename)
+
+# 没有启动本地源站替身的测试不应访问网络：指向一个不监听的端口
+os.environ['ASTRO_UPSTREAM_HOST'] = '127.0.0.1:9'
+os.environ['ASTRO_HOST_MIN_INTERVAL'] = '0'
+os.environ['ASTRO_CACHE_SAVE_DELAY'] = '0.05'
+os.environ['ASTRO_CACHE_SAVE_MAX_DELAY'] = '0.2'
+os.environ['ASTRO_ADMIN_TOKEN'] = 'test-token'
+os.environ['ASTRO_PREFETCH_HORIZONS'] = ''
+
+# bench/fixture_server.py 是本地源站替身
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench'))
+
+
+def _wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def wait_until():
+    """等待其他线程达到某个状态，超时则测试失败"""
+    return _wait_until
@@ -0,0 +1,215 @@
+"""
+运势页面内容提取
+
+只需要页面中（第一个）div.TODAY_CONTENT 的 h3 标题和直接子元素 p，不必为整个页面建树。
+提供几个可互换的后端，输出完全一致：
+
+- lxml:      lxml.html 解析 + XPath（需要安装 lxml）
+- streaming: 基于标准库 html.parser 的流式提取，读完（第一个）目标块就停止
+- soup:      BeautifulSoup + SoupStrainer，只为目标块建树
+
+get_extractor() 按 ASTRO_EXTRACTOR 环境变量或可用性自动选择；可用性只检查能否导入，
+解析库在第一次提取时才加载。
+"""
+
+import os
+import re
+import logging
+import importlib.util
+from html.parser import HTMLParser
+
+logger = logging.getLogger(__name__)
+
+TARGET_CLASS = 'TODAY_CONTENT'
+
+# 自动选择时的优先顺序（见 bench/bench_extract.py 的测量结果）
+BACKEND_PREFERENCE = ('lxml', 'streaming', 'soup')
+
+
+class Extractor:
+    """提取器接口：extract(text) 返回 (标题, [条目])，页面结构异常时抛出 ValueError"""
+
+    name = None
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def extract(self, text):
+        raise NotImplementedError
+
+    def _result(self, titles, items):
+        if not titles:
+            raise ValueError("页面结构异常")
+        return titles[0], items
+
+
+class SoupExtractor(Extractor):
+    """BeautifulSoup，但用 SoupStrainer 只为 TODAY_CONTENT 块建树"""
+
+    name = 'soup'
+
+    def __init__(self):
+        from bs4 import BeautifulSoup, SoupStrainer
+        self._soup = BeautifulSoup
+        # 用正则匹配，class 属性含多个值时也能命中
+        self._strainer = SoupStrainer('div', class_=re.compile(rf'(^|\s){TARGET_CLASS}(\s|$)'))
+
+    @classmethod
+    def available(cls):
+        return importlib.util.find_spec('bs4') is not None
+
+    def extract(self, text):
+        soup = self._soup(text, 'html.parser', parse_only=self._strainer)
+        block = soup.select_one(f"div.{TARGET_CLASS}")
+        if block is None:
+            return self._result([], [])
+        titles = [h3.text for h3 in block.find_all('h3', recursive=False)]
+        items = [p.text for p in block.find_all('p', recursive=False)]
+        return self._result(titles, items)
+
+
+class LxmlExtractor(Extractor):
+    """lxml.html + XPath"""
+
+    name = 'lxml'
+    XPATH = f'//div[contains(concat(" ", normalize-space(@class), " "), " {TARGET_CLASS} ")]'
+
+    def __init__(self):
+        import lxml.html
+        self._fromstring = lxml.html.fromstring
+
+    @classmethod
+    def available(cls):
+        return importlib.util.find_spec('lxml') is not None
+
+    def extract(self, text):
+        try:
+            doc = self._fromstring(text)
+        except ValueError:
+            # 带编码声明的 XML 风格文档不能以 str 解析
+            doc = self._fromstring(text.encode('utf-8'))
+        titles, items = [], []
+        # 与流式后端一致，只取第一个目标块
+        for block in doc.xpath(self.XPATH)[:1]:
+            titles.extend(h3.text_content() for h3 in block.xpath('./h3'))
+            items.extend(p.text_content() for p in block.xpath('./p'))
+        return self._result(titles, items)
+
+
+class _StopParsing(Exception):
+    pass
+
+
+class _TodayContentParser(HTMLParser):
+    """只跟踪 TODAY_CONTENT 块内的元素栈，收集直接子元素 h3/p 的文本"""
+
+    VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+                     'link', 'meta', 'param', 'source', 'track', 'wbr'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.titles = []
+        self.items = []
+        self._stack = None      # 块内元素栈，None 表示还没进入目标块
+        self._capture = None    # (目标列表, 文本片段)
+        self._capture_depth = None
+
+    def handle_starttag(self, tag, attrs):
+        if self._stack is None:
+            if tag == 'div' and TARGET_CLASS in (dict(attrs).get('class') or '').split():
+                self._stack = []
+            return
+        if tag in self.VOID_ELEMENTS:
+            return
+        self._stack.append(tag)
+        if self._capture is None and len(self._stack) == 1 and tag in ('h3', 'p'):
+            self._capture = (self.titles if tag == 'h3' else self.items, [])
+            self._capture_depth = 1
+
+    def handle_startendtag(self, tag, attrs):
+        # <br/> 之类的自闭合标签不影响元素栈
+        pass
+
+    def handle_endtag(self, tag):
+        if self._stack is None:
+            return
+        if not self._stack:
+            if tag == 'div':
+                # 目标块结束，不必再解析页面的其余部分
+                raise _StopParsing()
+            return
+        if tag not in self._stack:
+            return
+        while self._stack:
+            popped = self._stack.pop()
+            if self._capture is not None and len(self._stack) < self._capture_depth:
+                target, parts = self._capture
+                target.append(''.join(parts))
+                self._capture = None
+            if popped == tag:
+                break
+
+    def handle_data(self, data):
+        if self._capture is not None:
+            self._capture[1].append(data)
+
+    def finish(self):
+        # 页面在块内被截断时，把正在收集的文本收尾
+        if self._capture is not None:
+            target, parts = self._capture
+            target.append(''.join(parts))
+            self._capture = None
+
+
+class StreamingExtractor(Extractor):
+    """基于 html.parser 的流式提取，读完 TODAY_CONTENT 块立即停止"""
+
+    name = 'streaming'
+
+    def extract(self, text):
+        parser = _TodayContentParser()
+        try:
+            parser.feed(text)
+            parser.close()
+        except _StopParsing:
+            pass
+        parser.finish()
+        return self._result(parser.titles, parser.items)
+
+
+BACKENDS = {cls.name: cls for cls in (LxmlExtractor, StreamingExtractor, SoupExtractor)}
+
+_default_extractor = None
+
+
+def available_backends():
+    """当前环境可用的后端名称，按优先顺序"""
+    return [name for name in BACKEND_PREFERENCE if BACKENDS[name].available()]
+
+
+def get_extractor(name=None):
+    """
+    获取提取器
+
+    不指定 name 时使用 ASTRO_EXTRACTOR 环境变量，否则按优先顺序选第一个可用的后端。
+    """
+    global _default_extractor
+    if name:
+        return BACKENDS[name]()
+    if _default_extractor is None:
+        configured = os.environ.get('ASTRO_EXTRACTOR')
+        if configured and configured in BACKENDS and BACKENDS[configured].available():
+            chosen = configured
+        else:
+            if configured:
+                logger.warning(f"提取后端 {configured} 不可用，自动选择")
+            chosen = available_backends()[0]
+        _default_extractor = BACKENDS[chosen]()
+        logger.info(f"页面提取后端: {chosen}")
+    return _default_extractor
+
+
+def extract_today_content(text):
+    """用默认后端提取 (标题, [条目])"""
+    return get_extractor().extract(text)
@@ -0,0 +1,105 @@
+"""
+并发抓取引擎
+
+用线程池替代逐个星座串行抓取，并用按主机划分的礼貌预算（同主机并发上限 +
+相邻请求最小间隔）代替固定的随机 sleep。astro_api.py 和 update_astro_data.py
+共用同一个引擎。
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+# 可通过环境变量调整
+FETCH_CONCURRENCY = int(os.environ.get('ASTRO_FETCH_CONCURRENCY', 4))
+HOST_MIN_INTERVAL = float(os.environ.get('ASTRO_HOST_MIN_INTERVAL', 0.5))
+HOST_MAX_CONCURRENCY = int(os.environ.get('ASTRO_HOST_MAX_CONCURRENCY', 2))
+
+
+class HostBudget:
+    """按主机的礼貌预算：限制同一主机的同时请求数，以及两次请求开始之间的最小间隔"""
+
+    def __init__(self, min_interval=HOST_MIN_INTERVAL, max_concurrency=HOST_MAX_CONCURRENCY):
+        self.min_interval = min_interval
+        self.max_concurrency = max(1, max_concurrency)
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_slot = {}
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_concurrency)
+            return self._semaphores[host]
+
+    def _reserve_slot(self, host):
+        """预约下一个可用的开始时间，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = start + self.min_interval
+            return start - now
+
+    @contextmanager
+    def slot(self, host):
+        """在预算内占用一个请求位置，用法：with budget.slot(host): session.get(...)"""
+        semaphore = self._semaphore(host)
+        with semaphore:
+            wait = self._reserve_slot(host)
+            if wait > 0:
+                time.sleep(wait)
+            yield
+
+
+class FetchReport:
+    """一次批量抓取的结果：成功的结果、失败的原因和耗时"""
+
+    def __init__(self):
+        self.results = {}
+        self.failures = {}
+        self.elapsed = 0.0
+
+    @property
+    def failed_keys(self):
+        return sorted(self.failures)
+
+    def __repr__(self):
+        return (f"<FetchReport ok={len(self.results)} failed={len(self.failures)} "
+                f"elapsed={self.elapsed:.2f}s>")
+
+
+class FetchEngine:
+    """用有限并发执行一组抓取任务，一次收集所有结果与失败"""
+
+    def __init__(self, concurrency=FETCH_CONCURRENCY):
+        self.concurrency = max(1, concurrency)
+
+    def run(self, keys, fn):
+        """对每个 key 调用 fn(key)，返回 FetchReport；单个任务的异常不会影响其他任务"""
+        keys = list(keys)
+        report = FetchReport()
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(keys) or 1),
+                                thread_name_prefix='astro-fetch') as executor:
+            futures = {executor.submit(fn, key): key for key in keys}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    report.results[key] = future.result()
+                except Exception as e:
+                    logger.error(f"抓取任务 {key} 失败: {e}")
+                    report.failures[key] = str(e)
+
+        report.elapsed = time.monotonic() - started
+        logger.info(f"批量抓取完成: {report}")
+        return report
+
+
+# 进程内共享的预算，所有访问源站的代码都应通过它
+host_budget = HostBudget()
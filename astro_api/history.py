@@ -0,0 +1,92 @@
+"""
+每日运势历史存档
+
+内存中的缓存只保留每个星座当天的数据；历史数据按 (星座, 日期) 写入
+SQLite，主键即索引，按日期范围查询是 O(log n) 的，不随存档增长占用内存。
+同一天内容变化时保留最新的一版。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_FILE = os.environ.get('ASTRO_HISTORY_FILE', os.path.join(HISTORY_DIR, 'astro_history.sqlite3'))
+
+# 单次查询最多返回的天数
+MAX_HISTORY_DAYS = int(os.environ.get('ASTRO_HISTORY_MAX_DAYS', 366))
+
+
+class HistoryStore:
+    """按 (星座, 日期) 存储的历史条目"""
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        self._connect().execute(
+            'CREATE TABLE IF NOT EXISTS history ('
+            ' sign INTEGER NOT NULL,'
+            ' date TEXT NOT NULL,'
+            ' content_hash TEXT,'
+            ' data TEXT NOT NULL,'
+            ' recorded_at REAL NOT NULL,'
+            ' PRIMARY KEY (sign, date))'
+        )
+
+    def record_many(self, entries, replace=False):
+        """写入 {星座编号: 条目}；默认生成的数据不入档，内容未变化时不重写（replace=True 时总是重写）"""
+        rows = []
+        now = time.time()
+        for num, entry in entries.items():
+            if not entry or entry.get('is_default') or 'date' not in entry:
+                continue
+            data = {key: value for key, value in entry.items() if key != 'variants'}
+            rows.append((int(num), entry['date'], entry.get('content_hash'),
+                         json.dumps(data, ensure_ascii=False), now))
+        if not rows:
+            return 0
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT INTO history (sign, date, content_hash, data, recorded_at) VALUES (?, ?, ?, ?, ?)'
+                ' ON CONFLICT(sign, date) DO UPDATE SET'
+                ' content_hash = excluded.content_hash, data = excluded.data, recorded_at = excluded.recorded_at'
+                + ('' if replace else ' WHERE history.content_hash IS NOT excluded.content_hash'),
+                rows
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return len(rows)
+
+    def query(self, num, date_from, date_to, limit=MAX_HISTORY_DAYS):
+        """按日期范围（含两端，YYYY-MM-DD）查询某个星座的历史，按日期升序"""
+        rows = self._connect().execute(
+            'SELECT data FROM history WHERE sign = ? AND date BETWEEN ? AND ? ORDER BY date LIMIT ?',
+            (int(num), date_from, date_to, limit)
+        ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def dates(self, num):
+        """某个星座已存档的所有日期"""
+        rows = self._connect().execute('SELECT date FROM history WHERE sign = ? ORDER BY date', (int(num),))
+        return [date for (date,) in rows]
@@ -0,0 +1,78 @@
+"""
+运势时间范围（horizon）
+
+除了当天（daily），还预先抓取明天（tomorrow）、本周（weekly）和本月（monthly）的运势。
+缓存键为 (星座, 时间范围, 周期)，每个时间范围在自己的自然边界过期：
+- daily / tomorrow：周期为日期，午夜过期（明天的运势到午夜变成当天的运势）
+- weekly：周期为 ISO 周（如 2026-W42），下周一零点过期
+- monthly：周期为月份（如 2026-10），下月一日零点过期
+
+当天的运势仍使用原有的按星座缓存；其余时间范围由领导者在后台预取，请求只读缓存。
+"""
+
+import os
+from datetime import datetime, timedelta
+
+HORIZONS = ('daily', 'tomorrow', 'weekly', 'monthly')
+
+# 后台预取的时间范围（逗号分隔），daily 由原有的刷新计划负责
+PREFETCH_HORIZONS = [h.strip() for h in os.environ.get('ASTRO_PREFETCH_HORIZONS', 'tomorrow,weekly,monthly').split(',')
+                     if h.strip() in HORIZONS and h.strip() != 'daily']
+
+
+def _midnight(moment):
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def period(horizon, now=None):
+    """当前时刻对应的周期标识"""
+    now = now or datetime.now()
+    if horizon == 'daily':
+        return now.strftime('%Y-%m-%d')
+    if horizon == 'tomorrow':
+        return (now + timedelta(days=1)).strftime('%Y-%m-%d')
+    if horizon == 'weekly':
+        year, week, _ = now.isocalendar()
+        return f'{year}-W{week:02d}'
+    if horizon == 'monthly':
+        return now.strftime('%Y-%m')
+    raise ValueError(f"未知的时间范围: {horizon}")
+
+
+def expires_at(horizon, now=None):
+    """当前周期结束（缓存过期）的时刻"""
+    now = now or datetime.now()
+    if horizon in ('daily', 'tomorrow'):
+        return _midnight(now) + timedelta(days=1)
+    if horizon == 'weekly':
+        return _midnight(now) + timedelta(days=7 - now.weekday())
+    if horizon == 'monthly':
+        return _midnight(now.replace(day=1) + timedelta(days=32)).replace(day=1)
+    raise ValueError(f"未知的时间范围: {horizon}")
+
+
+def page_path(horizon, num, period_id=None):
+    """源站页面的路径和查询参数；tomorrow 按日期请求 daily 页面"""
+    if horizon == 'daily':
+        return f'/daily_{num}.php?iAstro={num}'
+    if horizon == 'tomorrow':
+        return f'/daily_{num}.php?iAstro={num}&iAcDay={period_id or period(horizon)}'
+    if horizon in ('weekly', 'monthly'):
+        return f'/{horizon}_{num}.php?iAstro={num}'
+    raise ValueError(f"未知的时间范围: {horizon}")
+
+
+def cache_key(num, horizon, period_id):
+    return f'{int(num)}/{horizon}/{period_id}'
+
+
+def parse_key(key):
+    """cache_key 的逆操作，返回 (星座, 时间范围, 周期)"""
+    num, horizon, period_id = key.split('/', 2)
+    return int(num), horizon, period_id
+
+
+def is_current(key, now=None):
+    """缓存键是否属于当前周期（过期的键可以丢弃）"""
+    _, horizon, period_id = parse_key(key)
+    return period_id == period(horizon, now)
@@ -0,0 +1,149 @@
+"""
+数据入库核心
+
+Flask 服务和 update_astro_data.py 共用同一套抓取与写入：
+- 进程内共享的连接池会话（按需创建），抓取、条件请求和解析都走 upstream.py
+- refresh_sign / fetch_sign 直接修改调用方传入的条目字典
+- commit 在跨进程文件锁内完成共享存储事务、历史存档、缓存文件、响应快照和按星座文件
+  的原子替换；它们都由共享存储中的条目生成，两个进程先后写入也不会互相覆盖
+"""
+
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+import snapshot
+import sign_files
+from horizons import cache_key
+from persistence import atomic_write_json
+from upstream import create_robust_session, fetch_page, parse_astro_page, build_entry, refresh_entry, touch_unchanged
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+INGEST_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_FILE = os.environ.get('ASTRO_CACHE_FILE', os.path.join(INGEST_DIR, "astro_cache.json"))
+INGEST_LOCK_FILE = os.environ.get('ASTRO_INGEST_LOCK_FILE', os.path.join(INGEST_DIR, 'astro_ingest.lock'))
+
+# 进程内共享的连接池会话（带重试），第一次抓取时才创建
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """进程内共享的连接池会话"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_robust_session()
+    return _session
+
+
+@contextmanager
+def ingest_lock(path=INGEST_LOCK_FILE):
+    """跨进程的写入锁（阻塞等待），串行化共享存储与缓存文件的写入"""
+    if not FCNTL_AVAILABLE:
+        yield
+        return
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def fetch_sign(num, entries=None, session=None, archive=True):
+    """无条件抓取并解析一个星座，写入 entries（如果提供）并返回新条目；archive=False 时不存档原始页面"""
+    r = fetch_page(session or get_session(), num, archive=archive)
+    title, items = parse_astro_page(r.text, num)
+    entry = build_entry(title, items, r)
+    if entries is not None:
+        entries[str(num)] = entry
+    return entry
+
+
+def refresh_sign(num, entries, session=None, archive=True):
+    """检查并更新一个星座，只请求一次源站；entries 中的条目有改动时返回True"""
+    entry = entries.get(str(num))
+    changed, new_entry = refresh_entry(session or get_session(), num, entry, archive=archive)
+    if changed:
+        logger.info(f"Updating data for astrology sign {num}")
+        entries[str(num)] = new_entry
+        return True
+
+    # 内容未变化：保留已有数据，只刷新校验信息和日期
+    if touch_unchanged(entry, new_entry):
+        return True
+    logger.info(f"No updates needed for astrology sign {num}")
+    return False
+
+
+def refresh_horizon(num, horizon, period_id, entries, session=None):
+    """检查并更新一个星座某个时间范围（明天/本周/本月）的运势；entries 以 (星座, 时间范围, 周期) 为键，有改动时返回True"""
+    key = cache_key(num, horizon, period_id)
+    entry = entries.get(key)
+    changed, new_entry = refresh_entry(session or get_session(), num, entry, horizon, period_id)
+    if changed:
+        new_entry.update(horizon=horizon, period=period_id)
+        entries[key] = new_entry
+        return True
+    return touch_unchanged(entry, new_entry)
+
+
+def load_entries(store, cache_file=CACHE_FILE):
+    """读取当前数据：优先共享存储，为空时读缓存文件；返回 (版本号, 条目)"""
+    version, entries = store.load_all()
+    if entries:
+        return version, entries
+    if os.path.exists(cache_file):
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return version, json.load(f)
+    return version, {}
+
+
+def commit(changed, store, history=None, cache_file=CACHE_FILE):
+    """
+    写入有变化的条目，返回 (新版本号, 缓存文件字节数)
+
+    在入库锁内：共享存储事务写入 → 历史存档 → 用共享存储中的全部条目原子替换缓存文件、
+    只读服务入口使用的响应快照，以及变化星座的数据文件和清单。
+    """
+    with ingest_lock():
+        version = store.put_many(changed)
+        if history is not None:
+            history.record_many(changed)
+        _, entries = store.load_all()
+        size = atomic_write_json(cache_file, entries)
+        _publish(version, entries, changed)
+    return version, size
+
+
+def _publish(version, entries, changed):
+    # 派生文件写入失败不影响缓存文件，读者继续使用上一版
+    try:
+        snapshot.write_snapshot(version, entries)
+    except Exception as e:
+        logger.error(f"写入响应快照失败: {e}")
+    try:
+        sign_files.write_signs(version, changed, entries)
+    except Exception as e:
+        logger.error(f"写入星座数据文件失败: {e}")
+
+
+def publish_snapshot(store):
+    """响应快照或星座文件清单缺失、落后于共享存储时重新生成（领导者启动时调用）"""
+    with ingest_lock():
+        version, entries = store.load_all()
+        manifest = sign_files.read_manifest()
+        if entries and (snapshot.read_version() != version or manifest is None or manifest.get('version') != version):
+            _publish(version, entries, entries.keys())
@@ -0,0 +1,258 @@
+"""
+进程内指标注册表
+
+以 Prometheus 文本格式（0.0.4）在 /metrics 暴露计数器、仪表和直方图，
+不依赖 prometheus_client。每个 worker 进程各自计数，由 Prometheus 按实例抓取。
+运行时才能得到的数值（如请求合并统计、LRU 命中率）通过回调在抓取时读取。
+"""
+
+import re
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class Metric:
+    """带标签的指标基类；标签值按 labelnames 的顺序组成键"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @property
+    def family(self):
+        """HELP/TYPE 行中的名称，样本名为它加上 _samples() 给出的后缀"""
+        return self.name
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.family} {self.documentation}', f'# TYPE {self.family} {self.kind}']
+        for suffix, labels, value in self._samples():
+            lines.append(f'{self.family}{suffix}{_format_labels(labels)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    """只增不减的计数；按文本格式 0.0.4 的惯例，HELP/TYPE 和样本都使用 {name}_total"""
+
+    kind = 'counter'
+
+    @property
+    def family(self):
+        return f'{self.name}_total'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, total, **labels):
+        """用其他对象自己维护的累计次数（如请求合并统计、LRU 命中数）更新计数，由抓取时的回调调用"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = total
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield '', list(zip(self.labelnames, key)), value
+
+
+class Gauge(Metric):
+    """可增可减的当前值"""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield '', list(zip(self.labelnames, key)), value
+
+
+class Histogram(Metric):
+    """按上界累计的分布，同时记录总和与次数"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # 每个桶各自的次数 + 超出最大上界的次数，以及总和
+                counts = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][bisect.bisect_left(self.buckets, value)] += 1
+            counts[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """用法：with histogram.time(label=...): ..."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels):
+        counts = self._values.get(self._key(labels))
+        return sum(counts[0]) if counts else 0
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield '_bucket', labels + [('le', _format_value(bound))], cumulative
+            yield '_sum', labels, total
+            yield '_count', labels, cumulative
+
+
+class Registry:
+    """指标注册表，render() 生成 /metrics 的响应文本"""
+
+    def __init__(self):
+        self._metrics = []
+        self._callbacks = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_callback(self, fn):
+        """抓取时调用 fn() 更新指标（如把外部统计同步到仪表），异常会被忽略"""
+        self._callbacks.append(fn)
+        return fn
+
+    def render(self):
+        for fn in self._callbacks:
+            try:
+                fn()
+            except Exception:
+                pass
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# 缓存
+cache_requests = registry.counter(
+    'astro_cache_requests', '按星座统计的缓存查询结果（hit/stale/miss）', ('sign', 'result'))
+
+# HTTP 接口
+http_request_duration = registry.histogram(
+    'astro_http_request_duration_seconds', '各接口的处理耗时', ('endpoint',))
+http_responses = registry.counter(
+    'astro_http_responses', '各接口返回的状态码', ('endpoint', 'status'))
+
+# 源站
+upstream_request_duration = registry.histogram(
+    'astro_upstream_request_duration_seconds', '源站请求耗时（含连接重试）',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 60.0))
+upstream_responses = registry.counter(
+    'astro_upstream_responses', '源站返回的状态码，请求异常时为 error', ('status',))
+upstream_circuit_state = registry.gauge(
+    'astro_upstream_circuit_state', '源站熔断器当前状态（当前状态为1）', ('state',))
+upstream_circuit_transitions = registry.counter(
+    'astro_upstream_circuit_transitions', '源站熔断器进入各状态的次数', ('to',))
+upstream_circuit_rejected = registry.counter(
+    'astro_upstream_circuit_rejected', '熔断期间被直接拒绝的源站请求数')
+parse_duration = registry.histogram(
+    'astro_parse_duration_seconds', '页面解析耗时',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+
+# 持久化
+save_duration = registry.histogram(
+    'astro_save_cache_duration_seconds', '一次缓存持久化（共享存储、历史、缓存文件）的耗时')
+save_bytes = registry.gauge('astro_save_cache_bytes', '最近一次写入的缓存文件大小')
+save_failures = registry.counter('astro_save_cache_failures', '缓存持久化失败次数')
+
+# 调度器
+scheduler_jobs = registry.counter(
+    'astro_scheduler_jobs', '调度任务的执行结果（success/error/missed）', ('job', 'outcome'))
+
+# 繁简转换
+opencc_duration = registry.histogram(
+    'astro_opencc_convert_duration_seconds', 'OpenCC 实际转换耗时（不含 LRU 命中）', ('config',),
+    buckets=(0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1))
+
+# 抓取时由回调更新的运行状态
+cache_entries = registry.gauge('astro_cache_entries', '内存缓存中的星座条目数')
+leader = registry.gauge('astro_leader', '当前进程是否为领导者（1/0）')
+singleflight_calls = registry.counter(
+    'astro_singleflight_calls', '请求路径上的抓取：实际执行与被合并的次数', ('result',))
+convert_memo = registry.counter(
+    'astro_convert_memo_calls', '繁简转换 LRU 缓存的命中与未命中次数', ('result',))
+refresh_next_check = registry.gauge(
+    'astro_refresh_next_check_seconds', '刷新计划中各星座距下一次检查的秒数（仅领导者）', ('sign',))
+
+
+def job_name(job_id):
+    """调度任务 ID 去掉时间戳等后缀，作为低基数的标签值"""
+    return re.sub(r'_\d.*$', '', job_id or 'unknown')
@@ -0,0 +1,169 @@
+"""
+源站原始页面存档
+
+每次从源站拿到完整页面（200）时，把响应的原始字节压缩后按内容哈希（SHA-256）存进 SQLite：
+- pages：哈希 -> 压缩后的页面，相同的页面只存一份
+- fetches：(星座, 时间范围, 周期, 哈希) -> 编码、ETag、Last-Modified、首次/最近一次抓到的时间
+
+网站改版导致解析失败时，页面已经存下来了：修好提取规则后用 reingest.py 离线重新解析，
+重建缓存、历史和派生字段，不需要重新抓取。安装了 zstandard 时使用 zstd 压缩，否则使用 zlib；
+每个页面记录自己的压缩方式，两种可以混存。
+"""
+
+import os
+import zlib
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_FILE = os.environ.get('ASTRO_ARCHIVE_FILE', os.path.join(ARCHIVE_DIR, 'astro_archive.sqlite3'))
+ARCHIVE_PAGES = os.environ.get('ASTRO_ARCHIVE_PAGES', '1').lower() in ['1', 'true', 'yes', 'y']
+ARCHIVE_CODEC = os.environ.get('ASTRO_ARCHIVE_CODEC', 'zstd' if ZSTD_AVAILABLE else 'zlib')
+
+
+def compress(data, codec=ARCHIVE_CODEC):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 9)
+
+
+def decompress(data, codec):
+    if codec == 'zstd':
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("页面使用 zstd 压缩，但没有安装 zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class PageArchive:
+    """按内容寻址的压缩页面存档"""
+
+    def __init__(self, path=ARCHIVE_FILE, codec=ARCHIVE_CODEC):
+        self.path = path
+        self.codec = codec if codec != 'zstd' or ZSTD_AVAILABLE else 'zlib'
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            ' hash TEXT PRIMARY KEY,'
+            ' codec TEXT NOT NULL,'
+            ' data BLOB NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' stored_at REAL NOT NULL)'
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS fetches ('
+            ' sign INTEGER NOT NULL,'
+            ' horizon TEXT NOT NULL,'
+            ' period TEXT NOT NULL,'
+            ' hash TEXT NOT NULL,'
+            ' encoding TEXT,'
+            ' etag TEXT,'
+            ' last_modified TEXT,'
+            ' first_seen TEXT NOT NULL,'
+            ' last_seen TEXT NOT NULL,'
+            ' PRIMARY KEY (sign, horizon, period, hash))'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS fetches_period ON fetches(horizon, period, sign, last_seen)')
+
+    def store(self, num, horizon, period_id, raw, encoding=None, etag=None, last_modified=None):
+        """存档一次抓到的页面（原始字节），返回内容哈希；相同的页面只压缩和保存一次"""
+        digest = hashlib.sha256(raw).hexdigest()
+        now = datetime.now().isoformat()
+        conn = self._connect()
+        exists = conn.execute('SELECT 1 FROM pages WHERE hash = ?', (digest,)).fetchone()
+        # 压缩放在事务外面，不延长写锁的持有时间
+        data = None if exists else compress(raw, self.codec)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if data is not None:
+                conn.execute('INSERT OR IGNORE INTO pages (hash, codec, data, size, stored_at) VALUES (?, ?, ?, ?, ?)',
+                             (digest, self.codec, data, len(raw), time.time()))
+            conn.execute(
+                'INSERT INTO fetches (sign, horizon, period, hash, encoding, etag, last_modified, first_seen, last_seen)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+                ' ON CONFLICT(sign, horizon, period, hash) DO UPDATE SET'
+                ' last_seen = excluded.last_seen, etag = excluded.etag, last_modified = excluded.last_modified',
+                (int(num), horizon, period_id, digest, encoding, etag, last_modified, now, now)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return digest
+
+    def load(self, digest):
+        """按哈希取出页面的原始字节，不存在时返回 None"""
+        row = self._connect().execute('SELECT codec, data FROM pages WHERE hash = ?', (digest,)).fetchone()
+        return decompress(row[1], row[0]) if row is not None else None
+
+    def iter_fetches(self, horizon='daily', since=None, until=None, signs=None):
+        """
+        按 (周期, 星座, 最近抓到的时间) 顺序逐行返回抓取记录（dict），不一次读入内存
+
+        since/until 为周期的起止（含两端，daily 为 YYYY-MM-DD）；signs 为星座编号列表。
+        """
+        query = ('SELECT sign, horizon, period, hash, encoding, etag, last_modified, first_seen, last_seen'
+                 ' FROM fetches WHERE horizon = ?')
+        params = [horizon]
+        if since:
+            query += ' AND period >= ?'
+            params.append(since)
+        if until:
+            query += ' AND period <= ?'
+            params.append(until)
+        if signs is not None:
+            query += f" AND sign IN ({','.join('?' * len(signs))})"
+            params.extend(int(num) for num in signs)
+        query += ' ORDER BY period, sign, last_seen'
+        columns = ('sign', 'horizon', 'period', 'hash', 'encoding', 'etag', 'last_modified', 'first_seen', 'last_seen')
+        for row in self._connect().execute(query, params):
+            yield dict(zip(columns, row))
+
+    def stats(self):
+        """页面数、抓取记录数、原始与压缩后的字节数"""
+        conn = self._connect()
+        pages, raw_bytes, stored_bytes = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM pages').fetchone()
+        fetches = conn.execute('SELECT COUNT(*) FROM fetches').fetchone()[0]
+        return {"pages": pages, "fetches": fetches, "raw_bytes": raw_bytes, "stored_bytes": stored_bytes}
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    """进程内共享的存档（首次使用时创建）；关闭存档时返回 None"""
+    global _archive
+    if not ARCHIVE_PAGES:
+        return None
+    if _archive is None:
+        with _archive_lock:
+            if _archive is None:
+                _archive = PageArchive()
+    return _archive
@@ -0,0 +1,159 @@
+"""
+缓存持久化
+
+- atomic_write_json / atomic_write_bytes: 临时文件 + fsync + rename 原子写入，读者
+  （如 Node 端的 fortuneUtils.js、只读服务入口）永远不会读到写了一半的文件
+- DebouncedWriter: 记录脏条目，在后台线程中短暂防抖后合并成一次写入，
+  请求线程只负责标记，不再做磁盘 I/O；写入逻辑由调用方提供
+"""
+
+import os
+import json
+import time
+import atexit
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 防抖时间：最后一次标记后等待多久再写；以及从第一次标记起最多等待多久
+SAVE_DELAY = float(os.environ.get('ASTRO_CACHE_SAVE_DELAY', 1.0))
+SAVE_MAX_DELAY = float(os.environ.get('ASTRO_CACHE_SAVE_MAX_DELAY', 5.0))
+
+
+def _atomic_write(path, mode, write):
+    """临时文件 + fsync + rename 原子替换，write(f) 负责写入内容，返回写入的字节数"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        # mkstemp 默认只有属主可读，改为普通文件权限以便其他进程读取
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    # 确保 rename 本身落盘
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+    return size
+
+
+def atomic_write_json(path, data):
+    """原子地写入 JSON 文件，返回写入的字节数"""
+    return _atomic_write(path, 'w', lambda f: json.dump(data, f, ensure_ascii=False))
+
+
+def atomic_write_bytes(path, data):
+    """原子地写入二进制文件（如响应快照），返回写入的字节数"""
+    return _atomic_write(path, 'wb', lambda f: f.write(data))
+
+
+class DebouncedWriter:
+    """后台防抖写入器：mark_dirty 只记录脏条目，由写入线程合并写盘"""
+
+    def __init__(self, write, delay=SAVE_DELAY, max_delay=SAVE_MAX_DELAY, name='cache'):
+        self.write = write  # write(dirty_keys)：把脏条目写到各个存储，返回写入的字节数
+        self.name = name    # 用于线程名和日志
+        self.delay = delay
+        self.max_delay = max(delay, max_delay)
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()  # 保证快照和写入按顺序进行
+        self._dirty = set()
+        self._first_mark = None
+        self._last_mark = None
+        self._thread = None
+        self._stopped = False
+        atexit.register(self.flush)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f'astro-{self.name}-writer', daemon=True)
+            self._thread.start()
+
+    def mark_dirty(self, *keys):
+        """标记条目已修改；不传 key 时表示整体需要写入"""
+        with self._cond:
+            if keys:
+                self._dirty.update(str(k) for k in keys)
+            else:
+                self._dirty.add('*')
+            now = time.monotonic()
+            if self._first_mark is None:
+                self._first_mark = now
+            self._last_mark = now
+            self._ensure_thread()
+            self._cond.notify()
+
+    @property
+    def pending(self):
+        with self._cond:
+            return set(self._dirty)
+
+    def _due_in(self, now):
+        """距离下一次应写入还有多少秒"""
+        return min(self._last_mark + self.delay, self._first_mark + self.max_delay) - now
+
+    def _take_dirty(self):
+        dirty = self._dirty
+        self._dirty = set()
+        self._first_mark = self._last_mark = None
+        return dirty
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._dirty and not self._stopped:
+                    self._cond.wait()
+                if self._stopped and not self._dirty:
+                    return
+                wait = self._due_in(time.monotonic())
+                if wait > 0 and not self._stopped:
+                    self._cond.wait(wait)
+                    continue
+                dirty = self._take_dirty()
+            self._write(dirty)
+
+    def _write(self, dirty):
+        try:
+            with self._write_lock:
+                size = self.write(dirty)
+            logger.info(f"{self.name.capitalize()} saved successfully ({len(dirty)} dirty, {size} bytes)")
+        except Exception as e:
+            logger.error(f"Error saving {self.name}: {e}")
+            # 写入失败时保留脏标记，等待下一次机会重试
+            with self._cond:
+                self._dirty.update(dirty)
+                now = time.monotonic()
+                self._first_mark = self._first_mark or now
+                self._last_mark = now
+
+    def flush(self):
+        """立即同步写入所有待写的修改（进程退出或需要确定落盘时使用）"""
+        with self._cond:
+            if not self._dirty:
+                return
+            dirty = self._take_dirty()
+        self._write(dirty)
+
+    def stop(self):
+        """停止后台线程，并写入剩余修改"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self.flush()
@@ -0,0 +1,72 @@
+"""
+运势评分与结构化提取
+
+源站条目是交替出现的“整體運勢★★★☆☆：”标题行和说明段落。
+入库时把它们整理成统一的结构（分类、0-5 的数字评分、说明文字），
+和原始 items 一起存进缓存条目，消费方不必再各自解析字符串。
+"""
+
+import re
+
+# 源站分类名（繁体/简体）到统一分类键
+CATEGORY_KEYS = {
+    '整體運勢': 'overall', '整体运势': 'overall',
+    '愛情運勢': 'love', '爱情运势': 'love',
+    '事業運勢': 'career', '事业运势': 'career',
+    '財運運勢': 'wealth', '财运运势': 'wealth',
+}
+
+CATEGORIES = ('overall', 'love', 'career', 'wealth')
+
+RATING_PATTERN = re.compile(r'^\s*(?P<label>[^★☆：:]+?)\s*(?P<stars>[★☆]+)\s*[：:]?\s*(?P<rest>.*)$', re.S)
+
+
+def parse_heading(item):
+    """解析标题行，返回 (分类键, 显示名, 评分, 同行的说明)；不是标题行时返回 None"""
+    match = RATING_PATTERN.match(item)
+    if not match:
+        return None
+    label = match.group('label').strip()
+    category = CATEGORY_KEYS.get(label)
+    if category is None:
+        return None
+    return category, label, match.group('stars').count('★'), match.group('rest').strip()
+
+
+def structure_items(items):
+    """
+    把条目整理成 [{"category", "label", "rating", "text"}]
+
+    说明文字可以和标题在同一行（冒号之后），也可以是标题后的下一行。
+    """
+    categories = []
+    current = None
+    for item in items or []:
+        text = item.strip()
+        if not text:
+            continue
+        heading = parse_heading(text)
+        if heading:
+            category, label, rating, rest = heading
+            current = {"category": category, "label": label, "rating": rating, "text": rest}
+            categories.append(current)
+        elif current is not None and not current["text"]:
+            current["text"] = text
+            current = None
+    return categories
+
+
+def extract_ratings(items, structured=None):
+    """从条目中提取各分类的评分，返回 {分类键: 0-5}；已有 structure_items 的结果时传入 structured，不再重复解析"""
+    ratings = {}
+    for category in (structure_items(items) if structured is None else structured):
+        ratings.setdefault(category["category"], category["rating"])
+    return ratings
+
+
+def attach_structure(entry):
+    """入库时把结构化数据和评分写进条目，返回条目本身"""
+    if entry and 'items' in entry:
+        entry['structured'] = structure_items(entry['items'])
+        entry['ratings'] = extract_ratings(entry['items'], entry['structured'])
+    return entry
@@ -0,0 +1,274 @@
+"""
+按星座的自适应刷新计划
+
+记录每个星座在源站实际更新（内容哈希变化）的时刻，学习出每天的发布窗口：
+- 上次更新之后、下一个发布窗口之前，只做低频的安全检查
+- 发布窗口内密集检查，直到发现新内容
+- 窗口结束仍未更新时改为稀疏检查
+- 还没有学到窗口时，按固定的整点（与原来的定时任务相同）检查
+- 抓取失败按星座指数退避，互不影响
+
+状态保存在 JSON 文件中（原子写入），重启后继续使用；每次检查只标记状态已修改，
+由后台写入线程防抖后合并写盘，一轮刷新只写一次文件。
+"""
+
+import os
+import json
+import math
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from persistence import atomic_write_json, DebouncedWriter
+
+logger = logging.getLogger(__name__)
+
+PLANNER_DIR = os.path.dirname(os.path.abspath(__file__))
+SCHEDULE_FILE = os.environ.get('ASTRO_SCHEDULE_FILE', os.path.join(PLANNER_DIR, 'astro_schedule.json'))
+
+# 检查间隔（秒）
+DENSE_INTERVAL = float(os.environ.get('ASTRO_POLL_DENSE_INTERVAL', 300))
+SPARSE_INTERVAL = float(os.environ.get('ASTRO_POLL_SPARSE_INTERVAL', 1800))
+SAFETY_INTERVAL = float(os.environ.get('ASTRO_POLL_SAFETY_INTERVAL', 6 * 3600))
+
+# 失败后的指数退避（秒）
+BACKOFF_BASE = float(os.environ.get('ASTRO_BACKOFF_BASE', 60))
+BACKOFF_MAX = float(os.environ.get('ASTRO_BACKOFF_MAX', 3600))
+
+# 发布窗口在观测范围两侧各放宽的分钟数，以及参与学习的最近观测次数
+PUBLISH_MARGIN_MINUTES = float(os.environ.get('ASTRO_PUBLISH_MARGIN_MINUTES', 15))
+PUBLISH_HISTORY = 14
+
+# 一次更新之后，至少隔这么久才期待下一次发布（每日运势）
+MIN_PUBLISH_GAP = 12 * 3600
+
+MINUTES_PER_DAY = 24 * 60
+
+# 还没学到发布窗口时的检查时间点，也是响应 Cache-Control 的过期边界
+REFRESH_HOURS = (2, 6, 12, 16)
+
+
+def _minute_of_day(ts):
+    moment = datetime.fromtimestamp(ts)
+    return moment.hour * 60 + moment.minute + moment.second / 60
+
+
+def publish_window(minutes, margin=PUBLISH_MARGIN_MINUTES):
+    """
+    由观测到的发布时刻（当天的第几分钟）求发布窗口，返回 (开始分钟, 窗口长度分钟)
+
+    按环形平均处理跨午夜的观测；没有观测时返回 None。
+    """
+    if not minutes:
+        return None
+    angles = [m / MINUTES_PER_DAY * 2 * math.pi for m in minutes]
+    mean = math.atan2(sum(math.sin(a) for a in angles), sum(math.cos(a) for a in angles))
+    center = (mean / (2 * math.pi) * MINUTES_PER_DAY) % MINUTES_PER_DAY
+    offsets = [((m - center + MINUTES_PER_DAY / 2) % MINUTES_PER_DAY) - MINUTES_PER_DAY / 2 for m in minutes]
+    start = (center + min(offsets) - margin) % MINUTES_PER_DAY
+    return start, max(offsets) - min(offsets) + 2 * margin
+
+
+def next_occurrence(minute, after):
+    """after 之后（含）第一个当天第 minute 分钟的时刻"""
+    moment = datetime.fromtimestamp(after)
+    candidate = moment.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(minutes=minute)
+    if candidate.timestamp() < after:
+        candidate += timedelta(days=1)
+    return candidate.timestamp()
+
+
+def next_boundary(hours, after):
+    """after 之后第一个固定整点的时刻"""
+    moment = datetime.fromtimestamp(after)
+    for hour in sorted(hours):
+        boundary = moment.replace(hour=hour, minute=0, second=0, microsecond=0)
+        if boundary > moment:
+            return boundary.timestamp()
+    tomorrow = moment + timedelta(days=1)
+    return tomorrow.replace(hour=min(hours), minute=0, second=0, microsecond=0).timestamp()
+
+
+def seconds_until(moment, now):
+    """
+    距离 moment 的秒数，用作响应 Cache-Control 的 max-age
+
+    不超过当地午夜：当天的数据过了午夜就过期，客户端不能把昨天的数据缓存到第二天。
+    """
+    midnight = (datetime.fromtimestamp(now) + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(0, int(min(moment, midnight.timestamp()) - now))
+
+
+def seconds_until_refresh(hours, now=None):
+    """距离下一个固定整点的秒数（不超过当地午夜）"""
+    now = now or time.time()
+    return seconds_until(next_boundary(hours, now), now)
+
+
+class RefreshPlanner:
+    """每个星座的检查时刻、失败退避与发布时刻学习"""
+
+    def __init__(self, path=SCHEDULE_FILE, fallback_hours=REFRESH_HOURS):
+        self.path = path
+        self.fallback_hours = tuple(fallback_hours)
+        self._lock = threading.Lock()
+        self._signs = {}
+        self._loaded = None  # 已读入的文件的 (mtime_ns, size)
+        self._writer = DebouncedWriter(self._write, name='schedule')
+
+    def load(self):
+        """读取持久化的状态；文件不存在或损坏时从空状态开始"""
+        if self._read():
+            logger.info(f"已加载刷新计划状态（{len(self._signs)}个星座）")
+        return self
+
+    def reload_if_changed(self):
+        """
+        状态文件被其他进程重写过时重新读取
+
+        跟随者和只读服务入口不运行计划，只用领导者学到的发布窗口计算 max-age；
+        领导者自己维护内存中的状态，不应调用。
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return self
+        if (stat.st_mtime_ns, stat.st_size) != self._loaded:
+            self._read()
+        return self
+
+    def _read(self):
+        try:
+            if not os.path.exists(self.path):
+                return False
+            stat = os.stat(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                signs = {int(num): state for num, state in json.load(f).get('signs', {}).items()}
+        except Exception as e:
+            logger.error(f"读取刷新计划状态失败: {e}")
+            signs, stat = {}, None
+        with self._lock:
+            self._signs = signs
+        self._loaded = None if stat is None else (stat.st_mtime_ns, stat.st_size)
+        return stat is not None
+
+    def _write(self, dirty=None):
+        with self._lock:
+            data = {"signs": {str(num): dict(state) for num, state in self._signs.items()}}
+        return atomic_write_json(self.path, data)
+
+    def save(self):
+        """立即写入状态，不等防抖；失败时记录日志，由后台写入线程稍后重试"""
+        self._writer.mark_dirty()
+        self._writer.flush()
+
+    def _state(self, num):
+        return self._signs.setdefault(int(num), {
+            "last_checked": None,
+            "last_changed": None,
+            "failures": 0,
+            "publish_minutes": [],
+        })
+
+    def record(self, num, outcome, observed=True, now=None):
+        """
+        记录一次检查结果：changed / unchanged / failed
+
+        observed 为 False 时（如冷启动没有旧数据）内容变化不作为发布时刻学习。
+        发布时刻取上一次检查与本次检查的中点，检查越密集越准确。
+        """
+        now = now or time.time()
+        with self._lock:
+            state = self._state(num)
+            previous = state["last_checked"]
+            state["last_checked"] = now
+            if outcome == 'failed':
+                state["failures"] += 1
+            else:
+                state["failures"] = 0
+            if outcome == 'changed':
+                state["last_changed"] = now
+                if observed:
+                    estimate = now if previous is None or now - previous > 24 * 3600 else (previous + now) / 2
+                    state["publish_minutes"] = (state["publish_minutes"] + [round(_minute_of_day(estimate), 1)])[-PUBLISH_HISTORY:]
+        # 请求路径上也会调用，不在这里同步写盘
+        self._writer.mark_dirty()
+
+    def window(self, num):
+        """学到的发布窗口 (开始分钟, 长度分钟)，没有观测时为 None"""
+        return publish_window(self._state(num)["publish_minutes"])
+
+    def seconds_until_refresh(self, now=None):
+        """按本计划的固定整点计算的 max-age（不超过当地午夜）"""
+        return seconds_until_refresh(self.fallback_hours, now)
+
+    def seconds_until_change(self, num, now=None):
+        """
+        该星座的响应可以缓存多久：到下一次预期的源站更新为止（不超过当地午夜）
+
+        学到发布窗口时缓存到下一个窗口开始；正处于窗口内，或窗口已过仍未更新时，
+        新内容随时可能出现，只缓存到下一次密集/稀疏检查；还没学到窗口时按固定整点。
+        """
+        now = now or time.time()
+        with self._lock:
+            state = dict(self._state(num))
+        window = publish_window(state["publish_minutes"])
+        if window is None:
+            return seconds_until(next_boundary(self.fallback_hours, now), now)
+
+        start_minute, length = window
+        window_start = next_occurrence(start_minute, (state["last_changed"] or 0) + MIN_PUBLISH_GAP)
+        if now < window_start:
+            return seconds_until(window_start, now)
+        if now < window_start + length * 60:
+            return seconds_until(now + DENSE_INTERVAL, now)
+        return seconds_until(now + SPARSE_INTERVAL, now)
+
+    def next_check(self, num):
+        """下一次应检查该星座的时刻（时间戳）"""
+        with self._lock:
+            state = dict(self._state(num))
+        last_checked = state["last_checked"]
+        if last_checked is None:
+            return 0.0
+
+        if state["failures"]:
+            return last_checked + min(BACKOFF_BASE * 2 ** (state["failures"] - 1), BACKOFF_MAX)
+
+        window = publish_window(state["publish_minutes"])
+        if window is None:
+            return next_boundary(self.fallback_hours, last_checked)
+
+        start_minute, length = window
+        window_start = next_occurrence(start_minute, (state["last_changed"] or 0) + MIN_PUBLISH_GAP)
+        window_end = window_start + length * 60
+        if last_checked < window_start:
+            # 等待下一个发布窗口，期间只做安全检查
+            return min(last_checked + SAFETY_INTERVAL, window_start)
+        if last_checked < window_end:
+            return min(last_checked + DENSE_INTERVAL, window_end)
+        return last_checked + SPARSE_INTERVAL
+
+    def due(self, signs=range(12), now=None):
+        """现在应该检查的星座"""
+        now = now or time.time()
+        return [num for num in signs if self.next_check(num) <= now]
+
+    def snapshot(self, signs=range(12)):
+        """各星座的计划状态，供 /api/stats 展示"""
+        result = {}
+        for num in signs:
+            with self._lock:
+                state = dict(self._state(num))
+            window = publish_window(state["publish_minutes"])
+            result[str(num)] = {
+                "next_check": datetime.fromtimestamp(self.next_check(num)).isoformat(timespec='seconds'),
+                "failures": state["failures"],
+                "publish_window": None if window is None else {
+                    "start": f"{int(window[0]) // 60:02d}:{int(window[0]) % 60:02d}",
+                    "minutes": round(window[1]),
+                },
+                "observations": len(state["publish_minutes"]),
+            }
+        return result
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Rebuild the cache, history and derived fields from the raw-page archive.
+
+Re-runs extraction over every archived daily page (page_archive.py) without
+touching the network, e.g. after fixing the extractor for an upstream layout
+change. Pages are streamed from the archive one at a time, so memory stays
+bounded however large the archive is:
+
+- history: for every (sign, date) the latest page that parses is written to the
+  history store, with structured ratings and script variants rebuilt
+- cache:   the newest archived day of each sign replaces the cached entry if it
+  is at least as recent, through the same ingest core as the service
+
+Pages that still fail to parse are listed at the end (exit code 1).
+
+Usage:
+    python reingest.py [--since 2025-06-01] [--until 2025-06-30] [--signs 0,3] [--dry-run]
+    python reingest.py --no-cache --notify http://127.0.0.1:5000
+    python reingest.py --stats
+"""
+
+import os
+import sys
+import logging
+import argparse
+from datetime import datetime
+
+import ingest
+from history import HistoryStore
+from page_archive import PageArchive, ARCHIVE_FILE
+from shared_store import SqliteStore
+from upstream import build_entry, parse_astro_page
+from update_astro_data import parse_signs, notify_server, NOTIFY_URL
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# How many parse failures to list individually
+MAX_REPORTED_FAILURES = 50
+
+# Fields compared to decide whether a cached entry needs rewriting
+REBUILT_FIELDS = ('date', 'content_hash', 'structured', 'ratings', 'variants')
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date: {value} (expected YYYY-MM-DD)")
+
+
+def rebuild_entry(archive, fetch):
+    """Parse one archived page into a cache entry dated the day it was fetched"""
+    raw = archive.load(fetch['hash'])
+    if raw is None:
+        raise LookupError(f"page {fetch['hash'][:12]} missing from archive")
+    text = raw.decode(fetch['encoding'] or 'utf-8', errors='replace')
+    title, items = parse_astro_page(text, fetch['sign'])
+    entry = build_entry(title, items)
+    entry['date'] = fetch['period']
+    entry['timestamp'] = fetch['last_seen']
+    for key in ('etag', 'last_modified'):
+        if fetch[key]:
+            entry[key] = fetch[key]
+    return entry
+
+
+def iter_days(archive, since=None, until=None, signs=None):
+    """
+    Yield (date, {sign: entry}, failures) per archived day, in date order
+
+    Within a (sign, date) the latest page that parses wins; only one day of
+    entries is held at a time.
+    """
+    day, entries, failures = None, {}, []
+    for fetch in archive.iter_fetches('daily', since, until, signs):
+        if fetch['period'] != day:
+            if day is not None:
+                yield day, entries, failures
+            day, entries, failures = fetch['period'], {}, []
+        try:
+            entries[str(fetch['sign'])] = rebuild_entry(archive, fetch)
+        except Exception as e:
+            failures.append((fetch['sign'], fetch['period'], fetch['hash'][:12], str(e)))
+    if day is not None:
+        yield day, entries, failures
+
+
+def reingest(archive, history, since=None, until=None, signs=None, dry_run=False):
+    """
+    Rebuild history from the archive
+
+    Returns (newest entry per sign, days, pages rebuilt, failed page count, first failures).
+    """
+    latest, failures = {}, []
+    days = pages = failed = 0
+    for day, entries, day_failures in iter_days(archive, since, until, signs):
+        days += 1
+        pages += len(entries)
+        failed += len(day_failures)
+        failures.extend(day_failures[:max(0, MAX_REPORTED_FAILURES - len(failures))])
+        if entries and not dry_run:
+            # derived fields may change without the content hash changing, so always overwrite
+            history.record_many(entries, replace=True)
+        latest.update(entries)
+        logger.info(f"{day}: rebuilt {len(entries)} signs" + (f", {len(day_failures)} failed" if day_failures else ""))
+    return latest, days, pages, failed, failures
+
+
+def cache_updates(latest, current):
+    """Entries from the archive that are at least as recent as the cached ones and differ from them"""
+    now = datetime.now().isoformat()
+    changed = {}
+    for key, entry in latest.items():
+        cached = current.get(key)
+        if cached and not cached.get('is_default') and cached.get('date', '') > entry['date']:
+            continue
+        if cached and all(cached.get(field) == entry.get(field) for field in REBUILT_FIELDS):
+            continue
+        # commit writes these under a new store version, which is what a running service syncs on
+        changed[key] = dict(entry, timestamp=now)
+    return changed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--archive', default=ARCHIVE_FILE, help='archive database (ASTRO_ARCHIVE_FILE)')
+    parser.add_argument('--since', type=parse_date, help='first day to re-ingest (YYYY-MM-DD)')
+    parser.add_argument('--until', type=parse_date, help='last day to re-ingest (YYYY-MM-DD)')
+    parser.add_argument('--signs', type=parse_signs, help='comma-separated sign numbers (default: all)')
+    parser.add_argument('--dry-run', action='store_true', help='parse and report without writing anything')
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help='rebuild history only')
+    parser.add_argument('--notify', default=NOTIFY_URL, help='server base URL to notify after writing')
+    parser.add_argument('--stats', action='store_true', help='print archive statistics and exit')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.archive):
+        logger.error(f"No archive at {args.archive}")
+        return 1
+    archive = PageArchive(args.archive)
+
+    if args.stats:
+        stats = archive.stats()
+        ratio = stats['stored_bytes'] / stats['raw_bytes'] if stats['raw_bytes'] else 0
+        print(f"{stats['pages']} pages, {stats['fetches']} fetches, "
+              f"{stats['raw_bytes']} bytes raw -> {stats['stored_bytes']} bytes stored ({ratio:.1%})")
+        return 0
+
+    history = HistoryStore()
+    latest, days, pages, failed, failures = reingest(archive, history, args.since, args.until, args.signs, args.dry_run)
+    logger.info(f"Re-parsed {pages} pages over {days} days")
+
+    if args.cache and latest:
+        store = SqliteStore()
+        _, current = ingest.load_entries(store, ingest.CACHE_FILE)
+        changed = cache_updates(latest, current)
+        if args.dry_run:
+            logger.info(f"Dry run: would update cached signs {sorted(int(key) for key in changed)}; nothing written")
+        elif changed:
+            version, size = ingest.commit(changed, store, history, ingest.CACHE_FILE)
+            logger.info(f"Updated cached signs {sorted(int(key) for key in changed)} "
+                        f"(store version {version}, {size} bytes)")
+            if args.notify:
+                notify_server(args.notify)
+        else:
+            logger.info("Cached entries are already up to date")
+
+    if failed:
+        logger.warning(f"{failed} archived pages still fail to parse"
+                       + (f" (first {len(failures)}):" if failed > len(failures) else ":"))
+        for num, day, digest, error in failures:
+            logger.warning(f"  sign {num} {day} page {digest}: {error}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except Exception as e:
+        logger.error(f"Error in re-ingest: {e}")
+        sys.exit(1)
@@ -0,0 +1,310 @@
+"""
+预先构建的响应体
+
+缓存条目变化时，为每种格式（html/json/structured）和繁简变体构建最终的响应字节，
+同时准备 gzip（以及可用时的 brotli）压缩版本和强 ETag。
+请求时只需查表、处理 If-None-Match（返回304）和 Accept-Encoding。
+本模块不依赖 Flask，返回 (status, body, headers) 由调用方包装。
+"""
+
+import gzip
+import json
+import hashlib
+import threading
+
+import variants
+from ratings import CATEGORIES, extract_ratings, structure_items
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+FORMATS = ('html', 'json', 'structured')
+
+MIMETYPES = {
+    'html': 'text/html; charset=utf-8',
+    'json': 'application/json',
+    'structured': 'application/json',
+}
+
+# 批量接口可选字段与默认字段
+BATCH_FIELDS = ('title', 'items', 'date', 'ratings', 'structured')
+DEFAULT_BATCH_FIELDS = ('title', 'items', 'date')
+
+# 过期数据正在后台刷新，客户端很快就能拿到新数据
+STALE_MAX_AGE = 60
+
+
+def json_payload(entry, script=None, stale=False):
+    """JSON 接口返回的数据结构"""
+    variant = variants.get_variant(entry, script)
+    return {
+        "title": variant["title"],
+        "items": variant["items"],
+        "date": entry["date"],
+        "simplified": script == 't2s',
+        "script": script,
+        "stale": stale,
+        **horizon_fields(entry)
+    }
+
+
+def horizon_fields(entry):
+    """明天/本周/本月的条目附带时间范围和周期；当天的条目不加，响应体保持不变"""
+    return {field: entry[field] for field in ('horizon', 'period') if field in entry}
+
+
+def entry_ratings(entry):
+    """入库时提取的评分；旧条目没有时现场提取"""
+    ratings = entry.get('ratings')
+    return ratings if ratings is not None else extract_ratings(entry.get('items'))
+
+
+def variant_structure(variant):
+    """变体的结构化数据；旧条目没有时现场整理"""
+    structured = variant.get('structured')
+    return structured if structured is not None else structure_items(variant.get('items'))
+
+
+def structured_payload(entry, script=None, stale=False):
+    """format=structured 返回的数据结构：按分类整理好的评分和说明"""
+    variant = variants.get_variant(entry, script)
+    return {
+        "title": variant["title"],
+        "date": entry["date"],
+        "categories": variant_structure(variant),
+        "ratings": entry_ratings(entry),
+        "simplified": script == 't2s',
+        "script": script,
+        "stale": stale,
+        **horizon_fields(entry)
+    }
+
+
+def ratings_payload(entries, stale=(), missing=()):
+    """
+    十二星座的评分矩阵：ratings[星座编号][分类序号]，分类顺序见 categories
+
+    缺少数据的星座整行为 null，缺少某个分类时该格为 null。
+    """
+    matrix, dates = [], []
+    for num in range(12):
+        entry = entries.get(num)
+        if entry is None:
+            matrix.append(None)
+            dates.append(None)
+            continue
+        ratings = entry_ratings(entry)
+        matrix.append([ratings.get(category) for category in CATEGORIES])
+        dates.append(entry['date'])
+    return {
+        "categories": list(CATEGORIES),
+        "ratings": matrix,
+        "dates": dates,
+        "stale": sorted(stale),
+        "missing": sorted(missing)
+    }
+
+
+def dumps(payload):
+    """紧凑、键有序的 JSON 字节，相同内容得到相同的 ETag"""
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def render_body(entry, fmt, script=None, stale=False):
+    """生成未压缩的响应字节"""
+    if fmt == 'html':
+        return variants.get_variant(entry, script)["html"].encode('utf-8')
+    if fmt == 'structured':
+        return dumps(structured_payload(entry, script, stale))
+    return dumps(json_payload(entry, script, stale))
+
+
+def batch_payload(entries, fields=DEFAULT_BATCH_FIELDS, script=None, stale=(), missing=()):
+    """批量接口返回的数据结构，entries 为 {星座编号: 条目}"""
+    signs = {}
+    for num, entry in sorted(entries.items()):
+        variant = variants.get_variant(entry, script)
+        sign = {}
+        if 'title' in fields:
+            sign['title'] = variant['title']
+        if 'items' in fields:
+            sign['items'] = variant['items']
+        if 'date' in fields:
+            sign['date'] = entry['date']
+        if 'ratings' in fields:
+            sign['ratings'] = entry_ratings(entry)
+        if 'structured' in fields:
+            sign['structured'] = variant_structure(variant)
+        sign['stale'] = num in stale
+        signs[str(num)] = sign
+    return {
+        "signs": signs,
+        "missing": sorted(missing),
+        "simplified": script == 't2s',
+        "script": script
+    }
+
+
+def entry_token(entry):
+    """条目版本标识，条目内容或日期变化时随之变化"""
+    return (entry.get('content_hash'), entry.get('date'), entry.get('timestamp'))
+
+
+class PreparedBody:
+    """一份响应的原始字节、压缩版本和 ETag"""
+
+    __slots__ = ('body', 'gzip', 'br', 'etag', 'mimetype', 'token')
+
+    def __init__(self, body, mimetype, token=None):
+        self.body = body
+        self.gzip = gzip.compress(body, compresslevel=9, mtime=0)
+        self.br = brotli.compress(body) if BROTLI_AVAILABLE else None
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.mimetype = mimetype
+        self.token = token
+
+    def etag_for(self, encoding):
+        """不同编码的响应使用不同的强 ETag"""
+        return self.etag if not encoding else self.etag[:-1] + '-' + encoding + '"'
+
+    def etags(self):
+        return [self.etag_for(encoding) for encoding in (None, 'gzip', 'br')]
+
+    def encoded(self, accept_encoding):
+        """按 Accept-Encoding 选择最合适的编码，返回 (body, content_encoding)"""
+        accepted = _parse_accept_encoding(accept_encoding)
+        if self.br is not None and accepted.get('br', 0) > 0:
+            return self.br, 'br'
+        if accepted.get('gzip', 0) > 0:
+            return self.gzip, 'gzip'
+        return self.body, None
+
+
+def _parse_accept_encoding(header):
+    accepted = {}
+    for part in (header or '').split(','):
+        if not part.strip():
+            continue
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match 是否命中（支持 * 、多值和弱校验前缀）"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """按 (星座, 格式, 变体, 是否过期) 保存预构建的响应"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bodies = {}
+
+    def prebuild(self, num, entry, scripts=None):
+        """条目变化时预构建各格式和变体的响应（未过期版本）"""
+        scripts = [None] + list(scripts if scripts is not None else variants.SCRIPT_VARIANTS)
+        for fmt in FORMATS:
+            for script in scripts:
+                self.get(num, entry, fmt, script, stale=False)
+
+    def get(self, num, entry, fmt, script=None, stale=False):
+        """取预构建的响应；条目已变化或尚未构建时构建一次"""
+        key = (str(num), fmt, script, stale)
+        token = entry_token(entry)
+        prepared = self._bodies.get(key)
+        if prepared is not None and prepared.token == token:
+            return prepared
+        prepared = PreparedBody(render_body(entry, fmt, script, stale), MIMETYPES[fmt], token)
+        with self._lock:
+            self._bodies[key] = prepared
+        return prepared
+
+    def get_batch(self, entries, fields, script=None, stale=(), missing=(), cache=True):
+        """批量响应；cache 为 False（非常用组合）时只构建不保存"""
+        token = (
+            tuple((num, entry_token(entry)) for num, entry in sorted(entries.items())),
+            tuple(sorted(stale)), tuple(sorted(missing)), tuple(fields)
+        )
+        key = ('*', 'batch', script, None)
+        prepared = self._bodies.get(key) if cache else None
+        if prepared is not None and prepared.token == token:
+            return prepared
+        body = dumps(batch_payload(entries, fields, script, stale, missing))
+        prepared = PreparedBody(body, MIMETYPES['json'], token)
+        if cache:
+            with self._lock:
+                self._bodies[key] = prepared
+        return prepared
+
+    def get_ratings(self, entries, stale=(), missing=()):
+        """评分矩阵响应，评分与繁简变体无关，只保存一份"""
+        token = (
+            tuple((num, entry_token(entry)) for num, entry in sorted(entries.items())),
+            tuple(sorted(stale)), tuple(sorted(missing))
+        )
+        key = ('*', 'ratings', None, None)
+        prepared = self._bodies.get(key)
+        if prepared is not None and prepared.token == token:
+            return prepared
+        prepared = PreparedBody(dumps(ratings_payload(entries, stale, missing)), MIMETYPES['json'], token)
+        with self._lock:
+            self._bodies[key] = prepared
+        return prepared
+
+    def discard(self, key):
+        """丢弃某个键（星座编号或时间范围的缓存键）的所有预构建响应"""
+        key = str(key)
+        with self._lock:
+            for body_key in [k for k in self._bodies if k[0] == key]:
+                del self._bodies[body_key]
+
+    def clear(self):
+        with self._lock:
+            self._bodies.clear()
+
+
+def conditional_response(prepared, if_none_match, accept_encoding, max_age, extra_headers=None):
+    """
+    处理条件请求与内容协商，返回 (status, body, headers)
+
+    If-None-Match 命中时返回 304 且不带响应体。
+    """
+    body, encoding = prepared.encoded(accept_encoding)
+    headers = {
+        'ETag': prepared.etag_for(encoding),
+        'Cache-Control': f'public, max-age={max(0, int(max_age))}',
+        'Vary': 'Accept-Encoding, Accept-Language',
+    }
+    if extra_headers:
+        headers.update(extra_headers)
+
+    if any(etag_matches(if_none_match, etag) for etag in prepared.etags()):
+        return 304, b'', headers
+
+    headers['Content-Type'] = prepared.mimetype
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    headers['Content-Length'] = str(len(body))
+    return 200, body, headers
@@ -0,0 +1,275 @@
+"""
+跨进程共享的缓存存储与领导者选举
+
+gunicorn 多 worker 部署时：
+- SqliteStore: 所有 worker 共用的 SQLite（WAL 模式）存储，读不阻塞写；
+  每次写入递增全局版本号，其他 worker 只需比较版本号就能增量同步
+- LeaderLock: 基于文件锁的领导者选举，只有持有锁的进程运行调度器和抓取
+
+刷新任务（POST /api/update）也记在同一个存储中，任何 worker 都能登记和查询，由领导者执行。
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+STORE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_FILE = os.environ.get('ASTRO_STORE_FILE', os.path.join(STORE_DIR, 'astro_store.sqlite3'))
+LEADER_LOCK_FILE = os.environ.get('ASTRO_LEADER_LOCK_FILE', os.path.join(STORE_DIR, 'astro_leader.lock'))
+
+# 已结束的刷新任务保留多久（秒），期间可以查询进度和结果
+JOB_RETENTION = float(os.environ.get('ASTRO_JOB_RETENTION', 86400))
+
+JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED = 'queued', 'running', 'done', 'failed'
+
+
+def sign_mask(signs=None):
+    """星座列表转为位掩码，None 表示全部星座"""
+    mask = 0
+    for num in (range(12) if signs is None else signs):
+        mask |= 1 << int(num)
+    return mask
+
+
+def mask_signs(mask):
+    return [num for num in range(12) if mask & (1 << num)]
+
+
+class SqliteStore:
+    """以 key -> JSON 的形式保存缓存条目，带单调递增的版本号"""
+
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' key TEXT PRIMARY KEY,'
+            ' data TEXT NOT NULL,'
+            ' version INTEGER NOT NULL,'
+            ' updated_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS entries_version ON entries(version)')
+        conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' id TEXT PRIMARY KEY,'
+            ' state TEXT NOT NULL,'
+            ' mask INTEGER NOT NULL,'
+            ' force INTEGER NOT NULL,'
+            ' data TEXT NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' updated_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state, created_at)')
+
+    def version(self):
+        """当前全局版本号，每次写入递增"""
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else 0
+
+    def put_many(self, entries):
+        """在一个事务中写入多个条目，返回新的版本号"""
+        if not entries:
+            return self.version()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+            version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+            now = time.time()
+            conn.executemany(
+                'INSERT OR REPLACE INTO entries (key, data, version, updated_at) VALUES (?, ?, ?, ?)',
+                [(str(key), json.dumps(value, ensure_ascii=False), version, now) for key, value in entries.items()]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return version
+
+    def delete_many(self, keys):
+        """删除条目（如已过期的周期），不递增版本号；其他进程各自丢弃过期条目"""
+        keys = [str(key) for key in keys]
+        if keys:
+            self._connect().executemany('DELETE FROM entries WHERE key = ?', [(key,) for key in keys])
+        return len(keys)
+
+    def changed_since(self, version):
+        """返回 (当前版本号, {key: entry})，只包含版本号大于 version 的条目"""
+        conn = self._connect()
+        current = self.version()
+        if current <= version:
+            return current, {}
+        rows = conn.execute('SELECT key, data FROM entries WHERE version > ?', (version,)).fetchall()
+        return current, {key: json.loads(data) for key, data in rows}
+
+    def changed_keys_since(self, version):
+        """返回 (当前版本号, [key])，只读取版本号大于 version 的条目的 key"""
+        conn = self._connect()
+        current = self.version()
+        if current <= version:
+            return current, []
+        rows = conn.execute('SELECT key FROM entries WHERE version > ?', (version,)).fetchall()
+        return current, [key for key, in rows]
+
+    def load_all(self):
+        """读取全部条目"""
+        return self.changed_since(0)
+
+    def _transaction(self, fn):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = fn(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return result
+
+    @staticmethod
+    def _job(row):
+        job_id, state, mask, force, data, created_at, updated_at = row
+        job = json.loads(data)
+        job.update(id=job_id, state=state, signs=mask_signs(mask), force=bool(force),
+                   created_at=created_at, updated_at=updated_at)
+        return job
+
+    _JOB_COLUMNS = 'id, state, mask, force, data, created_at, updated_at'
+
+    def enqueue_job(self, signs=None, force=False):
+        """
+        登记一个刷新任务，返回 (任务, 是否新建)
+
+        并发的触发合并到已有任务：正在运行的任务已覆盖这些星座（且强制程度足够）时直接返回它；
+        否则合并进排队中的任务；都没有时新建一个。
+        """
+        mask = sign_mask(signs)
+
+        def enqueue(conn):
+            now = time.time()
+            running = conn.execute(
+                f'SELECT {self._JOB_COLUMNS} FROM jobs WHERE state = ? ORDER BY created_at', (JOB_RUNNING,)
+            ).fetchall()
+            for row in running:
+                if row[2] & mask == mask and (row[3] or not force):
+                    return self._job(row), False
+            row = conn.execute(
+                f'SELECT {self._JOB_COLUMNS} FROM jobs WHERE state = ? ORDER BY created_at LIMIT 1', (JOB_QUEUED,)
+            ).fetchone()
+            if row is not None:
+                conn.execute('UPDATE jobs SET mask = mask | ?, force = force | ?, updated_at = ? WHERE id = ?',
+                             (mask, int(force), now, row[0]))
+                return self._job(conn.execute(f'SELECT {self._JOB_COLUMNS} FROM jobs WHERE id = ?',
+                                              (row[0],)).fetchone()), False
+            job_id = uuid.uuid4().hex[:16]
+            conn.execute(f'INSERT INTO jobs ({self._JOB_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (job_id, JOB_QUEUED, mask, int(force), '{}', now, now))
+            return self._job(conn.execute(f'SELECT {self._JOB_COLUMNS} FROM jobs WHERE id = ?',
+                                          (job_id,)).fetchone()), True
+
+        return self._transaction(enqueue)
+
+    def has_queued_jobs(self):
+        """是否有排队中的任务（领导者按短间隔轮询，有任务时才去领取）"""
+        return self._connect().execute('SELECT 1 FROM jobs WHERE state = ? LIMIT 1', (JOB_QUEUED,)).fetchone() is not None
+
+    def claim_job(self):
+        """领导者取出最早排队的任务并标记为运行中，没有时返回 None；顺便清理过期的已结束任务"""
+        def claim(conn):
+            now = time.time()
+            conn.execute('DELETE FROM jobs WHERE state IN (?, ?) AND updated_at < ?',
+                         (JOB_DONE, JOB_FAILED, now - JOB_RETENTION))
+            row = conn.execute(
+                f'SELECT {self._JOB_COLUMNS} FROM jobs WHERE state = ? ORDER BY created_at LIMIT 1', (JOB_QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?', (JOB_RUNNING, now, row[0]))
+            return self._job((row[0], JOB_RUNNING) + tuple(row[2:6]) + (now,))
+
+        return self._transaction(claim)
+
+    def update_job(self, job_id, data, state=None):
+        """保存任务进度（data 为除状态、星座、时间戳以外的字段），可同时修改状态"""
+        fields = {key: value for key, value in data.items()
+                  if key not in ('id', 'state', 'signs', 'force', 'created_at', 'updated_at')}
+        self._connect().execute(
+            'UPDATE jobs SET data = ?, state = COALESCE(?, state), updated_at = ? WHERE id = ?',
+            (json.dumps(fields, ensure_ascii=False), state, time.time(), job_id)
+        )
+
+    def get_job(self, job_id):
+        row = self._connect().execute(f'SELECT {self._JOB_COLUMNS} FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._job(row) if row is not None else None
+
+    def requeue_running_jobs(self):
+        """新领导者接管时，把上一任领导者未完成的任务放回队列，返回数量"""
+        return self._connect().execute('UPDATE jobs SET state = ?, updated_at = ? WHERE state = ?',
+                                       (JOB_QUEUED, time.time(), JOB_RUNNING)).rowcount
+
+
+class LeaderLock:
+    """非阻塞文件锁；持有锁的进程即为领导者，进程退出时锁自动释放"""
+
+    def __init__(self, path=LEADER_LOCK_FILE):
+        self.path = path
+        self._fd = None
+
+    @property
+    def held(self):
+        return self._fd is not None
+
+    def try_acquire(self):
+        """尝试获取领导权，成功返回True；已持有时直接返回True"""
+        if self._fd is not None:
+            return True
+        if not FCNTL_AVAILABLE:
+            # 不支持文件锁的平台只能单进程运行，直接成为领导者
+            self._fd = -1
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        logger.info(f"进程{os.getpid()}成为领导者，负责调度和抓取")
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        if self._fd >= 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        self._fd = None
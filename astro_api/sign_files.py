@@ -0,0 +1,84 @@
+"""
+按星座的数据文件与清单
+
+供外部消费者（如 Node 端的 fortuneUtils.js）读取单个星座，不必解析整个 astro_cache.json：
+- sign_<编号>.json：一个星座的精简条目（标题、条目、日期、结构化评分和繁简变体）
+- manifest.json：共享存储版本号和各星座文件的版本、日期、内容哈希，最后写入
+
+所有文件都原子替换，条目变化时只重写变化的星座和清单。消费者只需检查清单的
+版本号（或修改时间），有变化时再读取对应星座的文件；也可以用 /api/astro/changes 长轮询。
+"""
+
+import os
+import json
+import logging
+from datetime import datetime
+
+from persistence import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+SIGNS_DIR = os.environ.get('ASTRO_SIGNS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'astro_signs'))
+MANIFEST_NAME = 'manifest.json'
+
+# 写入星座文件的字段；HTML 可由条目拼出，ETag 等只是源站校验信息
+SIGN_FIELDS = ('title', 'items', 'date', 'timestamp', 'content_hash', 'structured', 'ratings', 'is_default')
+VARIANT_FIELDS = ('title', 'items', 'structured')
+
+
+def sign_filename(num):
+    return f'sign_{int(num)}.json'
+
+
+def sign_record(entry):
+    """星座文件的内容"""
+    record = {field: entry[field] for field in SIGN_FIELDS if field in entry}
+    variants = entry.get('variants') or {}
+    if variants:
+        record['variants'] = {
+            script: {field: variant[field] for field in VARIANT_FIELDS if field in variant}
+            for script, variant in variants.items()
+        }
+    return record
+
+
+def read_manifest(directory=SIGNS_DIR):
+    """当前清单；不存在或损坏时返回 None"""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_signs(version, changed, entries, directory=SIGNS_DIR):
+    """
+    写入变化的星座文件，再更新清单；返回写入的星座
+
+    changed 为变化的星座编号（字符串）；清单不存在时写入 entries 中的全部星座。
+    调用方应持有入库锁，避免两个进程交错更新清单。
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory)
+    if manifest is None:
+        manifest = {"signs": {}}
+        changed = entries.keys()
+
+    written = []
+    for key in sorted(changed, key=int):
+        entry = entries.get(key)
+        if entry is None:
+            continue
+        atomic_write_json(os.path.join(directory, sign_filename(key)), sign_record(entry))
+        manifest["signs"][str(key)] = {
+            "file": sign_filename(key),
+            "version": version,
+            "date": entry.get('date'),
+            "content_hash": entry.get('content_hash'),
+        }
+        written.append(int(key))
+
+    manifest["version"] = version
+    manifest["updated_at"] = datetime.now().isoformat(timespec='seconds')
+    atomic_write_json(os.path.join(directory, MANIFEST_NAME), manifest)
+    return written
@@ -0,0 +1,80 @@
+"""
+单飞（single-flight）请求合并
+
+同一个 key 同时只有一个调用在执行，其余并发请求等待它的结果，
+或者在提供了 fallback 时直接拿到旧数据，不再重复请求源站。
+"""
+
+import threading
+from collections import Counter
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """按 key 合并并发调用，并统计被合并的请求数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = Counter()   # 实际执行的次数
+        self.coalesced = Counter()  # 被合并（等待结果或拿到旧数据）的次数
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key, fn, fallback=None, timeout=None):
+        """
+        执行 fn()，同一 key 的并发调用只执行一次
+
+        已有调用在执行时：fallback() 返回非 None 就直接返回它（例如过期缓存），
+        否则等待正在执行的调用结果，超时抛出 TimeoutError。
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed[key] += 1
+            else:
+                self.coalesced[key] += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+        else:
+            if fallback is not None:
+                stale = fallback()
+                if stale is not None:
+                    return stale
+            if not call.event.wait(timeout):
+                raise TimeoutError(f"等待 {key} 的进行中请求超时")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        """各 key 的执行与合并次数"""
+        with self._lock:
+            keys = sorted(set(self.executed) | set(self.coalesced), key=str)
+            return {
+                "executed": sum(self.executed.values()),
+                "coalesced": sum(self.coalesced.values()),
+                "per_key": {
+                    str(key): {"executed": self.executed[key], "coalesced": self.coalesced[key]}
+                    for key in keys
+                },
+            }
@@ -0,0 +1,155 @@
+"""
+带版本号的响应快照
+
+入库进程每次提交后把所有星座的最终响应字节（各格式、繁简变体、过期/未过期、
+原始/gzip/br）写进一个文件，只读服务入口（wsgi_light.py）用 mmap 映射后直接切片返回，
+不需要 Flask、解析库或调度器。
+
+文件格式（小端）：
+- 头部：魔数 b'ASTROSNP'、格式版本(u32)、存储版本号(u64)、索引偏移(u64)、索引长度(u64)
+- 数据区：依次存放的响应字节
+- 索引：JSON，{"dates": {星座: 日期}, "bodies": {"星座/格式/变体/是否过期": {...}}}
+
+快照通过原子替换发布，读者每次读取文件头部的版本号，与已映射的快照不同时重新映射；
+不依赖 inode、修改时间和大小，原地重写、时间戳精度不够时也不会漏掉新快照。
+"""
+
+import os
+import json
+import mmap
+import struct
+import logging
+import threading
+
+from persistence import atomic_write_bytes
+from responses import FORMATS, MIMETYPES, PreparedBody, render_body
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_FILE = os.environ.get('ASTRO_SNAPSHOT_FILE', os.path.join(SNAPSHOT_DIR, 'astro_snapshot.bin'))
+
+MAGIC = b'ASTROSNP'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sIQQQ')
+
+ENCODINGS = ('gzip', 'br')
+
+
+def body_key(num, fmt, script, stale):
+    return f"{num}/{fmt}/{script or ''}/{int(bool(stale))}"
+
+
+def build_snapshot(version, entries):
+    """生成快照字节；entries 为 {星座编号字符串: 条目}"""
+    chunks, offset = [], HEADER.size
+    index = {"dates": {}, "bodies": {}}
+
+    def append(data):
+        nonlocal offset
+        chunks.append(data)
+        span = [offset, len(data)]
+        offset += len(data)
+        return span
+
+    for num, entry in sorted(entries.items(), key=lambda item: int(item[0])):
+        index["dates"][str(num)] = entry.get('date')
+        scripts = [None] + sorted(entry.get('variants') or {})
+        for fmt in FORMATS:
+            for script in scripts:
+                # HTML 响应体与是否过期无关，过期只体现在响应头
+                for stale in ((False,) if fmt == 'html' else (False, True)):
+                    prepared = PreparedBody(render_body(entry, fmt, script, stale), MIMETYPES[fmt])
+                    record = {"etag": prepared.etag, "mimetype": prepared.mimetype, "body": append(prepared.body)}
+                    for encoding in ENCODINGS:
+                        data = getattr(prepared, encoding)
+                        record[encoding] = append(data) if data is not None else None
+                    index["bodies"][body_key(num, fmt, script, stale)] = record
+
+    index_bytes = json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, version, offset, len(index_bytes))
+    return b''.join([header] + chunks + [index_bytes])
+
+
+def write_snapshot(version, entries, path=SNAPSHOT_FILE):
+    """原子地发布新快照，返回写入的字节数"""
+    return atomic_write_bytes(path, build_snapshot(version, entries))
+
+
+def read_version(path=SNAPSHOT_FILE):
+    """快照头部中的存储版本号；文件不存在或格式不对时返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            magic, fmt_version, version, _, _ = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return None
+    if magic != MAGIC or fmt_version != FORMAT_VERSION:
+        return None
+    return version
+
+
+class SnapshotBody(PreparedBody):
+    """快照中的一份响应，可直接交给 conditional_response"""
+
+    __slots__ = ()
+
+    def __init__(self, snapshot, record):
+        self.body = snapshot.slice(record['body'])
+        self.gzip = snapshot.slice(record['gzip'])
+        self.br = snapshot.slice(record['br']) if record.get('br') else None
+        self.etag = record['etag']
+        self.mimetype = record['mimetype']
+        self.token = None
+
+
+class Snapshot:
+    """一个已映射的快照文件"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt_version, self.version, index_offset, index_length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or fmt_version != FORMAT_VERSION:
+            raise ValueError(f"{path} 不是可识别的快照文件")
+        index = json.loads(self._map[index_offset:index_offset + index_length].decode('utf-8'))
+        self.dates = index["dates"]
+        self._bodies = index["bodies"]
+
+    def slice(self, span):
+        # 切片得到字节副本，旧快照被替换后仍可安全地由垃圾回收关闭
+        offset, length = span
+        return self._map[offset:offset + length]
+
+    def has_sign(self, num):
+        return str(num) in self.dates
+
+    def get(self, num, fmt, script=None, stale=False):
+        """取一份响应，没有时返回 None"""
+        record = self._bodies.get(body_key(num, fmt, script, stale and fmt != 'html'))
+        return SnapshotBody(self, record) if record is not None else None
+
+
+class SnapshotReader:
+    """每次请求读取快照头部的版本号，版本变化后重新映射，无需重启"""
+
+    def __init__(self, path=SNAPSHOT_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._failed = None  # 加载失败的版本号，版本再次变化前不重试
+
+    def current(self):
+        """当前快照；文件不存在或损坏时返回最近一次成功加载的快照（可能为 None）"""
+        version = read_version(self.path)
+        snapshot = self._snapshot
+        if version is None or (snapshot is not None and snapshot.version == version) or self._failed == version:
+            return snapshot
+        with self._lock:
+            if (self._snapshot is None or self._snapshot.version != version) and self._failed != version:
+                try:
+                    self._snapshot = Snapshot(self.path)
+                    logger.info(f"已加载快照版本 {self._snapshot.version}")
+                except (OSError, ValueError, struct.error) as e:
+                    self._failed = version
+                    logger.error(f"加载快照失败: {e}")
+            return self._snapshot
@@ -0,0 +1,177 @@
+import logging
+import threading
+from datetime import datetime
+
+import pytest
+
+import astro_api
+import horizons
+from refresh_planner import RefreshPlanner
+from responses import ResponseCache
+from shared_store import SqliteStore
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """全新的共享存储和空缓存；默认是跟随者"""
+    monkeypatch.setattr(astro_api, 'store', SqliteStore(str(tmp_path / 'store.sqlite3')))
+    monkeypatch.setattr(astro_api, 'store_version', 0)
+    monkeypatch.setattr(astro_api, 'cache', {})
+    monkeypatch.setattr(astro_api, 'CACHE_FILE', str(tmp_path / 'cache.json'))
+    yield astro_api
+    astro_api.cache_writer.flush()
+    astro_api.leader_lock.release()
+
+
+@pytest.fixture
+def leader(service):
+    assert service.leader_lock.try_acquire()
+    return service
+
+
+def real_entry(num, title='真實運勢', timestamp='2026-10-18T08:00:00'):
+    entry = astro_api.generate_default_fortune(num)
+    entry.pop('is_default')
+    entry.update(title=title, timestamp=timestamp, content_hash=title)
+    return entry
+
+
+def test_follower_does_not_cache_generated_default(service):
+    response = service.app.test_client().get('/astro_api?num=3')
+    assert response.status_code == 200
+    assert '3' not in service.cache
+
+
+def test_store_entry_replaces_cached_default(service):
+    # 占位数据的 timestamp 比领导者稍后才提交的真实数据晚
+    service.cache['3'] = service.generate_default_fortune(3)
+    service.store.put_many({'3': real_entry(3, timestamp='2026-10-18T00:00:01')})
+    service.sync_from_store(force=True)
+    assert not service.cache['3'].get('is_default')
+    assert service.cache['3']['title'] == '真實運勢'
+
+
+def test_newer_store_version_wins_regardless_of_timestamp(service):
+    service.cache['4'] = real_entry(4, title='舊', timestamp='2099-01-01T00:00:00')
+    service.store.put_many({'4': real_entry(4, title='新', timestamp='2000-01-01T00:00:00')})
+    service.sync_from_store(force=True)
+    assert service.cache['4']['title'] == '新'
+
+
+def test_stored_default_does_not_replace_real_entry(leader):
+    leader.cache['5'] = real_entry(5)
+    leader.store.put_many({'5': leader.generate_default_fortune(5)})
+    leader.sync_from_store(force=True)
+    assert leader.cache['5']['title'] == '真實運勢'
+
+
+def test_leader_keeps_uncommitted_write_until_flushed(leader):
+    leader.cache['6'] = real_entry(6, title='本地修改')
+    leader.cache_writer.mark_dirty('6')
+    leader.store.put_many({'6': real_entry(6, title='其他進程')})
+    leader.sync_from_store(force=True)
+    assert leader.cache['6']['title'] == '本地修改'
+
+    leader.cache_writer.flush()
+    leader.store.put_many({'6': real_entry(6, title='之後的更新')})
+    leader.sync_from_store(force=True)
+    assert leader.cache['6']['title'] == '之後的更新'
+
+
+def test_revalidation_is_queued_once_per_sign(leader, monkeypatch, wait_until):
+    release = threading.Event()
+    calls, saved = [], []
+
+    def update_sign(num):
+        calls.append(num)
+        release.wait(5)
+        return False
+
+    monkeypatch.setattr(leader, 'update_sign', update_sign)
+    monkeypatch.setattr(leader, 'save_cache', lambda *nums: saved.extend(nums))
+    for _ in range(50):
+        leader.revalidate_in_background(7)
+    release.set()
+    wait_until(lambda: not leader._revalidate_pending)
+
+    assert calls == [7]
+    # 内容没有变化时不写盘
+    assert saved == []
+    leader.revalidate_in_background(7)
+    wait_until(lambda: not leader._revalidate_pending)
+    assert calls == [7, 7]
+
+
+def test_manual_update_requires_admin_token(service):
+    client = service.app.test_client()
+    assert client.post('/api/update').status_code == 403
+    assert client.post('/api/update', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+
+    response = client.post('/api/update', json={'signs': [1, 2]}, headers={'Authorization': 'Bearer test-token'})
+    assert response.status_code == 202
+    assert response.json['signs'] == [1, 2]
+    status = client.get(response.headers['Location'])
+    assert status.status_code == 200 and status.json['state'] == 'queued'
+
+
+def test_max_age_never_crosses_midnight(service):
+    now = datetime(2026, 10, 18, 20, 0)
+    assert service.seconds_until_next_refresh(now=now.timestamp()) == 4 * 3600
+
+
+def test_max_age_follows_each_signs_publish_window(service, tmp_path, monkeypatch):
+    planner = RefreshPlanner(str(tmp_path / 'schedule.json'), (2, 6, 12, 16))
+    monkeypatch.setattr(service, 'refresh_planner', planner)
+    # 星座1每天 08:00 到 08:10 之间更新，星座2还没有学到发布窗口
+    for day in (15, 16, 17):
+        planner.record(1, 'unchanged', now=datetime(2026, 10, day, 8, 0).timestamp())
+        planner.record(1, 'changed', now=datetime(2026, 10, day, 8, 10).timestamp())
+    now = datetime(2026, 10, 18, 6, 30).timestamp()
+    window_start = datetime(2026, 10, 18, 7, 50).timestamp()
+    assert service.seconds_until_next_refresh([1], now) == int(window_start - now)
+    assert service.seconds_until_next_refresh([2], now) == 5 * 3600 + 1800
+    assert service.seconds_until_next_refresh([1, 2], now) == int(window_start - now)
+
+
+def test_pruned_horizons_release_prebuilt_responses(service, monkeypatch):
+    monkeypatch.setattr(service, 'horizon_cache', {})
+    monkeypatch.setattr(service, 'response_cache', ResponseCache())
+    old_key = horizons.cache_key(0, 'weekly', '2000-W01')
+    current_key = horizons.cache_key(0, 'weekly', horizons.period('weekly'))
+    entry = real_entry(0)
+    for key in (old_key, current_key):
+        service.horizon_cache[key] = entry
+        service.response_cache.get(key, entry, 'json')
+
+    assert service.prune_horizons() == [old_key]
+    assert list(service.horizon_cache) == [current_key]
+    assert {key[0] for key in service.response_cache._bodies} == {current_key}
+
+
+def test_cumulative_runtime_counts_are_counters(service):
+    body = service.app.test_client().get('/metrics').get_data(as_text=True)
+    assert '# TYPE astro_singleflight_calls_total counter' in body
+    assert '# TYPE astro_convert_memo_calls_total counter' in body
+
+
+def test_request_path_failures_are_logged_once_per_interval(service, monkeypatch, caplog):
+    def broken(num):
+        raise RuntimeError('upstream down')
+
+    monkeypatch.setattr(service, 'fetch_for_request', broken)
+    monkeypatch.setattr(service, '_log_sampled_at', {})
+    client = service.app.test_client()
+    with caplog.at_level(logging.WARNING, logger=service.logger.name):
+        for _ in range(5):
+            assert client.get('/astro_api?num=8').status_code == 200
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages == ['获取星座8数据失败: upstream down', '没有可用缓存，使用生成的默认数据，星座8']
+
+
+def test_changes_long_poll(service):
+    client = service.app.test_client()
+    assert client.get('/api/astro/changes').json == {"version": 0, "changed": []}
+    service.store.put_many({'2': real_entry(2), '9': real_entry(9)})
+    assert client.get('/api/astro/changes?since=0').json == {"version": 1, "changed": [2, 9]}
+    # 没有新版本时等到超时，返回空的 changed
+    assert client.get('/api/astro/changes?since=1&timeout=0.05').json == {"version": 1, "changed": []}
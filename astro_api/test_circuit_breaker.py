@@ -0,0 +1,110 @@
+import time
+
+import pytest
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+
+
+def make_breaker(**options):
+    settings = dict(window=60, min_calls=4, error_rate=0.5, slow_call=10, open_seconds=0.05,
+                    max_open_seconds=0.4, half_open_calls=1)
+    settings.update(options)
+    return CircuitBreaker(**settings)
+
+
+def fail(breaker, times=1):
+    for _ in range(times):
+        breaker.allow()
+        breaker.record(True, 0.01)
+
+
+def succeed(breaker, times=1):
+    for _ in range(times):
+        breaker.allow()
+        breaker.record(False, 0.01)
+
+
+def test_stays_closed_below_min_calls():
+    breaker = make_breaker()
+    fail(breaker, 3)
+    assert breaker.state == CLOSED
+    breaker.allow()
+
+
+def test_opens_when_error_rate_reached():
+    breaker = make_breaker()
+    succeed(breaker, 2)
+    fail(breaker, 2)
+    assert breaker.state == OPEN
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_stays_closed_below_error_rate():
+    breaker = make_breaker()
+    succeed(breaker, 3)
+    fail(breaker, 1)
+    assert breaker.state == CLOSED
+
+
+def test_slow_calls_count_as_failures():
+    breaker = make_breaker(slow_call=0.5)
+    for _ in range(4):
+        breaker.allow()
+        breaker.record(False, 1.0)
+    assert breaker.state == OPEN
+
+
+def test_old_calls_leave_the_window():
+    breaker = make_breaker(window=0.05)
+    fail(breaker, 3)
+    time.sleep(0.1)
+    succeed(breaker, 1)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 1
+
+
+def test_half_open_allows_limited_trials_and_closes_on_success():
+    breaker = make_breaker()
+    fail(breaker, 4)
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    assert not breaker.is_open
+
+    breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record(False, 0.01)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 0
+
+
+def test_failed_trial_reopens_with_doubled_cooldown():
+    breaker = make_breaker()
+    fail(breaker, 4)
+    time.sleep(0.06)
+    fail(breaker, 1)
+    assert breaker.state == OPEN
+    # 冷却时间加倍为 0.1 秒：0.06 秒后仍在熔断中
+    time.sleep(0.06)
+    assert breaker.state == OPEN
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+
+
+def test_cooldown_is_capped():
+    breaker = make_breaker(open_seconds=0.05, max_open_seconds=0.08)
+    fail(breaker, 4)
+    for _ in range(3):
+        time.sleep(0.09)
+        fail(breaker, 1)
+    assert breaker._cooldown == 0.08
+
+
+def test_reset_closes():
+    breaker = make_breaker()
+    fail(breaker, 4)
+    breaker.reset()
+    assert breaker.state == CLOSED
+    breaker.allow()
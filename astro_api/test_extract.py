@@ -0,0 +1,57 @@
+import os
+import glob
+
+import pytest
+
+import extract
+
+FIXTURES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'daily_*.html')))
+
+BACKENDS = [pytest.param(name, marks=pytest.mark.skipif(not extract.BACKENDS[name].available(),
+                                                        reason=f'{name} backend not installed'))
+            for name in extract.BACKEND_PREFERENCE]
+
+PAGE = '''<html><body>
+<div class="NAV"><h3>導航</h3><p>不是運勢</p></div>
+<div class="TODAY_CONTENT extra">
+  <h3>今日巨蟹座解析</h3>
+  <p><span>整體運勢★★★☆☆：</span></p>
+  <p>運勢平穩<br/>宜&amp;靜</p>
+  <div><p>嵌套的段落不算</p></div>
+</div>
+<div class="TODAY_CONTENT"><h3>第二個塊</h3><p>忽略</p></div>
+</body></html>'''
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_extracts_direct_children_of_first_block(name):
+    title, items = extract.get_extractor(name).extract(PAGE)
+    assert title == '今日巨蟹座解析'
+    assert items == ['整體運勢★★★☆☆：', '運勢平穩宜&靜']
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_missing_block_raises(name):
+    with pytest.raises(ValueError):
+        extract.get_extractor(name).extract('<html><body><div class="OTHER"><h3>x</h3></div></body></html>')
+
+
+@pytest.mark.skipif(not FIXTURES, reason='no recorded fixture pages')
+@pytest.mark.parametrize('name', BACKENDS)
+def test_backends_agree_on_fixture_pages(name):
+    reference = extract.get_extractor('streaming')
+    backend = extract.get_extractor(name)
+    for path in FIXTURES:
+        text = read(path)
+        assert backend.extract(text) == reference.extract(text), os.path.basename(path)
+
+
+def test_available_backends_follow_preference():
+    available = extract.available_backends()
+    assert 'streaming' in available
+    assert available == [name for name in extract.BACKEND_PREFERENCE if name in available]
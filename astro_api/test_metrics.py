@@ -0,0 +1,45 @@
+from metrics import Registry
+
+
+def test_counter_metadata_uses_sample_name():
+    registry = Registry()
+    counter = registry.counter('astro_test_events', '测试事件', ('kind',))
+    counter.inc(kind='a')
+    counter.inc(2, kind='a')
+    assert registry.render().splitlines() == [
+        '# HELP astro_test_events_total 测试事件',
+        '# TYPE astro_test_events_total counter',
+        'astro_test_events_total{kind="a"} 3',
+    ]
+
+
+def test_gauge_and_histogram_samples():
+    registry = Registry()
+    registry.gauge('astro_test_level', '水平').set(1.5)
+    registry.histogram('astro_test_seconds', '耗时', buckets=(0.1, 1.0)).observe(0.5)
+    lines = registry.render().splitlines()
+    assert '# TYPE astro_test_level gauge' in lines
+    assert 'astro_test_level 1.5' in lines
+    assert '# TYPE astro_test_seconds histogram' in lines
+    assert 'astro_test_seconds_bucket{le="0.1"} 0' in lines
+    assert 'astro_test_seconds_bucket{le="1"} 1' in lines
+    assert 'astro_test_seconds_bucket{le="+Inf"} 1' in lines
+    assert 'astro_test_seconds_count 1' in lines
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.counter('astro_test_paths', '路径', ('path',)).inc(path='a"b\\c')
+    assert 'astro_test_paths_total{path="a\\"b\\\\c"} 1' in registry.render().splitlines()
+
+
+def test_counter_can_follow_an_external_total():
+    registry = Registry()
+    counter = registry.counter('astro_test_calls', '外部累计', ('result',))
+    counter.set_total(5, result='hit')
+    counter.set_total(7, result='hit')
+    assert registry.render().splitlines() == [
+        '# HELP astro_test_calls_total 外部累计',
+        '# TYPE astro_test_calls_total counter',
+        'astro_test_calls_total{result="hit"} 7',
+    ]
@@ -0,0 +1,137 @@
+import json
+import time
+from datetime import datetime
+
+import pytest
+
+import refresh_planner
+from refresh_planner import (RefreshPlanner, publish_window, next_boundary, seconds_until_refresh,
+                             BACKOFF_BASE, BACKOFF_MAX, DENSE_INTERVAL, SAFETY_INTERVAL, SPARSE_INTERVAL,
+                             PUBLISH_MARGIN_MINUTES)
+
+HOURS = (2, 6, 12, 16)
+
+
+def ts(value):
+    return datetime.fromisoformat(value).timestamp()
+
+
+@pytest.fixture
+def planner(tmp_path):
+    return RefreshPlanner(str(tmp_path / 'schedule.json'), HOURS)
+
+
+def test_unknown_sign_is_due(planner):
+    assert planner.next_check(0) == 0.0
+    assert planner.due([0, 1], now=ts('2026-10-18 09:00')) == [0, 1]
+
+
+def test_fallback_hours_until_a_window_is_learned(planner):
+    planner.record(0, 'unchanged', now=ts('2026-10-18 09:00'))
+    assert planner.next_check(0) == ts('2026-10-18 12:00')
+    planner.record(0, 'unchanged', now=ts('2026-10-18 17:30'))
+    assert planner.next_check(0) == ts('2026-10-19 02:00')
+
+
+def test_failures_back_off_exponentially(planner):
+    now = ts('2026-10-18 09:00')
+    for failures in range(1, 12):
+        planner.record(1, 'failed', now=now)
+        assert planner.next_check(1) == now + min(BACKOFF_BASE * 2 ** (failures - 1), BACKOFF_MAX)
+    planner.record(1, 'unchanged', now=now)
+    assert planner.next_check(1) == ts('2026-10-18 12:00')
+
+
+def test_learns_publish_window_from_changes(planner):
+    # 每天 08:00 与 08:10 之间发布：估计时刻为两次检查的中点 08:05
+    for day in (14, 15, 16):
+        planner.record(2, 'unchanged', now=ts(f'2026-10-{day} 08:00'))
+        planner.record(2, 'changed', now=ts(f'2026-10-{day} 08:10'))
+    start, length = planner.window(2)
+    assert start == pytest.approx(8 * 60 + 5 - PUBLISH_MARGIN_MINUTES, abs=0.1)
+    assert length == pytest.approx(2 * PUBLISH_MARGIN_MINUTES, abs=0.1)
+
+    window_start = ts('2026-10-17 07:50')
+    # 刚发布过：等下一个窗口，期间只做安全检查
+    planner.record(2, 'unchanged', now=ts('2026-10-16 12:00'))
+    assert planner.next_check(2) == min(ts('2026-10-16 12:00') + SAFETY_INTERVAL, window_start)
+    planner.record(2, 'unchanged', now=ts('2026-10-17 06:00'))
+    assert planner.next_check(2) == window_start
+    # 窗口内密集检查
+    planner.record(2, 'unchanged', now=ts('2026-10-17 07:55'))
+    assert planner.next_check(2) == ts('2026-10-17 07:55') + DENSE_INTERVAL
+    # 窗口结束仍未更新：稀疏检查
+    planner.record(2, 'unchanged', now=ts('2026-10-17 09:00'))
+    assert planner.next_check(2) == ts('2026-10-17 09:00') + SPARSE_INTERVAL
+
+
+def test_cold_start_changes_are_not_learned(planner):
+    planner.record(3, 'changed', observed=False, now=ts('2026-10-18 08:00'))
+    assert planner.window(3) is None
+
+
+def test_publish_window_wraps_midnight():
+    start, length = publish_window([23 * 60 + 50, 10], margin=5)
+    assert start == pytest.approx(23 * 60 + 45)
+    assert length == pytest.approx(30)
+    assert publish_window([]) is None
+
+
+def test_next_boundary():
+    assert next_boundary(HOURS, ts('2026-10-18 06:00')) == ts('2026-10-18 12:00')
+    assert next_boundary(HOURS, ts('2026-10-18 16:01')) == ts('2026-10-19 02:00')
+
+
+def test_max_age_is_capped_at_midnight():
+    assert seconds_until_refresh(HOURS, ts('2026-10-18 05:00')) == 3600
+    assert seconds_until_refresh(HOURS, ts('2026-10-18 17:00')) == 7 * 3600
+    assert seconds_until_refresh(HOURS, ts('2026-10-18 23:59')) == 60
+    assert seconds_until_refresh(HOURS, ts('2026-10-18 01:30')) == 1800
+
+
+def test_record_does_not_write_synchronously(planner, monkeypatch):
+    writes = []
+    write = refresh_planner.atomic_write_json
+    monkeypatch.setattr(refresh_planner, 'atomic_write_json', lambda path, data: writes.append(path) or write(path, data))
+    for num in range(12):
+        planner.record(num, 'unchanged')
+    assert writes == []
+    planner._writer.flush()
+    assert len(writes) == 1
+
+
+def test_state_survives_reload(planner):
+    planner.record(4, 'failed', now=time.time())
+    planner.save()
+    with open(planner.path, encoding='utf-8') as f:
+        assert json.load(f)["signs"]["4"]["failures"] == 1
+    reloaded = RefreshPlanner(planner.path, HOURS).load()
+    assert reloaded.next_check(4) == planner.next_check(4)
+
+
+def test_max_age_follows_the_learned_window(planner):
+    for day in (14, 15, 16):
+        planner.record(5, 'unchanged', now=ts(f'2026-10-{day} 08:00'))
+        planner.record(5, 'changed', now=ts(f'2026-10-{day} 08:10'))
+    # 上次更新之后：缓存到下一个窗口开始
+    assert planner.seconds_until_change(5, ts('2026-10-17 06:50')) == 3600
+    # 窗口内还没有更新：只缓存到下一次密集检查
+    assert planner.seconds_until_change(5, ts('2026-10-17 08:00')) == DENSE_INTERVAL
+    # 窗口已过仍未更新：缓存到下一次稀疏检查
+    assert planner.seconds_until_change(5, ts('2026-10-17 09:00')) == SPARSE_INTERVAL
+    # 下一个窗口在明天：不超过午夜
+    planner.record(5, 'changed', now=ts('2026-10-17 08:05'))
+    assert planner.seconds_until_change(5, ts('2026-10-17 20:00')) == 4 * 3600
+    # 没有学到窗口的星座按固定整点
+    assert planner.seconds_until_change(6, ts('2026-10-17 05:00')) == 3600
+
+
+def test_followers_reload_rewritten_state(planner):
+    follower = RefreshPlanner(planner.path, HOURS)
+    follower.reload_if_changed()
+    assert follower.window(7) is None
+    for day in (14, 15):
+        planner.record(7, 'unchanged', now=ts(f'2026-10-{day} 08:00'))
+        planner.record(7, 'changed', now=ts(f'2026-10-{day} 08:10'))
+    planner.save()
+    assert follower.reload_if_changed().window(7) == planner.window(7)
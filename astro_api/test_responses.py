@@ -0,0 +1,83 @@
+import gzip
+import json
+
+from responses import PreparedBody, ResponseCache, conditional_response, etag_matches
+
+
+def make_body(text='{"title": "今日運勢"}'):
+    return PreparedBody(text.encode('utf-8'), 'application/json')
+
+
+def test_full_response_carries_etag_and_cache_headers():
+    prepared = make_body()
+    status, body, headers = conditional_response(prepared, None, None, 120, {'X-Astro-Date': '2026-10-18'})
+    assert status == 200
+    assert body == prepared.body
+    assert headers['ETag'] == prepared.etag
+    assert headers['Cache-Control'] == 'public, max-age=120'
+    assert headers['Content-Length'] == str(len(body))
+    assert headers['X-Astro-Date'] == '2026-10-18'
+    assert 'Content-Encoding' not in headers
+
+
+def test_matching_if_none_match_returns_304_without_body():
+    prepared = make_body()
+    status, body, headers = conditional_response(prepared, prepared.etag, None, 60)
+    assert (status, body) == (304, b'')
+    assert headers['ETag'] == prepared.etag
+    assert 'Content-Length' not in headers
+
+
+def test_gzip_uses_its_own_etag_and_still_revalidates():
+    prepared = make_body()
+    status, body, headers = conditional_response(prepared, None, 'gzip, deflate', 60)
+    assert status == 200 and headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(body) == prepared.body
+    assert headers['ETag'] != prepared.etag
+    # 客户端拿着压缩版本的 ETag 回来，不论这次协商到哪种编码都是 304
+    status, _, _ = conditional_response(prepared, headers['ETag'], None, 60)
+    assert status == 304
+
+
+def test_changed_body_does_not_match_old_etag():
+    old, new = make_body('{"v": 1}'), make_body('{"v": 2}')
+    status, _, _ = conditional_response(new, old.etag, None, 60)
+    assert status == 200
+
+
+def test_etag_matching_rules():
+    etag = '"abc"'
+    assert etag_matches('*', etag)
+    assert etag_matches('"x", "abc"', etag)
+    assert etag_matches('W/"abc"', etag)
+    assert not etag_matches('"abcd"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_negative_max_age_is_clamped():
+    _, _, headers = conditional_response(make_body(), None, None, -5)
+    assert headers['Cache-Control'] == 'public, max-age=0'
+
+
+def test_response_cache_rebuilds_when_entry_changes():
+    cache = ResponseCache()
+    entry = {"title": "今日運勢", "items": ["a"], "html": "a<br>", "date": "2026-10-18",
+             "timestamp": "2026-10-18T08:00:00", "content_hash": "1"}
+    first = cache.get(0, entry, 'json')
+    assert cache.get(0, dict(entry), 'json') is first
+    changed = dict(entry, items=["b"], content_hash="2")
+    second = cache.get(0, changed, 'json')
+    assert second.etag != first.etag
+    assert json.loads(second.body)["items"] == ["b"]
+
+
+def test_discard_drops_every_body_for_a_key():
+    cache = ResponseCache()
+    entry = {"title": "本週運勢", "items": ["a"], "html": "a<br>", "date": "2026-10-12",
+             "timestamp": "2026-10-12T08:00:00", "content_hash": "1"}
+    old = cache.get('0/weekly/2026-W41', entry, 'json')
+    cache.get('0/weekly/2026-W41', entry, 'html', stale=True)
+    current = cache.get('0/weekly/2026-W42', entry, 'json')
+    cache.discard('0/weekly/2026-W41')
+    assert cache.get('0/weekly/2026-W41', entry, 'json') is not old
+    assert cache.get('0/weekly/2026-W42', entry, 'json') is current
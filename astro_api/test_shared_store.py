@@ -0,0 +1,83 @@
+import pytest
+
+from shared_store import SqliteStore, sign_mask, mask_signs, JOB_QUEUED, JOB_RUNNING, JOB_DONE
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SqliteStore(str(tmp_path / 'store.sqlite3'))
+
+
+def test_versions_increase_per_write(store):
+    assert store.version() == 0
+    assert store.put_many({'0': {'title': 'a'}, '1': {'title': 'b'}}) == 1
+    assert store.put_many({'1': {'title': 'c'}}) == 2
+    assert store.put_many({}) == 2
+
+
+def test_changed_since_returns_only_newer_entries(store):
+    store.put_many({'0': {'title': 'a'}, '1': {'title': 'b'}})
+    store.put_many({'1': {'title': 'c'}})
+    assert store.changed_since(0) == (2, {'0': {'title': 'a'}, '1': {'title': 'c'}})
+    assert store.changed_since(1) == (2, {'1': {'title': 'c'}})
+    assert store.changed_since(2) == (2, {})
+    assert store.changed_keys_since(1) == (2, ['1'])
+    assert store.load_all() == store.changed_since(0)
+
+
+def test_other_connections_see_writes(store):
+    other = SqliteStore(store.path)
+    store.put_many({'5': {'date': '2026-10-18'}})
+    assert other.changed_since(0) == (1, {'5': {'date': '2026-10-18'}})
+
+
+def test_sign_mask_round_trip():
+    assert mask_signs(sign_mask([1, 4, 11])) == [1, 4, 11]
+    assert mask_signs(sign_mask()) == list(range(12))
+
+
+def test_enqueue_merges_into_queued_job(store):
+    job, created = store.enqueue_job([0, 1])
+    assert created and job['state'] == JOB_QUEUED
+    merged, created = store.enqueue_job([2], force=True)
+    assert not created
+    assert merged['id'] == job['id']
+    assert merged['signs'] == [0, 1, 2] and merged['force']
+    assert store.has_queued_jobs()
+
+
+def test_enqueue_returns_covering_running_job(store):
+    job, _ = store.enqueue_job()
+    claimed = store.claim_job()
+    assert claimed['id'] == job['id'] and claimed['state'] == JOB_RUNNING
+    assert not store.has_queued_jobs()
+
+    same, created = store.enqueue_job([3])
+    assert not created and same['id'] == job['id']
+
+    # 运行中的任务不是强制刷新，强制请求要新排一个任务
+    forced, created = store.enqueue_job([3], force=True)
+    assert created and forced['id'] != job['id'] and forced['state'] == JOB_QUEUED
+
+
+def test_claim_in_order_and_finish(store):
+    first, _ = store.enqueue_job([0])
+    assert store.claim_job()['id'] == first['id']
+    second, created = store.enqueue_job([1])
+    assert created
+    assert store.claim_job()['id'] == second['id']
+    assert store.claim_job() is None
+
+    store.update_job(first['id'], {"per_sign": {"0": {"status": "changed"}}, "state": "ignored"}, JOB_DONE)
+    done = store.get_job(first['id'])
+    assert done['state'] == JOB_DONE
+    assert done['per_sign'] == {"0": {"status": "changed"}}
+    assert store.get_job('missing') is None
+
+
+def test_requeue_running_jobs(store):
+    job, _ = store.enqueue_job([0])
+    store.claim_job()
+    assert store.requeue_running_jobs() == 1
+    assert store.get_job(job['id'])['state'] == JOB_QUEUED
+    assert store.claim_job()['id'] == job['id']
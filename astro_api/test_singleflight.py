@@ -0,0 +1,119 @@
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def run_concurrently(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def test_concurrent_calls_execute_once(wait_until):
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'fresh'
+
+    first = run_concurrently(1, lambda: results.append(flight.do(3, fn)))
+    started.wait(5)
+    assert flight.in_flight(3)
+    waiters = run_concurrently(5, lambda: results.append(flight.do(3, fn, timeout=5)))
+    wait_until(lambda: flight.coalesced[3] == 5)
+    release.set()
+    for thread in first + waiters:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == ['fresh'] * 6
+    assert not flight.in_flight(3)
+    stats = flight.stats()
+    assert stats["executed"] == 1 and stats["coalesced"] == 5
+    assert stats["per_key"]["3"] == {"executed": 1, "coalesced": 5}
+
+
+def test_fallback_returns_without_waiting():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'fresh'
+
+    leader = run_concurrently(1, lambda: flight.do(1, slow))
+    started.wait(5)
+    assert flight.do(1, slow, fallback=lambda: 'stale') == 'stale'
+    release.set()
+    leader[0].join(5)
+
+
+def test_none_fallback_waits_for_result():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'fresh'
+
+    leader = run_concurrently(1, lambda: flight.do(1, slow))
+    started.wait(5)
+    waiter = run_concurrently(1, lambda: results.append(flight.do(1, slow, fallback=lambda: None, timeout=5)))
+    release.set()
+    for thread in leader + waiter:
+        thread.join(5)
+    assert results == ['fresh']
+
+
+def test_errors_reach_waiters(wait_until):
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def broken():
+        started.set()
+        release.wait(5)
+        raise RuntimeError('upstream down')
+
+    def call():
+        try:
+            flight.do(2, broken, timeout=5)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    leader = run_concurrently(1, call)
+    started.wait(5)
+    waiters = run_concurrently(2, call)
+    wait_until(lambda: flight.coalesced[2] == 2)
+    release.set()
+    for thread in leader + waiters:
+        thread.join(5)
+    assert errors == ['upstream down'] * 3
+    # 失败后不再占用 key，下一次调用重新执行
+    assert flight.do(2, lambda: 'ok') == 'ok'
+
+
+def test_waiter_times_out():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+
+    leader = run_concurrently(1, lambda: flight.do(4, slow))
+    started.wait(5)
+    with pytest.raises(TimeoutError):
+        flight.do(4, slow, timeout=0.01)
+    release.set()
+    leader[0].join(5)
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+import snapshot
+from astro_api import generate_default_fortune
+
+
+@pytest.fixture
+def entries():
+    return {'0': generate_default_fortune(0), '1': generate_default_fortune(1)}
+
+
+def test_round_trip(tmp_path, entries):
+    path = str(tmp_path / 'snapshot.bin')
+    snapshot.write_snapshot(7, entries, path)
+    assert snapshot.read_version(path) == 7
+    current = snapshot.SnapshotReader(path).current()
+    assert current.version == 7
+    assert current.has_sign(1) and not current.has_sign(2)
+    body = current.get(1, 'html')
+    assert body.body == entries['1']['html'].encode('utf-8')
+    assert current.get(1, 'json', 'no-such-variant') is None
+
+
+def test_reader_reloads_in_place_rewrite_with_same_identity(tmp_path, entries):
+    path = str(tmp_path / 'snapshot.bin')
+    snapshot.write_snapshot(1, entries, path)
+    reader = snapshot.SnapshotReader(path)
+    assert reader.current().version == 1
+
+    # 同一个 inode、同样大小、修改时间也不变，只有头部的版本号不同
+    before = os.stat(path)
+    data = snapshot.build_snapshot(2, entries)
+    assert len(data) == before.st_size
+    with open(path, 'r+b') as f:
+        f.write(data)
+    os.utime(path, ns=(before.st_atime_ns, before.st_mtime_ns))
+    assert reader.current().version == 2
+
+
+def test_reader_keeps_last_good_snapshot(tmp_path, entries):
+    path = str(tmp_path / 'snapshot.bin')
+    snapshot.write_snapshot(1, entries, path)
+    reader = snapshot.SnapshotReader(path)
+    assert reader.current().version == 1
+    os.unlink(path)
+    assert reader.current().version == 1
+    with open(path, 'wb') as f:
+        f.write(b'garbage')
+    assert reader.current().version == 1
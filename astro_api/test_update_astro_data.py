@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+import ingest
+import upstream
+import page_archive
+import update_astro_data
+from fixture_server import FixtureServer
+from page_archive import PageArchive
+from shared_store import SqliteStore, LeaderLock, JOB_DONE
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    archive = PageArchive(str(tmp_path / 'archive.sqlite3'))
+    monkeypatch.setattr(page_archive, 'ARCHIVE_PAGES', True)
+    monkeypatch.setattr(page_archive, '_archive', archive)
+    return archive
+
+
+@pytest.fixture
+def server(monkeypatch):
+    with FixtureServer() as server:
+        monkeypatch.setattr(upstream, 'UPSTREAM_HOST', server.host)
+        upstream.breaker.reset()
+        yield server
+    upstream.breaker.reset()
+
+
+def test_dry_run_does_not_archive_pages(server, archive):
+    assert update_astro_data.main(['--dry-run', '--signs', '0,1']) == 0
+    assert server.stats()["requests"] == 2
+    assert archive.stats()["fetches"] == 0
+
+
+def test_fetches_are_archived_by_default(server, archive):
+    entries = {}
+    assert ingest.refresh_sign(0, entries)
+    ingest.fetch_sign(1, entries)
+    assert archive.stats()["fetches"] == 2
+
+
+@pytest.fixture
+def running_leader(tmp_path, monkeypatch):
+    """另一个进程持有领导者锁时，脚本把刷新交给它"""
+    store = SqliteStore(str(tmp_path / 'store.sqlite3'))
+    monkeypatch.setattr(update_astro_data, 'SqliteStore', lambda: store)
+    lock = LeaderLock()
+    assert lock.try_acquire()
+    yield store
+    lock.release()
+
+
+def test_hands_refresh_to_running_leader_as_job(running_leader):
+    assert update_astro_data.main(['--signs', '2,3']) == 0
+    assert update_astro_data.main(['--signs', '4']) == 0
+    job = running_leader.claim_job()
+    assert job['signs'] == [2, 3, 4]
+    assert running_leader.claim_job() is None
+
+
+def test_wait_reports_the_leader_result(running_leader, wait_until):
+    def leader():
+        wait_until(running_leader.has_queued_jobs)
+        job = running_leader.claim_job()
+        running_leader.update_job(job['id'], {"updated_signs": [5], "failed_signs": []}, JOB_DONE)
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    assert update_astro_data.main(['--signs', '5', '--wait', '5']) == 0
+    thread.join(5)
+
+
+def test_wait_times_out_while_job_is_queued(running_leader):
+    assert update_astro_data.main(['--signs', '6', '--wait', '0']) == 1
+    assert running_leader.claim_job()['signs'] == [6]
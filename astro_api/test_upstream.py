@@ -0,0 +1,64 @@
+import pytest
+
+import upstream
+from fixture_server import FixtureServer
+
+
+@pytest.fixture
+def server(monkeypatch):
+    with FixtureServer() as server:
+        monkeypatch.setattr(upstream, 'UPSTREAM_HOST', server.host)
+        upstream.breaker.reset()
+        yield server
+    upstream.breaker.reset()
+
+
+@pytest.fixture
+def session():
+    session = upstream.create_robust_session()
+    yield session
+    session.close()
+
+
+def test_first_fetch_stores_validators(server, session):
+    changed, entry = upstream.refresh_entry(session, 0)
+    assert changed
+    assert entry['etag'] and entry['content_hash']
+    assert entry['structured'] and entry['ratings']
+
+
+def test_unchanged_page_returns_304(server, session):
+    _, entry = upstream.refresh_entry(session, 1)
+    server.reset_stats()
+    changed, new_entry = upstream.refresh_entry(session, 1, entry)
+    assert (changed, new_entry) == (False, None)
+    assert server.stats()["statuses"] == {"304": 1}
+
+
+def test_changed_page_is_detected_in_one_request(server, session):
+    _, entry = upstream.refresh_entry(session, 2)
+    server.change_page(2)
+    server.reset_stats()
+    changed, new_entry = upstream.refresh_entry(session, 2, entry)
+    assert changed
+    assert new_entry['etag'] != entry['etag']
+    assert new_entry['content_hash'] != entry['content_hash']
+    assert server.stats()["requests"] == 1
+
+
+def test_same_content_with_new_validators_is_unchanged(server, session):
+    _, entry = upstream.refresh_entry(session, 3)
+    stale = dict(entry, etag='"outdated"')
+    changed, new_entry = upstream.refresh_entry(session, 3, stale)
+    assert not changed
+    assert new_entry['content_hash'] == entry['content_hash']
+    # 内容未变化时只更新校验信息
+    assert upstream.touch_unchanged(stale, new_entry)
+    assert stale['etag'] == entry['etag']
+
+
+def test_conditional_headers():
+    entry = {'etag': '"abc"', 'last_modified': 'Sat, 17 Oct 2026 00:00:00 GMT'}
+    assert upstream.conditional_headers(entry) == {
+        'If-None-Match': '"abc"', 'If-Modified-Since': 'Sat, 17 Oct 2026 00:00:00 GMT'}
+    assert upstream.conditional_headers(None) == {}
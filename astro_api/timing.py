@@ -0,0 +1,146 @@
+"""
+请求阶段计时与按需性能剖析
+
+- stage(name)：在热点路径上包一层计时（缓存检查、源站请求、解析、繁简转换、保存、响应序列化），
+  只记入当前线程正在处理的请求；没有请求在计时（后台刷新、更新脚本）时几乎没有开销
+- RequestTimer：一个请求的各阶段累计耗时，输出为 Server-Timing 响应头
+- Profiler：管理员开启后对接下来的 N 个请求做 cProfile 采样，汇总成一份统计
+"""
+
+import io
+import time
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+class RequestTimer:
+    """一个请求的阶段耗时（秒），同一阶段多次进入时累加"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Server-Timing 响应头的值（毫秒）"""
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()]
+        parts.append(f"total;dur={self.total * 1000:.2f}")
+        return ', '.join(parts)
+
+    def summary(self):
+        """慢请求日志中的各阶段耗时（毫秒）"""
+        return ' '.join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in self.stages.items())
+
+
+def start_request():
+    """开始为当前线程的请求计时，返回计时器"""
+    _local.timer = RequestTimer()
+    return _local.timer
+
+
+def finish_request():
+    """结束当前线程的请求计时，返回计时器（没有时为 None）"""
+    timer = getattr(_local, 'timer', None)
+    _local.timer = None
+    return timer
+
+
+@contextmanager
+def _timed(timer, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - started)
+
+
+class _NoopStage:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopStage()
+
+
+def stage(name):
+    """计时一个阶段；当前线程没有请求在计时时返回空的上下文管理器"""
+    timer = getattr(_local, 'timer', None)
+    if timer is None:
+        return _NOOP
+    return _timed(timer, name)
+
+
+class Profiler:
+    """
+    按需的请求剖析：arm(n) 后接下来的 n 个请求各自在 cProfile 下运行，结果累加到同一份统计
+
+    同一时刻只剖析一个请求（cProfile 不能在多个线程同时启用），其他并发请求照常处理、不计入。
+    每个 worker 进程各自计数和汇总。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = threading.Lock()
+        self.remaining = 0
+        self.captured = 0
+        self._stats = None
+
+    def arm(self, requests):
+        """剖析接下来的 requests 个请求，清空上一轮的统计"""
+        with self._lock:
+            self.remaining = max(0, int(requests))
+            self.captured = 0
+            self._stats = None
+
+    def begin(self):
+        """请求开始时调用：需要采样时返回已启用的 cProfile.Profile，否则返回 None"""
+        if not self.remaining or not self._active.acquire(blocking=False):
+            return None
+        with self._lock:
+            if not self.remaining:
+                self._active.release()
+                return None
+            self.remaining -= 1
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def end(self, profile):
+        """请求结束时调用，把这次的结果并入汇总"""
+        profile.disable()
+        try:
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                else:
+                    self._stats.add(profile)
+                self.captured += 1
+        finally:
+            self._active.release()
+
+    def report(self, sort='cumulative', limit=30):
+        """汇总统计的文本（pstats 格式），还没有采样时为空字符串"""
+        with self._lock:
+            if self._stats is None:
+                return ''
+            out = io.StringIO()
+            self._stats.stream = out
+            self._stats.sort_stats(sort).print_stats(limit)
+            return out.getvalue()
+
+    def status(self):
+        with self._lock:
+            return {"remaining": self.remaining, "captured": self.captured}
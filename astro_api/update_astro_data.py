@@ -2,212 +2,181 @@
 """
 Helper script to update astrology data manually or via cron.
 This can be used independently of the Flask application.
+
+Uses the same ingest core as the service (ingest.py): pooled session, shared
+parse path, and writes that go through the shared store under a cross-process
+lock, so running it while the service is live does not clobber the cache.
+
+If a service leader is running, the refresh is queued as a job in the shared
+store (the same queue as POST /api/update) instead of scraping twice; --wait
+polls the job until the leader finishes it (use --local to scrape here anyway).
+
+Usage:
+    python update_astro_data.py [--signs 0,3,5] [--dry-run] [--local] [--wait 120] [--notify http://127.0.0.1:5000]
 """
 
 import os
 import sys
-import json
 import logging
-import requests
-from bs4 import BeautifulSoup
-from datetime import datetime
+import argparse
 import time
 
+import requests
+
+import ingest
+from fetch_engine import FetchEngine
+from history import HistoryStore
+from shared_store import SqliteStore, LeaderLock, JOB_DONE, JOB_FAILED
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Cache file location
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-CACHE_FILE = os.path.join(SCRIPT_DIR, "astro_cache.json")
+CACHE_FILE = ingest.CACHE_FILE
 
-def load_cache():
-    """Load cache from file if exists"""
-    try:
-        if os.path.exists(CACHE_FILE):
-            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                cache = json.load(f)
-            logger.info("Cache loaded successfully")
-            return cache
-        return {}
-    except Exception as e:
-        logger.error(f"Error loading cache: {e}")
-        return {}
+# Server to notify after writing new data (POST <url>/api/reload)
+NOTIFY_URL = os.environ.get('ASTRO_NOTIFY_URL')
 
-def save_cache(cache):
-    """Save cache to file"""
-    try:
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(cache, f, ensure_ascii=False, indent=2)
-        logger.info("Cache saved successfully")
-    except Exception as e:
-        logger.error(f"Error saving cache: {e}")
+def parse_signs(value):
+    """Parse a comma-separated list of sign numbers (0-11); empty means all signs"""
+    if not value:
+        return list(range(12))
+    signs = []
+    for part in value.split(','):
+        num = int(part)
+        if not (0 <= num <= 11):
+            raise argparse.ArgumentTypeError(f"invalid astrology number: {num} (must be 0-11)")
+        if num not in signs:
+            signs.append(num)
+    return signs
+
+def _with_retries(num, attempt, max_retries, retry_delay):
+    """Run attempt(num) up to max_retries times; raises after the last failure"""
+    for retries in range(1, max_retries + 1):
+        try:
+            return attempt(num)
+        except Exception as e:
+            if retries >= max_retries:
+                logger.error(f"Failed to update astrology sign {num} after {max_retries} attempts: {e}")
+                raise
+            logger.warning(f"Error processing astrology sign {num} (attempt {retries}/{max_retries}): {e}")
+            logger.info(f"Waiting {retry_delay} seconds before retry")
+            time.sleep(retry_delay)
+
+def update_astro_data(entries, signs, max_retries=3, retry_delay=5, concurrency=None, archive=True):
+    """Refresh the given signs in entries; returns (updated signs, failed signs)"""
+    logger.info(f"Starting update for astrology signs: {signs}")
+    engine = FetchEngine(concurrency) if concurrency else FetchEngine()
+    report = engine.run(signs, lambda num: _with_retries(
+        num, lambda n: ingest.refresh_sign(n, entries, archive=archive), max_retries, retry_delay))
+    updated = [num for num, changed in report.results.items() if changed]
+    return sorted(updated), report.failed_keys
 
-def fetch_astro_data(num, cache):
-    """Fetch astrology data for a specific sign"""
+def retry_failed_signs(entries, failed_signs, max_retries=3, retry_delay=5, archive=True):
+    """Refetch failed signs unconditionally; returns (updated signs, still failed signs)"""
+    if not failed_signs:
+        return [], []
+    logger.info(f"Retrying update for {len(failed_signs)} failed signs: {failed_signs}")
+    report = FetchEngine().run(failed_signs, lambda num: _with_retries(
+        num, lambda n: ingest.fetch_sign(n, entries, archive=archive), max_retries, retry_delay))
+    return sorted(report.results), report.failed_keys
+
+def notify_server(url):
+    """Ask a running server to reload from the shared store; returns True on success"""
     try:
-        # Add timeout to prevent hanging requests
-        r = requests.get(
-            f'http://astro.click108.com.tw/daily_{num}.php?iAstro={num}', 
-            timeout=30
-        )
+        r = requests.post(url.rstrip('/') + '/api/reload', timeout=5)
         r.raise_for_status()
-        
-        # Parse HTML
-        soup = BeautifulSoup(r.text, 'html.parser')
-        astro = soup.select("div.TODAY_CONTENT > h3")[0]
-        items = soup.select("div.TODAY_CONTENT > p")
-        
-        # Format data - Store both raw HTML response and structured data
-        result = {
-            "title": astro.text,
-            "items": [item.text for item in items],
-            "html": astro.text + "<br>" + "<br>".join([item.text + "<br>" for item in items]),
-            "date": datetime.now().strftime("%Y-%m-%d"),
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        return result
-    except Exception as e:
-        logger.error(f"Error fetching astrology data for sign {num}: {e}")
-        return None
-
-def needs_update(num, cache):
-    """Check if the astrology data needs to be updated"""
-    today = datetime.now().strftime("%Y-%m-%d")
-    
-    # If not in cache or not from today, needs update
-    if str(num) not in cache or 'date' not in cache[str(num)] or cache[str(num)]['date'] != today:
+        logger.info(f"Notified {url} to reload (store version {r.json().get('version')})")
         return True
-        
-    try:
-        # Fetch current data to compare
-        # Add timeout to prevent hanging requests
-        r = requests.get(
-            f'http://astro.click108.com.tw/daily_{num}.php?iAstro={num}', 
-            timeout=30
-        )
-        r.raise_for_status()
-        
-        # Parse HTML
-        soup = BeautifulSoup(r.text, 'html.parser')
-        items = soup.select("div.TODAY_CONTENT > p")
-        current_items = [item.text for item in items]
-        
-        # Compare with cached items
-        if 'items' in cache[str(num)]:
-            cached_items = cache[str(num)]['items']
-            # Check if content has changed
-            if cached_items != current_items:
-                logger.info(f"Content changed for astrology {num}")
-                return True
-                
-        return False
     except Exception as e:
-        logger.error(f"Error checking for updates for astrology {num}: {e}")
-        # In case of error, assume update is needed
-        return True
+        # 服务的定时任务也会同步共享存储，通知失败只是延迟生效
+        logger.warning(f"Could not notify {url}: {e}")
+        return False
 
-def update_all_astro_data(max_retries=3, retry_delay=5):
-    """Update data for all 12 astrology signs with retry logic"""
-    logger.info("Starting update for all astrology signs")
-    cache = load_cache()
-    updated = False
-    failed_signs = []
-    
-    for num in range(12):  # 0-11 for the 12 signs
-        retries = 0
-        success = False
-        
-        while retries < max_retries and not success:
-            try:
-                # Check if needs update
-                if needs_update(num, cache):
-                    logger.info(f"Updating data for astrology sign {num}")
-                    data = fetch_astro_data(num, cache)
-                    if data:
-                        cache[str(num)] = data
-                        updated = True
-                        success = True
-                    else:
-                        raise Exception(f"Failed to fetch data for sign {num}")
-                else:
-                    logger.info(f"No update needed for astrology sign {num}")
-                    success = True
-            except Exception as e:
-                retries += 1
-                if retries < max_retries:
-                    logger.warning(f"Error processing astrology sign {num} (attempt {retries}/{max_retries}): {e}")
-                    logger.info(f"Waiting {retry_delay} seconds before retry")
-                    time.sleep(retry_delay)
-                else:
-                    logger.error(f"Failed to update astrology sign {num} after {max_retries} attempts: {e}")
-                    failed_signs.append(num)
-        
-    # Save cache if any updates were made
-    if updated:
-        logger.info("Updates found, saving cache")
-        save_cache(cache)
-    else:
-        logger.info("No updates found for any astrology sign")
-        
-    return failed_signs
-
-def retry_failed_signs(failed_signs, cache, max_retries=3, retry_delay=5):
-    """Retry updating failed signs"""
-    if not failed_signs:
-        return []
-        
-    logger.info(f"Retrying update for {len(failed_signs)} failed signs: {failed_signs}")
-    updated = False
-    still_failed = []
-    
-    for num in failed_signs:
-        retries = 0
-        success = False
-        
-        while retries < max_retries and not success:
-            try:
-                logger.info(f"Retry {retries+1/{max_retries} for sign {num}")
-                data = fetch_astro_data(num, cache)
-                if data:
-                    cache[str(num)] = data
-                    updated = True
-                    success = True
-                else:
-                    raise Exception(f"Failed to fetch data for sign {num}")
-            except Exception as e:
-                retries += 1
-                if retries < max_retries:
-                    logger.warning(f"Error during retry for sign {num} (attempt {retries}/{max_retries}): {e}")
-                    time.sleep(retry_delay)
-                else:
-                    logger.error(f"Failed to update sign {num} after {max_retries} retries")
-                    still_failed.append(num)
-    
-    # Save cache if any updates were made
-    if updated:
-        logger.info("Updates found during retries, saving cache")
-        save_cache(cache)
-        
-    return still_failed
+def wait_for_job(store, job_id, timeout, interval=1.0):
+    """Poll a refresh job queued for the service leader; returns the exit code"""
+    deadline = time.monotonic() + timeout
+    while True:
+        job = store.get_job(job_id)
+        if job is None:
+            logger.error(f"Refresh job {job_id} no longer exists")
+            return 1
+        if job['state'] in (JOB_DONE, JOB_FAILED):
+            break
+        if time.monotonic() >= deadline:
+            logger.warning(f"Refresh job {job_id} is still {job['state']} after {timeout} seconds")
+            return 1
+        time.sleep(interval)
+
+    failed = job.get('failed_signs', [])
+    logger.info(f"Refresh job {job_id} {job['state']}: updated signs {job.get('updated_signs', [])}")
+    if job['state'] == JOB_FAILED or failed:
+        logger.warning(f"Refresh job {job_id} could not update signs {failed or job['signs']}: "
+                       f"{job.get('error') or 'see GET /api/update/' + job_id}")
+        return 1
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--signs', type=parse_signs, default=list(range(12)),
+                        help='comma-separated sign numbers to refresh (default: all)')
+    parser.add_argument('--dry-run', action='store_true', help='fetch and report changes without writing anything')
+    parser.add_argument('--local', action='store_true',
+                        help='scrape in this process even if a service leader is running')
+    parser.add_argument('--wait', type=float, metavar='SECONDS',
+                        help='when a service leader is running, wait up to SECONDS for its refresh job to finish')
+    parser.add_argument('--notify', default=NOTIFY_URL, help='server base URL to notify after writing')
+    parser.add_argument('--max-retries', type=int, default=3)
+    parser.add_argument('--retry-delay', type=float, default=5)
+    parser.add_argument('--concurrency', type=int)
+    args = parser.parse_args(argv)
+
+    store = SqliteStore()
+    leader_lock = LeaderLock()
+
+    # 服务的领导者正在运行时，把刷新作为任务交给它执行，避免重复抓取源站；与 POST /api/update 共用任务队列
+    if not leader_lock.try_acquire() and not args.local and not args.dry_run:
+        job, created = store.enqueue_job(args.signs)
+        logger.info(f"A service leader is running; {'queued' if created else 'joined'} refresh job {job['id']} "
+                    f"for signs {job['signs']}")
+        if args.wait is None:
+            return 0
+        return wait_for_job(store, job['id'], args.wait)
 
-if __name__ == "__main__":
     try:
-        # Initial update attempt
-        cache = load_cache()
-        failed_signs = update_all_astro_data()
-        
-        # If there are failed signs, retry them
-        if failed_signs:
-            logger.info(f"Initial update had {len(failed_signs)} failed signs. Retrying...")
-            still_failed = retry_failed_signs(failed_signs, cache)
-            
-            if still_failed:
-                logger.warning(f"Could not update {len(still_failed)} signs after retries: {still_failed}")
-                sys.exit(1)
-        
+        _, entries = ingest.load_entries(store, CACHE_FILE)
+        # a dry run must not write anything, including the raw-page archive
+        archive = not args.dry_run
+        updated, failed = update_astro_data(entries, args.signs, args.max_retries, args.retry_delay,
+                                            args.concurrency, archive)
+        if failed:
+            logger.info(f"Initial update had {len(failed)} failed signs. Retrying...")
+            retried, failed = retry_failed_signs(entries, failed, args.max_retries, args.retry_delay, archive)
+            updated = sorted(set(updated) | set(retried))
+
+        if args.dry_run:
+            logger.info(f"Dry run: would update signs {updated}; nothing written")
+        elif updated:
+            version, size = ingest.commit({str(num): entries[str(num)] for num in updated},
+                                          store, HistoryStore(), CACHE_FILE)
+            logger.info(f"Saved signs {updated} (store version {version}, {size} bytes)")
+            if args.notify:
+                notify_server(args.notify)
+        else:
+            logger.info("No updates found for the requested signs")
+
+        if failed:
+            logger.warning(f"Could not update {len(failed)} signs after retries: {failed}")
+            return 1
         logger.info("Update process completed successfully")
+        return 0
+    finally:
+        leader_lock.release()
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
     except Exception as e:
         logger.error(f"Error in update process: {e}")
         sys.exit(1)
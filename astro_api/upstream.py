@@ -0,0 +1,204 @@
+"""
+源站访问：会话、页面地址、条件请求与内容哈希
+
+每个星座刷新只请求一次源站：带上 If-None-Match / If-Modified-Since，
+304 或解析后内容哈希未变都视为未变化；有变化时直接用手上的响应生成缓存条目。
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime
+
+import metrics
+import timing
+from circuit_breaker import CircuitBreaker
+from extract import extract_today_content
+from fetch_engine import host_budget
+from horizons import page_path, period
+from page_archive import get_archive
+from ratings import attach_structure
+from variants import attach_variants
+
+logger = logging.getLogger(__name__)
+
+# 源站地址；基准测试和离线调试时可指向本地替身（bench/fixture_server.py）
+UPSTREAM_HOST = os.environ.get('ASTRO_UPSTREAM_HOST', 'astro.click108.com.tw')
+
+# 连接超时5秒，读取超时25秒
+UPSTREAM_TIMEOUT = (5, 25)
+
+# 源站熔断器：源站故障时直接失败，由调用方退回旧数据或默认数据
+breaker = CircuitBreaker()
+
+
+def is_upstream_failure(response):
+    """5xx 和 429 说明源站有问题，计入熔断统计；其他状态（含404）不算"""
+    return response is not None and (response.status_code >= 500 or response.status_code == 429)
+
+
+def upstream_url(num, horizon='daily', period_id=None):
+    """星座运势页面地址，默认为当天运势"""
+    return f'http://{UPSTREAM_HOST}' + page_path(horizon, num, period_id)
+
+
+# 配置请求会话，添加自动重试和超时设置
+def create_robust_session():
+    """创建一个具有重试功能的请求会话"""
+    # 只在需要抓取的进程中加载 requests
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util import Retry
+
+    session = requests.Session()
+
+    # 配置重试策略，对所有请求方法启用重试
+    retry_strategy = Retry(
+        total=3,  # 总共重试3次
+        backoff_factor=0.5,  # 退避因子
+        status_forcelist=[429, 500, 502, 503, 504],  # 触发重试的HTTP状态码
+        allowed_methods=["GET"]  # 允许GET方法重试
+    )
+
+    adapter = HTTPAdapter(max_retries=retry_strategy)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    return session
+
+
+def content_hash(title, items):
+    """解析后内容的哈希，用于判断页面是否真的变化"""
+    payload = json.dumps([title, items], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def conditional_headers(entry):
+    """根据已缓存条目生成条件请求头"""
+    headers = {}
+    if entry:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def parse_astro_page(text, num=None):
+    """从页面中提取标题和运势条目，页面结构异常时抛出 ValueError"""
+    try:
+        with metrics.parse_duration.time(), timing.stage('parse'):
+            return extract_today_content(text)
+    except ValueError:
+        # 检查页面是否包含预期的元素
+        logger.warning(f"星座{num}返回的页面结构异常，可能是网站改版")
+        raise
+
+
+def build_entry(title, items, response=None):
+    """生成缓存条目 - 存储原始HTML响应、结构化评分、预先转换的变体，以及变化检测所需的元数据"""
+    entry = {
+        "title": title,
+        "items": items,
+        "html": title + "<br>" + "<br>".join([item + "<br>" for item in items]),
+        "date": datetime.now().strftime("%Y-%m-%d"),
+        "timestamp": datetime.now().isoformat(),
+        "content_hash": content_hash(title, items),
+    }
+    if response is not None:
+        if response.headers.get('ETag'):
+            entry['etag'] = response.headers['ETag']
+        if response.headers.get('Last-Modified'):
+            entry['last_modified'] = response.headers['Last-Modified']
+    return attach_variants(attach_structure(entry))
+
+
+def fetch_page(session, num, entry=None, horizon='daily', period_id=None, archive=True):
+    """请求星座页面；传入已缓存条目时发送条件请求，熔断时抛出 CircuitOpenError；archive=False 时不存档页面"""
+    # 熔断检查在占用主机预算之前，熔断时不排队等待
+    breaker.allow()
+    # 请求路径上的计时包含等待主机预算的时间
+    with timing.stage('upstream'), host_budget.slot(UPSTREAM_HOST):
+        started = time.perf_counter()
+        try:
+            r = session.get(
+                upstream_url(num, horizon, period_id),
+                headers=conditional_headers(entry),
+                timeout=UPSTREAM_TIMEOUT
+            )
+        except Exception:
+            metrics.upstream_responses.inc(status='error')
+            breaker.record(True, time.perf_counter() - started)
+            raise
+        finally:
+            metrics.upstream_request_duration.observe(time.perf_counter() - started)
+    breaker.record(is_upstream_failure(r), time.perf_counter() - started)
+    metrics.upstream_responses.inc(status=r.status_code)
+    if r.status_code != 304:
+        r.raise_for_status()
+        if archive:
+            archive_page(num, horizon, period_id, r)
+    return r
+
+
+def archive_page(num, horizon, period_id, response):
+    """把源站返回的原始页面存档（在解析之前，解析失败的页面也会留下）；存档失败不影响抓取"""
+    archive = get_archive()
+    if archive is None:
+        return
+    try:
+        archive.store(num, horizon, period_id or period(horizon), response.content, response.encoding,
+                      response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    except Exception as e:
+        logger.error(f"存档星座{num}的页面失败: {e}")
+
+
+def refresh_entry(session, num, entry=None, horizon='daily', period_id=None, archive=True):
+    """
+    单次请求完成变化检测与抓取
+
+    返回 (changed, new_entry)：源站返回304时 new_entry 为 None，
+    内容哈希未变化时 new_entry 是重新解析的条目（携带最新的 ETag 等信息）。
+    """
+    r = fetch_page(session, num, entry, horizon, period_id, archive)
+    if r.status_code == 304:
+        logger.info(f"星座{num}源站返回304，内容未变化")
+        return False, None
+
+    title, items = parse_astro_page(r.text, num)
+    new_entry = build_entry(title, items, r)
+
+    old_hash = None
+    if entry:
+        old_hash = entry.get('content_hash') or (
+            content_hash(entry['title'], entry['items'])
+            if 'title' in entry and 'items' in entry else None
+        )
+    if old_hash == new_entry['content_hash']:
+        logger.info(f"星座{num}内容哈希未变化")
+        return False, new_entry
+
+    logger.info(f"Content changed for astrology {num}")
+    return True, new_entry
+
+
+def touch_unchanged(entry, new_entry=None):
+    """
+    内容未变化时保留已有数据，只刷新校验信息和日期
+
+    返回条目是否被修改（需要保存）。
+    """
+    modified = False
+    if new_entry:
+        for key in ('etag', 'last_modified', 'content_hash'):
+            if new_entry.get(key) and entry.get(key) != new_entry[key]:
+                entry[key] = new_entry[key]
+                modified = True
+    today = datetime.now().strftime("%Y-%m-%d")
+    if entry.get('date') != today:
+        entry['date'] = today
+        entry['timestamp'] = datetime.now().isoformat()
+        modified = True
+    return modified
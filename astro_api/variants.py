@@ -0,0 +1,151 @@
+"""
+繁简转换变体
+
+源站数据是繁体中文。入库时按配置（默认 t2s）预先生成各个转换变体并存进缓存条目，
+请求时按 convert= 参数或 Accept-Language 选择变体，不再每次请求都运行 OpenCC。
+临时的转换走有界的 LRU 缓存。OpenCC 在第一次需要时才加载。
+"""
+
+import os
+import time
+import importlib.util
+import logging
+import threading
+from functools import lru_cache
+
+import metrics
+import timing
+
+logger = logging.getLogger(__name__)
+
+# 入库时预先生成的变体（OpenCC 配置名，逗号分隔）
+SCRIPT_VARIANTS = [v.strip() for v in os.environ.get('ASTRO_SCRIPT_VARIANTS', 't2s').split(',') if v.strip()]
+CONVERT_MEMO_SIZE = int(os.environ.get('ASTRO_CONVERT_MEMO_SIZE', 1024))
+
+# convert= 参数中表示“转成简体”的旧写法
+LEGACY_SIMPLIFIED_VALUES = ['1', 'true', 'yes', 'y']
+
+# Accept-Language 到变体的映射；zh-TW 与源站一致，不需要转换
+ACCEPT_LANGUAGE_VARIANTS = {
+    'zh-cn': 't2s',
+    'zh-sg': 't2s',
+    'zh-hans': 't2s',
+    'zh-hk': 't2hk',
+    'zh-mo': 't2hk',
+}
+
+# 支持的 OpenCC 配置
+KNOWN_CONFIGS = {'t2s', 's2t', 's2tw', 's2twp', 's2hk', 't2tw', 't2hk', 'tw2s', 'tw2sp', 'hk2s'}
+
+_converters = {}
+_converters_lock = threading.Lock()
+OPENCC_AVAILABLE = None  # 第一次加载后才确定
+
+
+def get_converter(config):
+    """按需加载 OpenCC 转换器，不可用时返回 None"""
+    global OPENCC_AVAILABLE
+    if OPENCC_AVAILABLE is False:
+        return None
+    with _converters_lock:
+        if config not in _converters:
+            try:
+                from opencc import OpenCC
+                _converters[config] = OpenCC(config)
+                OPENCC_AVAILABLE = True
+                logger.info(f"OpenCC converter {config} loaded")
+            except ImportError:
+                OPENCC_AVAILABLE = False
+                logger.warning("OpenCC not available. Chinese conversion will not work.")
+                return None
+            except Exception as e:
+                logger.error(f"Error initializing OpenCC {config}: {e}")
+                _converters[config] = None
+        return _converters[config]
+
+
+def opencc_available():
+    """OpenCC 是否可用；尚未加载时只检查能否导入，不加载转换器"""
+    if OPENCC_AVAILABLE is None:
+        return importlib.util.find_spec('opencc') is not None
+    return OPENCC_AVAILABLE
+
+
+@lru_cache(maxsize=CONVERT_MEMO_SIZE)
+def convert(text, config='t2s'):
+    """转换文本，结果被 LRU 缓存；转换器不可用时返回原文"""
+    converter = get_converter(config)
+    if converter is None:
+        return text
+    started = time.perf_counter()
+    result = converter.convert(text)
+    metrics.opencc_duration.observe(time.perf_counter() - started, config=config)
+    return result
+
+
+def convert_entry(entry, config):
+    """转换条目中的标题、条目、HTML 和结构化数据的文字部分"""
+    variant = {
+        "title": convert(entry["title"], config),
+        "items": [convert(item, config) for item in entry["items"]],
+        "html": convert(entry["html"], config),
+    }
+    if 'structured' in entry:
+        variant["structured"] = [
+            dict(category, label=convert(category["label"], config), text=convert(category["text"], config))
+            for category in entry["structured"]
+        ]
+    return variant
+
+
+def build_variants(entry, configs=None):
+    """为缓存条目生成各个转换变体"""
+    if not opencc_available():
+        return {}
+    return {config: convert_entry(entry, config) for config in configs or SCRIPT_VARIANTS}
+
+
+def attach_variants(entry):
+    """入库时把变体写进条目，返回条目本身"""
+    if entry and 'title' in entry and 'items' in entry:
+        with timing.stage('convert'):
+            entry['variants'] = build_variants(entry)
+    return entry
+
+
+def get_variant(entry, config):
+    """取条目的某个变体；config 为 None 时返回原文；入库时没有生成的变体临时转换"""
+    if not config:
+        return entry
+    variant = entry.get('variants', {}).get(config)
+    if variant is None:
+        with timing.stage('convert'):
+            variant = convert_entry(entry, config)
+    return variant
+
+
+def select_variant(convert_param=None, accept_language=None):
+    """
+    根据 convert= 参数和 Accept-Language 选择变体
+
+    convert=1/true 等旧写法表示简体（t2s），也可以直接写配置名（如 s2twp、t2hk）；
+    没有 convert 参数时参考 Accept-Language 中第一个匹配的中文语言。
+    """
+    if convert_param:
+        value = convert_param.lower()
+        if value in LEGACY_SIMPLIFIED_VALUES:
+            return 't2s'
+        if value in KNOWN_CONFIGS:
+            return value
+        return None
+
+    if accept_language:
+        for part in accept_language.split(','):
+            lang = part.split(';')[0].strip().lower()
+            for prefix, config in ACCEPT_LANGUAGE_VARIANTS.items():
+                if lang == prefix or lang.startswith(prefix + '-'):
+                    return config
+            if lang == 'zh' or lang.startswith('zh-'):
+                # 其他中文（如 zh-TW、zh-Hant）保持原文
+                return None
+    return None
@@ -0,0 +1,153 @@
+"""
+只读服务入口
+
+只提供 /astro_api 和 /api/astro/<num>（以及 /healthz、/readyz），直接从入库进程写出的
+响应快照（snapshot.py）中返回预构建的响应字节，不加载 Flask、解析库、调度器和 requests，
+适合用很多个低内存、启动快的 worker 提供服务，抓取交给单独的进程：
+
+    gunicorn --workers=8 --bind=0.0.0.0:5001 wsgi_light:app           # 只读 worker
+    gunicorn --workers=1 --threads=8 --bind=127.0.0.1:5000 wsgi:app   # 负责抓取和写快照
+
+每个请求都会读取快照头部的版本号，新快照无需重启即可生效。
+快照中没有的星座返回 503，不会同步抓取源站。
+快照只包含当天的运势，horizon=tomorrow/weekly/monthly 的请求需要由主服务（wsgi:app）提供。
+"""
+
+import json
+import logging
+from datetime import datetime
+from urllib.parse import parse_qs
+
+import variants
+from refresh_planner import RefreshPlanner
+from responses import STALE_MAX_AGE, conditional_response
+from snapshot import SnapshotReader
+
+logger = logging.getLogger(__name__)
+
+reader = SnapshotReader()
+# 只读取领导者写出的刷新计划状态，按学到的发布窗口计算 max-age
+planner = RefreshPlanner()
+
+STATUS_TEXT = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 503: 'Service Unavailable'}
+
+# 快照缺失时建议客户端稍后重试的秒数
+RETRY_AFTER = 60
+
+
+def _json(status, payload, extra_headers=None):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    headers = {'Content-Type': 'application/json', 'Content-Length': str(len(body))}
+    headers.update(extra_headers or {})
+    return status, body, headers
+
+
+def _text(status, message):
+    body = message.encode('utf-8')
+    return status, body, {'Content-Type': 'text/plain; charset=utf-8', 'Content-Length': str(len(body))}
+
+
+def _sign_response(environ, num, fmt, script):
+    """从快照返回一个星座的响应，处理过期标记、条件请求和压缩"""
+    snapshot = reader.current()
+    if snapshot is None or not snapshot.has_sign(num):
+        return _json(503, {"error": "Astrology data not available yet"}, {'Retry-After': str(RETRY_AFTER)})
+
+    date = snapshot.dates[str(num)]
+    stale = date != datetime.now().strftime("%Y-%m-%d")
+    # 快照中没有请求的繁简变体时返回原文，与 OpenCC 不可用时的行为一致
+    prepared = snapshot.get(num, fmt, script, stale) or snapshot.get(num, fmt, None, stale)
+
+    extra_headers = {'X-Astro-Snapshot-Version': str(snapshot.version)}
+    if fmt == 'html':
+        extra_headers['X-Astro-Date'] = date
+        if stale:
+            extra_headers['X-Astro-Stale'] = '1'
+    max_age = STALE_MAX_AGE if stale else planner.reload_if_changed().seconds_until_change(num)
+    return conditional_response(
+        prepared,
+        environ.get('HTTP_IF_NONE_MATCH'),
+        environ.get('HTTP_ACCEPT_ENCODING'),
+        max_age,
+        extra_headers
+    )
+
+
+def _daily_only(query):
+    """快照只有当天的运势；其他时间范围返回错误信息，当天返回 None"""
+    horizon = query.get('horizon', ['daily'])[0]
+    if horizon == 'daily':
+        return None
+    return f"horizon={horizon} is not served by the read-only entry point"
+
+
+def astro_api(environ, query):
+    try:
+        num = int(query['num'][0])
+    except (KeyError, ValueError):
+        return _text(400, "缺少或无效的'num'参数")
+    if not (0 <= num <= 11):
+        return _text(400, "无效的星座编号(必须是0-11)")
+    error = _daily_only(query)
+    if error:
+        return _text(400, error)
+    script = variants.select_variant(query.get('convert', [None])[0], environ.get('HTTP_ACCEPT_LANGUAGE'))
+    return _sign_response(environ, num, 'html', script)
+
+
+def astro_json_api(environ, query, num):
+    if not (0 <= num <= 11):
+        return _json(400, {"error": "Invalid astrology number (must be 0-11)"})
+    fmt = query.get('format', ['json'])[0]
+    if fmt not in ('json', 'structured'):
+        return _json(400, {"error": "Invalid format (must be json or structured)"})
+    error = _daily_only(query)
+    if error:
+        return _json(400, {"error": error})
+    script = variants.select_variant(query.get('convert', [None])[0], environ.get('HTTP_ACCEPT_LANGUAGE'))
+    return _sign_response(environ, num, fmt, script)
+
+
+def readyz():
+    """快照中每个星座都有数据时就绪"""
+    snapshot = reader.current()
+    missing = [num for num in range(12) if snapshot is None or not snapshot.has_sign(num)]
+    ready = not missing
+    return _json(200 if ready else 503, {
+        "status": "ready" if ready else "not ready",
+        "snapshot_version": snapshot.version if snapshot else None,
+        "missing": missing,
+    })
+
+
+def route(environ):
+    path = environ.get('PATH_INFO', '')
+    query = parse_qs(environ.get('QUERY_STRING', ''))
+    if path == '/astro_api':
+        return astro_api(environ, query)
+    if path.startswith('/api/astro/'):
+        # 与 Flask 的 <int:num> 一致：只匹配非负整数
+        tail = path[len('/api/astro/'):]
+        if tail.isdigit():
+            return astro_json_api(environ, query, int(tail))
+    if path == '/healthz':
+        return _json(200, {"status": "ok"})
+    if path == '/readyz':
+        return readyz()
+    return _json(404, {"error": "Not found"})
+
+
+def app(environ, start_response):
+    """WSGI 应用"""
+    method = environ.get('REQUEST_METHOD', 'GET')
+    if method not in ('GET', 'HEAD'):
+        status, body, headers = _json(405, {"error": "Method not allowed"}, {'Allow': 'GET, HEAD'})
+    else:
+        try:
+            status, body, headers = route(environ)
+        except Exception as e:
+            logger.error(f"Error in API: {e}")
+            status, body, headers = _json(500, {"error": "Internal server error"})
+    start_response(f"{status} {STATUS_TEXT.get(status, 'Internal Server Error')}", list(headers.items()))
+    return [b''] if method == 'HEAD' else [body]
@@ -2,6 +2,59 @@ const path = require('path');
 const fs = require('fs').promises;
 const { zodiacMap } = require('./constants.js');
 
+const ASTRO_DIR = path.join(__dirname, '../../../astro_api');
+const ASTRO_CACHE_FILE = path.join(ASTRO_DIR, 'astro_cache.json');
+const ASTRO_SIGNS_DIR = process.env.ASTRO_SIGNS_DIR || path.join(ASTRO_DIR, 'astro_signs');
+const ASTRO_MANIFEST_FILE = path.join(ASTRO_SIGNS_DIR, 'manifest.json');
+
+// 清单按修改时间缓存，星座数据按清单中的版本号缓存，只有数据变化时才重新读取
+let manifestCache = { mtimeMs: null, manifest: null };
+const signCache = new Map();
+
+/**
+ * 读取按星座数据文件的清单，清单未变化时直接使用内存中的版本
+ * @returns {Promise<Object|null>} 清单，不存在时为 null
+ */
+async function loadManifest() {
+  try {
+    const stat = await fs.stat(ASTRO_MANIFEST_FILE);
+    if (stat.mtimeMs !== manifestCache.mtimeMs) {
+      const manifest = JSON.parse(await fs.readFile(ASTRO_MANIFEST_FILE, 'utf8'));
+      manifestCache = { mtimeMs: stat.mtimeMs, manifest };
+    }
+    return manifestCache.manifest;
+  } catch (error) {
+    if (error.code === 'ENOENT') return null;
+    throw error;
+  }
+}
+
+/**
+ * 读取单个星座的数据：优先使用按星座的数据文件，没有时回退到整个缓存文件
+ * @param {number} zodiacIndex 星座索引(0-11)
+ * @param {function} debugLog 调试日志函数
+ * @returns {Promise<Object|undefined>} 星座数据
+ */
+async function loadSignData(zodiacIndex, debugLog) {
+  const manifest = await loadManifest();
+  const info = manifest && manifest.signs && manifest.signs[zodiacIndex];
+  if (info) {
+    const cached = signCache.get(zodiacIndex);
+    if (cached && cached.version === info.version) {
+      return cached.data;
+    }
+    const data = JSON.parse(await fs.readFile(path.join(ASTRO_SIGNS_DIR, info.file), 'utf8'));
+    signCache.set(zodiacIndex, { version: info.version, data });
+    debugLog('fortune', `从星座数据文件加载星座${zodiacIndex}的运势数据(版本${info.version})`);
+    return data;
+  }
+
+  // 旧部署没有按星座的数据文件时，读取整个缓存文件
+  const astroData = JSON.parse(await fs.readFile(ASTRO_CACHE_FILE, 'utf8'));
+  debugLog('fortune', '从本地缓存加载星座运势数据');
+  return astroData[zodiacIndex];
+}
+
 /**
  * 获取星座运势信息
  * @param {string} zodiacParam 星座索引(0-11)或英文名称
@@ -23,35 +76,30 @@ async function getZodiacFortune(zodiacParam, aspect = 'overall', debugLog = () =
     zodiacIndex = Math.max(0, Math.min(11, parseInt(zodiacIndex)));
     
     // 尝试从本地缓存读取数据
-    let astroData;
+    let signData;
     try {
-      // 从本地文件读取
-      const cacheFilePath = path.join(__dirname, '../../../astro_api/astro_cache.json');
-      const fileData = await fs.readFile(cacheFilePath, 'utf8');
-      astroData = JSON.parse(fileData);
-      
-      debugLog('fortune', '从本地缓存加载星座运势数据');
+      signData = await loadSignData(zodiacIndex, debugLog);
     } catch (cacheError) {
       console.error('无法加载星座运势缓存:', cacheError);
       throw new Error('星座运势缓存不可用');
     }
     
     // 检查是否有对应星座的数据
-    if (!astroData[zodiacIndex]) {
+    if (!signData) {
       throw new Error(`缓存中没有星座索引${zodiacIndex}的数据`);
     }
     
     // 检查数据是否是今天的
     const today = new Date().toISOString().split('T')[0];
-    if (astroData[zodiacIndex].date !== today) {
-      console.warn(`星座运势数据不是最新的. 缓存日期: ${astroData[zodiacIndex].date}, 今天: ${today}`);
+    if (signData.date !== today) {
+      console.warn(`星座运势数据不是最新的. 缓存日期: ${signData.date}, 今天: ${today}`);
       // 注意：在实际应用中可能需要更新缓存，但由于是前端应用，这里只发出警告
     }
     
     // 解析数据
-    const items = astroData[zodiacIndex].items || [];
+    const items = signData.items || [];
     const fortuneData = {
-      title: astroData[zodiacIndex].title || `今日${zodiacMap[Object.keys(zodiacMap)[zodiacIndex]]}运势`,
+      title: signData.title || `今日${zodiacMap[Object.keys(zodiacMap)[zodiacIndex]]}运势`,
       overall: { rating: '★★★☆☆', content: '今日运势一般，保持平常心。' },
       love: { rating: '★★★☆☆', content: '感情上需要多一些理解和包容。' },
       career: { rating: '★★★☆☆', content: '工作中可能会遇到一些挑战，但总体平稳。' },
@@ -61,89 +109,102 @@ async function getZodiacFortune(zodiacParam, aspect = 'overall', debugLog = () =
     // 调试输出完整数据
     debugLog('fortune', { items: items });
     
-    // 改进的运势解析逻辑
-    let currentCategory = null;
+    const structured = signData.structured;
+    if (Array.isArray(structured) && structured.length) {
+      // 入库时已经整理好的结构化数据（分类、0-5 评分、说明），不必再解析字符串
+      for (const category of structured) {
+        const target = fortuneData[category.category];
+        if (!target) continue;
+        target.rating = '★'.repeat(category.rating) + '☆'.repeat(Math.max(0, 5 - category.rating));
+        if (category.text) {
+          target.content = category.text;
+        }
+      }
+    } else {
+      // 旧缓存没有结构化数据时，回退到逐行解析
+      let currentCategory = null;
     
-    for (let i = 0; i < items.length; i++) {
-      const currentItem = items[i].trim();
+      for (let i = 0; i < items.length; i++) {
+        const currentItem = items[i].trim();
       
-      // 跳过空行
-      if (!currentItem) continue;
+        // 跳过空行
+        if (!currentItem) continue;
       
-      // 检查是否是运势类别行
-      if (currentItem.includes('整體運勢') || currentItem.includes('整体运势')) {
-        currentCategory = 'overall';
-        // 提取星级评分
-        const ratingMatch = currentItem.match(/[★☆]+/);
-        if (ratingMatch) {
-          fortuneData.overall.rating = ratingMatch[0];
-        }
+        // 检查是否是运势类别行
+        if (currentItem.includes('整體運勢') || currentItem.includes('整体运势')) {
+          currentCategory = 'overall';
+          // 提取星级评分
+          const ratingMatch = currentItem.match(/[★☆]+/);
+          if (ratingMatch) {
+            fortuneData.overall.rating = ratingMatch[0];
+          }
         
-        // 检查是否同一行包含内容描述
-        const contentMatch = currentItem.split(/[：:]/);
-        if (contentMatch.length > 1 && contentMatch[1].trim()) {
-          fortuneData.overall.content = contentMatch[1].trim();
-        }
-      } 
-      else if (currentItem.includes('愛情運勢') || currentItem.includes('爱情运势')) {
-        currentCategory = 'love';
-        // 提取星级评分
-        const ratingMatch = currentItem.match(/[★☆]+/);
-        if (ratingMatch) {
-          fortuneData.love.rating = ratingMatch[0];
-        }
-        
-        // 检查是否同一行包含内容描述
-        const contentMatch = currentItem.split(/[：:]/);
-        if (contentMatch.length > 1 && contentMatch[1].trim()) {
-          fortuneData.love.content = contentMatch[1].trim();
-        }
-      } 
-      else if (currentItem.includes('事業運勢') || currentItem.includes('事业运势')) {
-        currentCategory = 'career';
-        // 提取星级评分
-        const ratingMatch = currentItem.match(/[★☆]+/);
-        if (ratingMatch) {
-          fortuneData.career.rating = ratingMatch[0];
-        }
-        
-        // 检查是否同一行包含内容描述
-        const contentMatch = currentItem.split(/[：:]/);
-        if (contentMatch.length > 1 && contentMatch[1].trim()) {
-          fortuneData.career.content = contentMatch[1].trim();
-        }
-      } 
-      else if (currentItem.includes('財運運勢') || currentItem.includes('财运运势')) {
-        currentCategory = 'wealth';
-        // 提取星级评分
-        const ratingMatch = currentItem.match(/[★☆]+/);
-        if (ratingMatch) {
-          fortuneData.wealth.rating = ratingMatch[0];
-        }
+          // 检查是否同一行包含内容描述
+          const contentMatch = currentItem.split(/[：:]/);
+          if (contentMatch.length > 1 && contentMatch[1].trim()) {
+            fortuneData.overall.content = contentMatch[1].trim();
+          }
+        } 
+        else if (currentItem.includes('愛情運勢') || currentItem.includes('爱情运势')) {
+          currentCategory = 'love';
+          // 提取星级评分
+          const ratingMatch = currentItem.match(/[★☆]+/);
+          if (ratingMatch) {
+            fortuneData.love.rating = ratingMatch[0];
+          }
         
-        // 检查是否同一行包含内容描述
-        const contentMatch = currentItem.split(/[：:]/);
-        if (contentMatch.length > 1 && contentMatch[1].trim()) {
-          fortuneData.wealth.content = contentMatch[1].trim();
-        }
-      } 
-      else if (currentCategory) {
-        // 当前行不是类别标题，而是内容描述
-        // 只有当前一行没有提取到描述内容时，才使用这一行作为描述
-        if (currentCategory === 'overall' && fortuneData.overall.content === '今日运势一般，保持平常心。') {
-          fortuneData.overall.content = currentItem;
+          // 检查是否同一行包含内容描述
+          const contentMatch = currentItem.split(/[：:]/);
+          if (contentMatch.length > 1 && contentMatch[1].trim()) {
+            fortuneData.love.content = contentMatch[1].trim();
+          }
         } 
-        else if (currentCategory === 'love' && fortuneData.love.content === '感情上需要多一些理解和包容。') {
-          fortuneData.love.content = currentItem;
+        else if (currentItem.includes('事業運勢') || currentItem.includes('事业运势')) {
+          currentCategory = 'career';
+          // 提取星级评分
+          const ratingMatch = currentItem.match(/[★☆]+/);
+          if (ratingMatch) {
+            fortuneData.career.rating = ratingMatch[0];
+          }
+        
+          // 检查是否同一行包含内容描述
+          const contentMatch = currentItem.split(/[：:]/);
+          if (contentMatch.length > 1 && contentMatch[1].trim()) {
+            fortuneData.career.content = contentMatch[1].trim();
+          }
         } 
-        else if (currentCategory === 'career' && fortuneData.career.content === '工作中可能会遇到一些挑战，但总体平稳。') {
-          fortuneData.career.content = currentItem;
+        else if (currentItem.includes('財運運勢') || currentItem.includes('财运运势')) {
+          currentCategory = 'wealth';
+          // 提取星级评分
+          const ratingMatch = currentItem.match(/[★☆]+/);
+          if (ratingMatch) {
+            fortuneData.wealth.rating = ratingMatch[0];
+          }
+        
+          // 检查是否同一行包含内容描述
+          const contentMatch = currentItem.split(/[：:]/);
+          if (contentMatch.length > 1 && contentMatch[1].trim()) {
+            fortuneData.wealth.content = contentMatch[1].trim();
+          }
         } 
-        else if (currentCategory === 'wealth' && fortuneData.wealth.content === '财务状况稳定，避免不必要的支出。') {
-          fortuneData.wealth.content = currentItem;
+        else if (currentCategory) {
+          // 当前行不是类别标题，而是内容描述
+          // 只有当前一行没有提取到描述内容时，才使用这一行作为描述
+          if (currentCategory === 'overall' && fortuneData.overall.content === '今日运势一般，保持平常心。') {
+            fortuneData.overall.content = currentItem;
+          } 
+          else if (currentCategory === 'love' && fortuneData.love.content === '感情上需要多一些理解和包容。') {
+            fortuneData.love.content = currentItem;
+          } 
+          else if (currentCategory === 'career' && fortuneData.career.content === '工作中可能会遇到一些挑战，但总体平稳。') {
+            fortuneData.career.content = currentItem;
+          } 
+          else if (currentCategory === 'wealth' && fortuneData.wealth.content === '财务状况稳定，避免不必要的支出。') {
+            fortuneData.wealth.content = currentItem;
+          }
+          // 处理完内容后重置当前类别，避免后续行被误识别为同一类别的内容
+          currentCategory = null;
         }
-        // 处理完内容后重置当前类别，避免后续行被误识别为同一类别的内容
-        currentCategory = null;
       }
     }
     